@@ -0,0 +1,58 @@
+"""Micro-benchmark comparing the previous chunking path with the fast chunker.
+
+Run from the project root:
+    python -m benchmarks.chunking_benchmark --pages 300
+"""
+import time
+import random
+import argparse
+
+from langchain.schema import Document
+
+from utils.processing.split_and_chunk_text import split_text, chunk_text
+
+WORDS = ("revenue", "segment", "operating", "margin", "fiscal", "year", "growth", "decline", "Americas",
+         "EMEA", "Asia-Pacific", "net", "income", "guidance", "credit", "rating", "outlook", "$4.2bn", "12.5%")
+
+def make_report_text(pages, seed=0):
+    """Generates annual-report-like text with the same page layout as `extract_text_low_memory`."""
+    rng = random.Random(seed)
+    parts = []
+    for page_number in range(1, pages + 1):
+        paragraphs = []
+        for _ in range(rng.randint(4, 8)):
+            lines = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 14))) for _ in range(rng.randint(3, 7))]
+            paragraphs.append("\n".join(lines))
+        parts.append(f"\n\nPage {page_number}\n" + "\n\n".join(paragraphs))
+    return "".join(parts)
+
+def previous_chunk_text(text_data, chunk_size, chunk_overlap):
+    """The chunking path used before: join the input with blank lines, then RecursiveCharacterTextSplitter."""
+    combined_text = "\n\n".join(text_data)
+    return [Document(page_content=chunk) for chunk in split_text(combined_text, chunk_size, chunk_overlap)]
+
+def measure(name, function, *args):
+    start = time.perf_counter()
+    documents = function(*args)
+    elapsed = time.perf_counter() - start
+    total_bytes = sum(len(document.page_content.encode("utf-8")) for document in documents)
+    print(f"{name:<42} {len(documents):>8} {total_bytes:>14,} {elapsed * 1000:>11.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare chunk count, bytes and time of the chunking paths.")
+    parser.add_argument("--pages", type=int, default=300, help="Number of synthetic report pages.")
+    parser.add_argument("--chunk-size", type=int, default=3000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    args = parser.parse_args()
+
+    text = make_report_text(args.pages)
+    print(f"Input: {args.pages} pages, {len(text):,} characters")
+    print(f"{'path':<42} {'chunks':>8} {'bytes':>14} {'time (ms)':>11}")
+    measure("previous, str input (per-character join)", previous_chunk_text, text, args.chunk_size, args.chunk_overlap)
+    measure("previous, list input", previous_chunk_text, text.split("\n\n"), args.chunk_size, args.chunk_overlap)
+    measure("recursive splitter, fixed join", chunk_text, text, args.chunk_size, args.chunk_overlap, "recursive")
+    measure("fast chunker, str input", chunk_text, text, args.chunk_size, args.chunk_overlap)
+    measure("fast chunker, list input", chunk_text, text.split("\n\n"), args.chunk_size, args.chunk_overlap)
+
+if __name__ == "__main__":
+    main()
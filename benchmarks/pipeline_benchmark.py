@@ -0,0 +1,364 @@
+"""Offline benchmark of each pipeline stage on synthetic annual reports.
+
+Times text-layer, OCR and memory-budgeted OCR extraction, chunking, embedding ingestion with a deterministic fake
+embedder, retrieval and DOCX rendering, and reports throughput, latency percentiles and peak memory.
+Each stage runs in a fresh process, so its peak memory is not hidden by the high-water mark of an
+earlier stage. Results are written as JSON, so runs on two commits can be compared.
+
+Run from the project root:
+    python -m benchmarks.pipeline_benchmark --pages 40 --repeat 5
+    python -m benchmarks.pipeline_benchmark --compare benchmarks/results/<baseline>.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.extraction.extract_text_low_memory import extract_text_low_memory
+from utils.extraction.extract_text_high_memory_OCR import extract_text_high_memory_OCR
+from utils.extraction.extract_text_budgeted_OCR import extract_text_budgeted_OCR, DEFAULT_OCR_MEMORY_BUDGET_MB
+from utils.processing.process_text import process_pdf_texts
+from utils.embeddings.create_db_and_store_embedding import store_embeddings_openai
+from utils.embeddings.vector_store_backends import open_vector_store, VECTOR_STORE_BACKENDS
+from utils.retrieval.hybrid_retriever import create_retriever, RETRIEVAL_MODES
+from utils.analysis.generate_report_sections import REPORT_SECTIONS
+from utils.docx_io.save_analysis_to_docx import save_text_to_docx
+from utils.telemetry.tracing import peak_rss_bytes
+
+from benchmarks.synthetic_reports import make_report_pdf, make_paragraph, HashingEmbeddings
+
+DEFAULT_RESULTS_DIRECTORY = os.path.join("benchmarks", "results")
+PROJECT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(values, q):
+    """Returns the q-th percentile (0-100) of a list of values, interpolating between the closest ranks."""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def summarize_samples(name, samples, items, item_name, sample_name, memory, **extra):
+    """
+    Builds the result of one stage.
+
+    Args:
+        name (str): Stage name.
+        samples (list of float): Seconds of each timed call or query.
+        items (int): Items processed by the timed calls, e.g. pages or chunks.
+        item_name (str): What an item is.
+        sample_name (str): What a sample is, e.g. 'call' or 'query'.
+        memory (dict): Peak memory of the stage's process, as measured by `run_stage`.
+        **extra: Other fields to record.
+
+    Returns:
+        dict: Throughput, latency percentiles in milliseconds and memory of the stage.
+    """
+    total = sum(samples)
+    result = {
+        "status": "ok",
+        "samples": len(samples),
+        "sample": sample_name,
+        item_name: items,
+        "seconds": total,
+        f"{item_name}_per_second": items / total if total > 0 else 0.0,
+        "latency_ms": {"mean": total / len(samples) * 1000,
+                       "p50": percentile(samples, 50) * 1000,
+                       "p90": percentile(samples, 90) * 1000,
+                       "p99": percentile(samples, 99) * 1000,
+                       "max": max(samples) * 1000},
+        **memory,
+    }
+    result.update(extra)
+    print(f"{name}: p50 {result['latency_ms']['p50']:.1f} ms per {sample_name}, "
+          f"{result[f'{item_name}_per_second']:.1f} {item_name}/s")
+    return result
+
+def time_calls(function, arguments, repeat, warmup):
+    """Calls `function(*args)` for each argument tuple, `repeat` times after `warmup` untimed rounds.
+
+    Returns:
+        tuple: (seconds of each timed call, return values of the last round).
+    """
+    for _ in range(warmup):
+        for args in arguments:
+            function(*args)
+    samples = []
+    results = []
+    for _ in range(repeat):
+        results = []
+        for args in arguments:
+            start = time.perf_counter()
+            results.append(function(*args))
+            samples.append(time.perf_counter() - start)
+    return samples, results
+
+def quiet_logging():
+    """Hides the INFO log of every call, and Chroma's warning when a query asks for more chunks than the store holds."""
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("chromadb").setLevel(logging.ERROR)
+
+def _measure_stage(function, arguments):
+    quiet_logging()
+    # The modules are imported by now, so the growth from here is the stage's own
+    start_peak = peak_rss_bytes()
+    samples, value = function(*arguments)
+    end_peak = peak_rss_bytes()
+    memory = {"peak_rss_bytes": end_peak, "peak_rss_growth_bytes": max(0, end_peak - start_peak)}
+    children_peak = peak_rss_bytes(children=True)
+    if children_peak:
+        memory["children_peak_rss_bytes"] = children_peak
+    return samples, value, memory
+
+def run_stage(function, *arguments):
+    """
+    Runs a stage in a new process, so the peak RSS it reports is the stage's own.
+
+    A process only ever raises its peak RSS, so stages measured in one process would all report the
+    high-water mark of the most memory-hungry stage before them.
+
+    Args:
+        function (callable): Module-level function returning (seconds of each timed call, value).
+        *arguments: Picklable arguments of the function.
+
+    Returns:
+        tuple: (samples, value, memory), where memory holds the peak RSS of the process, its growth
+            while the stage ran and the peak of its largest child process, if any.
+    """
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(_measure_stage, function, arguments).result()
+
+def bench_extract_low_memory(pdf_paths, repeat, warmup):
+    """Times text-layer extraction and returns the extracted text."""
+    samples, texts = time_calls(lambda path: extract_text_low_memory(path, use_cache=False), [(path,) for path in pdf_paths],
+                                repeat, warmup)
+    return samples, "".join(texts)
+
+def bench_ocr(name, pdf_paths, dpi, memory_budget_mb):
+    """Times one of the OCR extractors, once without a warmup round, since OCR is slow."""
+    if name == "extract_text_budgeted_OCR":
+        extract = lambda path: extract_text_budgeted_OCR(path, dpi=dpi, memory_budget_mb=memory_budget_mb, use_cache=False)
+    else:
+        extract = lambda path: extract_text_high_memory_OCR(path, dpi=dpi, use_cache=False)
+    samples, _ = time_calls(extract, [(path,) for path in pdf_paths], 1, 0)
+    return samples, None
+
+def bench_chunking(text, chunk_size, chunk_overlap, repeat, warmup):
+    """Times chunking and returns the chunks."""
+    samples, results = time_calls(process_pdf_texts, [(text, chunk_size, chunk_overlap)], repeat, warmup)
+    return samples, results[0]
+
+def bench_ingestion(chunks, work_directory, embedding_dimension, embedding_latency, vector_store_backend, repeat, warmup):
+    """Times embedding ingestion with the fake embedder and returns the last Knowledge Base directory."""
+    embeddings = HashingEmbeddings(embedding_dimension, embedding_latency)
+    knowledge_bases = []
+
+    def ingest():
+        # A new directory per round, since Chroma keeps the database of a removed directory open
+        knowledge_bases.append(os.path.join(work_directory, f"knowledge_base_{len(knowledge_bases) + 1}"))
+        return store_embeddings_openai(chunks, knowledge_bases[-1], use_cache=False, embedding_function=embeddings,
+                                       vector_store_backend=vector_store_backend)
+
+    samples, results = time_calls(ingest, [()], repeat, warmup)
+    if not all(results):
+        raise RuntimeError("Embedding ingestion failed; see the log above.")
+    return samples, knowledge_bases[-1]
+
+def bench_retrieval(knowledge_base, embedding_dimension, vector_store_backend, retrieval_mode, context_token_budget, repeat, warmup):
+    """Times the retrieval of every report section's query."""
+    vector_store = open_vector_store(knowledge_base, HashingEmbeddings(embedding_dimension), vector_store_backend)
+    retriever = create_retriever(vector_store, knowledge_base, retrieval_mode, context_token_budget=context_token_budget)
+    samples, _ = time_calls(retriever.invoke, [(section.query,) for section in REPORT_SECTIONS], repeat, warmup)
+    return samples, None
+
+def bench_docx(report_text, output_path, repeat, warmup):
+    """Times rendering a 2 page report to DOCX."""
+    samples, _ = time_calls(save_text_to_docx, [(report_text, output_path)], repeat, warmup)
+    return samples, None
+
+def ocr_available():
+    """Returns whether Tesseract and Poppler's pdftoppm are on PATH."""
+    return bool(shutil.which("tesseract") and shutil.which("pdftoppm"))
+
+def make_report_text(seed=0):
+    """Generates a 2 page report in the LLM output format written to DOCX."""
+    rng = random.Random(seed)
+    lines = ["#### Northwind Holdings plc"]
+    for section in REPORT_SECTIONS:
+        lines += ["", f"### {section.title}", make_paragraph(rng), f"- **Key figure** {make_paragraph(rng)}"]
+    return "\n".join(lines)
+
+def run_benchmark(args, work_directory):
+    """
+    Generates the synthetic reports and times every stage.
+
+    Args:
+        args (argparse.Namespace): The benchmark settings.
+        work_directory (str): Folder for the PDFs, Knowledge Base and documents.
+
+    Returns:
+        dict: Results per stage.
+    """
+    pdf_paths = []
+    page_kinds = {}
+    for document in range(args.documents):
+        path = os.path.join(work_directory, f"report_{document + 1}.pdf")
+        kinds = make_report_pdf(path, args.pages, args.scanned_ratio, args.table_every, args.seed + document)
+        page_kinds = {kind: page_kinds.get(kind, 0) + count for kind, count in kinds.items()}
+        pdf_paths.append(path)
+    pages = args.pages * args.documents
+    pdf_bytes = sum(os.path.getsize(path) for path in pdf_paths)
+    stages = {}
+
+    samples, text, memory = run_stage(bench_extract_low_memory, pdf_paths, args.repeat, args.warmup)
+    stages["extract_text_low_memory"] = summarize_samples("extract_text_low_memory", samples, pages * args.repeat, "pages",
+                                                          "document", memory, input_bytes=pdf_bytes)
+
+    for name in ("extract_text_budgeted_OCR", "extract_text_high_memory_OCR"):
+        if args.skip_ocr or not ocr_available():
+            reason = "--skip-ocr" if args.skip_ocr else "tesseract or pdftoppm not found on PATH"
+            stages[name] = {"status": "skipped", "reason": reason}
+            print(f"{name}: skipped ({reason})")
+            continue
+        samples, _, memory = run_stage(bench_ocr, name, pdf_paths, args.ocr_dpi, args.ocr_memory_budget)
+        stages[name] = summarize_samples(name, samples, pages, "pages", "document", memory, dpi=args.ocr_dpi)
+
+    samples, chunks, memory = run_stage(bench_chunking, text, args.chunk_size, args.chunk_overlap, args.repeat, args.warmup)
+    stages["process_pdf_texts"] = summarize_samples("process_pdf_texts", samples, len(chunks) * args.repeat, "chunks", "call",
+                                                    memory, input_bytes=len(text.encode('utf-8')))
+
+    samples, knowledge_base, memory = run_stage(bench_ingestion, chunks, work_directory, args.embedding_dimension,
+                                                args.embedding_latency, args.vector_store_backend, args.repeat, args.warmup)
+    stages["embedding_ingestion"] = summarize_samples("embedding_ingestion", samples, len(chunks) * args.repeat, "chunks", "call",
+                                                      memory, vector_store_backend=args.vector_store_backend,
+                                                      embedding_latency=args.embedding_latency)
+
+    samples, _, memory = run_stage(bench_retrieval, knowledge_base, args.embedding_dimension, args.vector_store_backend,
+                                   args.retrieval_mode, args.context_token_budget, args.repeat, args.warmup)
+    stages["retrieval"] = summarize_samples("retrieval", samples, len(samples), "queries", "query", memory,
+                                            retrieval_mode=args.retrieval_mode, context_token_budget=args.context_token_budget)
+
+    output_path = os.path.join(work_directory, "2 Page Summary.docx")
+    samples, _, memory = run_stage(bench_docx, make_report_text(args.seed), output_path, args.repeat, args.warmup)
+    stages["docx_rendering"] = summarize_samples("docx_rendering", samples, len(samples), "documents", "document", memory,
+                                                 output_bytes=os.path.getsize(output_path))
+
+    return {"page_kinds": page_kinds, "pdf_bytes": pdf_bytes, "stages": stages}
+
+def git_commit():
+    """Returns the current commit of the working tree, marked '-dirty' if it has local changes."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIRECTORY, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=PROJECT_DIRECTORY, capture_output=True,
+                               text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare_results(baseline, current, tolerance=0.1):
+    """
+    Compares the p50 latency of every stage that ran in both results.
+
+    Args:
+        baseline (dict): Earlier benchmark results.
+        current (dict): New benchmark results.
+        tolerance (float): Allowed relative slowdown before a stage counts as a regression.
+
+    Returns:
+        list of tuple: (stage, baseline p50 ms, current p50 ms, ratio, regressed) per stage.
+    """
+    rows = []
+    for name, stage in current["stages"].items():
+        before = baseline["stages"].get(name, {})
+        if stage.get("status") != "ok" or before.get("status") != "ok":
+            continue
+        old, new = before["latency_ms"]["p50"], stage["latency_ms"]["p50"]
+        ratio = new / old if old > 0 else float("inf")
+        rows.append((name, old, new, ratio, ratio > 1 + tolerance))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each pipeline stage offline on synthetic annual reports.")
+    parser.add_argument("--pages", type=int, default=40, help="Pages per synthetic report.")
+    parser.add_argument("--documents", type=int, default=1, help="Number of synthetic reports.")
+    parser.add_argument("--scanned-ratio", type=float, default=0.1, help="Fraction of pages without a text layer.")
+    parser.add_argument("--table-every", type=int, default=5, help="Every n-th page is a table; 0 for none.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="Timed rounds of each stage.")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed rounds before timing each stage.")
+    parser.add_argument("--skip-ocr", action="store_true", help="Skip the OCR extraction stage.")
+    parser.add_argument("--ocr-dpi", type=int, default=300)
+    parser.add_argument("--ocr-memory-budget", type=int, default=DEFAULT_OCR_MEMORY_BUDGET_MB, help="RAM in MB for the budgeted OCR.")
+    parser.add_argument("--chunk-size", type=int, default=3000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--embedding-dimension", type=int, default=384)
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="Seconds added to each fake embedding request.")
+    parser.add_argument("--vector-store-backend", default="chroma", choices=VECTOR_STORE_BACKENDS)
+    parser.add_argument("--retrieval-mode", default="hybrid", choices=RETRIEVAL_MODES)
+    parser.add_argument("--context-token-budget", type=int, default=3000, help="Tokens of packed context per query; 0 for the top chunks.")
+    parser.add_argument("--output", help=f"Results file (default: a new file in {DEFAULT_RESULTS_DIRECTORY}).")
+    parser.add_argument("--work-directory", help="Keep the generated PDFs, Knowledge Base and documents in this folder.")
+    parser.add_argument("--compare", help="Earlier results file to compare the p50 latencies with.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative p50 slowdown reported as a regression.")
+    args = parser.parse_args()
+
+    quiet_logging()
+    work_directory = args.work_directory or tempfile.mkdtemp(prefix="pipeline_benchmark_")
+    os.makedirs(work_directory, exist_ok=True)
+    try:
+        results = run_benchmark(args, work_directory)
+    finally:
+        if not args.work_directory:
+            shutil.rmtree(work_directory, ignore_errors=True)
+
+    results = {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {name: value for name, value in vars(args).items() if name not in ("output", "work_directory", "compare")},
+        **results,
+    }
+    output = args.output or os.path.join(DEFAULT_RESULTS_DIRECTORY, f"{time.strftime('%Y%m%d-%H%M%S')}-{results['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+
+    print(f"\n{'stage':<30} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'throughput':>22} {'peak RSS MB':>12} {'growth MB':>10}")
+    for name, stage in results["stages"].items():
+        if stage["status"] != "ok":
+            print(f"{name:<30} skipped: {stage['reason']}")
+            continue
+        rate_name = next(key for key in stage if key.endswith("_per_second"))
+        latency = stage["latency_ms"]
+        print(f"{name:<30} {latency['p50']:>10.1f} {latency['p90']:>10.1f} {latency['p99']:>10.1f} "
+              f"{stage[rate_name]:>10.1f} {rate_name.replace('_per_second', '/s'):<11} {stage['peak_rss_bytes'] / 2**20:>12.1f} "
+              f"{stage['peak_rss_growth_bytes'] / 2**20:>10.1f}")
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+        print(f"\nCompared with {baseline.get('commit', 'unknown')} ({args.compare}):")
+        changed = sorted(name for name, value in results["settings"].items() if baseline.get("settings", {}).get(name) != value)
+        if changed:
+            print(f"Settings differ from the baseline, so timings may not be comparable: {', '.join(changed)}")
+        rows = compare_results(baseline, results, args.tolerance)
+        for name, old, new, ratio, regressed in rows:
+            print(f"{name:<30} {old:>10.1f} -> {new:>10.1f} ms  x{ratio:.2f}{'  REGRESSION' if regressed else ''}")
+        if any(row[4] for row in rows):
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""Synthetic annual-report PDFs and a deterministic embedder for offline benchmarks.
+
+The reports mix text pages, tables and rasterized "scanned" pages without a text layer, and every
+page carries the same running header and a page-number footer, like a real filing.
+
+Run from the project root to write a report:
+    python -m benchmarks.synthetic_reports "Benchmark Files/report.pdf" --pages 40
+"""
+import os
+import re
+import time
+import random
+import hashlib
+import argparse
+
+import fitz  # PyMuPDF
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from benchmarks.chunking_benchmark import WORDS
+
+COMPANY = "Northwind Holdings plc"
+RUNNING_HEADER = f"{COMPANY} | Annual Report and Accounts 2023"
+SEGMENTS = ("Americas", "EMEA", "Asia-Pacific", "Digital Services", "Corporate")
+PAGE_RECT = fitz.paper_rect("a4")
+BODY_RECT = fitz.Rect(60, 70, PAGE_RECT.width - 60, PAGE_RECT.height - 60)
+
+def page_kinds(pages, scanned_ratio=0.1, table_every=5):
+    """
+    Decides the layout of each page.
+
+    Args:
+        pages (int): Number of pages.
+        scanned_ratio (float): Fraction of pages rasterized without a text layer, spread evenly.
+        table_every (int): Every n-th page is a table; 0 for no tables.
+
+    Returns:
+        list of str: 'text', 'table' or 'scanned' for each page.
+    """
+    kinds = []
+    for index in range(pages):
+        if int((index + 1) * scanned_ratio) > int(index * scanned_ratio):
+            kinds.append("scanned")
+        elif table_every and (index + 1) % table_every == 0:
+            kinds.append("table")
+        else:
+            kinds.append("text")
+    return kinds
+
+def make_paragraph(rng):
+    """Generates a paragraph of report-like sentences with figures."""
+    sentences = []
+    for _ in range(rng.randint(3, 6)):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(8, 16))]
+        words.insert(rng.randint(0, len(words)), f"{rng.uniform(0.5, 40):.1f}%")
+        sentences.append(" ".join(words).capitalize() + ".")
+    return " ".join(sentences)
+
+def _write_page_furniture(page, page_number):
+    page.insert_text((60, 40), RUNNING_HEADER, fontsize=8)
+    page.insert_text((PAGE_RECT.width / 2 - 10, PAGE_RECT.height - 30), str(page_number), fontsize=8)
+
+def write_text_page(page, page_number, rng):
+    """Writes a page of headed paragraphs."""
+    _write_page_furniture(page, page_number)
+    heading = f"{rng.choice(SEGMENTS)} {rng.choice(('performance', 'outlook', 'risks', 'strategy'))}"
+    body = heading + "\n\n" + "\n\n".join(make_paragraph(rng) for _ in range(rng.randint(4, 6)))
+    page.insert_textbox(BODY_RECT, body, fontsize=10)
+
+def write_table_page(page, page_number, rng):
+    """Writes a segment results table drawn with ruled lines."""
+    _write_page_furniture(page, page_number)
+    page.insert_text((BODY_RECT.x0, BODY_RECT.y0 + 10), "Segment results (in $ millions)", fontsize=12)
+    columns = ("Segment", "FY2023", "FY2022", "Change")
+    widths = (200, 90, 90, 90)
+    rows = [columns]
+    total_current = total_previous = 0
+    for segment in SEGMENTS:
+        previous = rng.randint(200, 4000)
+        current = int(previous * rng.uniform(0.85, 1.25))
+        total_current, total_previous = total_current + current, total_previous + previous
+        rows.append((segment, f"{current:,}", f"{previous:,}", f"{(current - previous) / previous:+.1%}"))
+    rows.append(("Total", f"{total_current:,}", f"{total_previous:,}", f"{(total_current - total_previous) / total_previous:+.1%}"))
+
+    top = BODY_RECT.y0 + 30
+    row_height = 22
+    for row_index, row in enumerate(rows):
+        x = BODY_RECT.x0
+        y = top + row_index * row_height
+        for width, cell in zip(widths, row):
+            page.insert_text((x + 4, y + 15), cell, fontsize=10)
+            x += width
+        page.draw_line((BODY_RECT.x0, y), (x, y))
+    bottom = top + len(rows) * row_height
+    page.draw_line((BODY_RECT.x0, bottom), (BODY_RECT.x0 + sum(widths), bottom))
+    x = BODY_RECT.x0
+    for width in (0,) + widths:
+        x += width
+        page.draw_line((x, top), (x, bottom))
+    page.insert_textbox(fitz.Rect(BODY_RECT.x0, bottom + 20, BODY_RECT.x1, BODY_RECT.y1), make_paragraph(rng), fontsize=10)
+
+def write_scanned_page(doc, page_number, rng, scan_dpi=150):
+    """Appends a page that is only an image of a text page, as a scanner would produce."""
+    scratch = fitz.open()
+    try:
+        write_text_page(scratch.new_page(width=PAGE_RECT.width, height=PAGE_RECT.height), page_number, rng)
+        pixmap = scratch[0].get_pixmap(dpi=scan_dpi, colorspace=fitz.csGRAY)
+    finally:
+        scratch.close()
+    doc.new_page(width=PAGE_RECT.width, height=PAGE_RECT.height).insert_image(PAGE_RECT, pixmap=pixmap)
+
+def make_report_pdf(path, pages=40, scanned_ratio=0.1, table_every=5, seed=0, scan_dpi=150):
+    """
+    Writes a synthetic annual report. The same arguments always produce the same pages.
+
+    Args:
+        path (str): Output PDF path.
+        pages (int): Number of pages.
+        scanned_ratio (float): Fraction of pages rasterized without a text layer.
+        table_every (int): Every n-th page is a table; 0 for no tables.
+        seed (int): Seed of the generated text and figures.
+        scan_dpi (int): Resolution of the scanned pages.
+
+    Returns:
+        dict: The number of pages of each kind.
+    """
+    rng = random.Random(seed)
+    kinds = page_kinds(pages, scanned_ratio, table_every)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    doc = fitz.open()
+    try:
+        for page_number, kind in enumerate(kinds, start=1):
+            if kind == "scanned":
+                write_scanned_page(doc, page_number, rng, scan_dpi)
+                continue
+            page = doc.new_page(width=PAGE_RECT.width, height=PAGE_RECT.height)
+            if kind == "table":
+                write_table_page(page, page_number, rng)
+            else:
+                write_text_page(page, page_number, rng)
+        doc.save(path, garbage=3, deflate=True)
+    finally:
+        doc.close()
+    return {kind: kinds.count(kind) for kind in ("text", "table", "scanned")}
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic bag-of-words embedder, so ingestion and retrieval run offline and repeatably.
+
+    Each word is hashed to a signed position of the vector, so texts sharing words stay close and
+    retrieval results are meaningful. An optional delay per call stands in for API latency.
+    """
+
+    def __init__(self, dimension=384, latency=0.0):
+        """
+        Args:
+            dimension (int): Length of the vectors.
+            latency (float): Seconds to sleep in each embed_documents call.
+        """
+        self.dimension = dimension
+        self.latency = latency
+        self.model = f"hashing-{dimension}"
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in re.findall(r'\w+', text.lower()):
+            value = int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest(), "little")
+            vector[value % self.dimension] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic annual-report PDF with text, table and scanned pages.")
+    parser.add_argument("path", help="Output PDF path.")
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--scanned-ratio", type=float, default=0.1, help="Fraction of pages without a text layer.")
+    parser.add_argument("--table-every", type=int, default=5, help="Every n-th page is a table; 0 for none.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    kinds = make_report_pdf(args.path, args.pages, args.scanned_ratio, args.table_every, args.seed)
+    print(f"Wrote {args.path}: {kinds}")
+
+if __name__ == "__main__":
+    main()
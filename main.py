@@ -9,23 +9,38 @@ from utils.config.set_openai_api_key import set_openai_api_key
 # Extraction
 from utils.extraction.extract_text_high_memory_OCR import extract_text_high_memory_OCR
 from utils.extraction.extract_text_low_memory import extract_text_low_memory
+from utils.extraction.extract_text_parallel_OCR import extract_text_parallel_OCR
+from utils.extraction.extract_text_hybrid import extract_text_hybrid
+from utils.extraction.extract_text_budgeted_OCR import extract_text_budgeted_OCR, DEFAULT_OCR_MEMORY_BUDGET_MB
 from utils.extraction.extract_from_any_file import read_text_file
+from utils.extraction.stream_pages import stream_pdf_pages
+from utils.extraction.page_record import PageRecord, records_from_text
 
 # Processing
-from utils.processing.text_read_and_write import save_text_to_file
+from utils.processing.text_read_and_write import save_text_to_file, tee_pages_to_file
 from utils.processing.process_text import process_pdf_texts
+from utils.processing.stream_chunk_text import stream_chunk_pages
+from utils.processing.token_chunk_text import iter_token_chunks, token_chunk_text
+from utils.processing.deduplicate_chunks import deduplicate_chunks
+from utils.processing.strip_running_headers import strip_running_headers, strip_running_headers_from_text, iter_stripped_pages
 
 # Embeddings
 from utils.embeddings.create_db_and_store_embedding import store_embeddings_openai
 from utils.embeddings.generate_dbname import generate_dbname
 
 # Analysis
-from utils.analysis.generate_2_page_summary import analyze_with_llm_openai
-from utils.analysis.generate_1_page_summary import summarize_text
+from utils.analysis.generate_2_page_summary import analyze_with_llm_openai, stream_analysis_with_llm_openai
+from utils.analysis.generate_1_page_summary import summarize_text, stream_summarize_text
+from utils.analysis.map_reduce_summary import summarize_text_map_reduce
 
 # I/O
-from utils.docx_io.save_analysis_to_docx import save_text_to_docx
-from utils.docx_io.read_from_docx import read_docx_file
+from utils.docx_io.save_analysis_to_docx import save_text_to_docx, stream_text_to_docx
+
+# Pipeline
+from utils.pipeline.pipeline_runner import PipelineConfig, PipelineError, run_pipeline
+
+# Tracing
+from utils.telemetry.tracing import parse_tracing_arguments, tracing_from_arguments
 
 
 warnings.filterwarnings("ignore")
@@ -36,6 +51,26 @@ def main():
     tesseract_path = r".\utils\TesseractOCR\tesseract.exe"
     set_paths(poppler_path, tesseract_path)
 
+    # Chunking parameters
+    chunk_size = 3000  # Changing these parameters will greatly affect the output
+    chunk_overlap = 200  # Changing these parameters will greatly affect the output
+    chunking_mode = "characters"  # 'characters', or 'tokens' to pack chunks to a token budget with source/page metadata
+    chunk_tokens = 800
+    chunk_overlap_tokens = 100
+    remove_running_headers = True  # Strips repeated page headers, footers and page numbers before chunking
+    remove_duplicate_chunks = True  # Drops repeated boilerplate and near-duplicate chunks before embedding
+    duplicate_threshold = 0.85  # Jaccard similarity above which two chunks count as duplicates
+    embedding_backend = "openai"  # 'openai', or 'local' to embed offline on the CPU (must match the backend the Knowledge Base was built with)
+    vector_store_backend = "chroma"  # 'chroma', or 'memmap' for a compact memory-mapped store that opens instantly
+    retrieval_mode = "hybrid"  # 'vector', or 'hybrid' to combine vector search with exact keyword (BM25) matches
+    report_mode = "sections"  # 'sections' generates the 8 report sections concurrently, 'single' uses one large prompt
+    section_concurrency = 4  # Maximum number of report sections generated at the same time
+    context_token_budget = 3000  # Tokens of retrieved context per generation, filled with diverse chunks (None for the top 4 chunks)
+    stream_output = True  # Prints the summaries as they are generated and writes the DOCX files line by line
+    summarize_filing = False  # Also writes a 1 page summary of the whole extracted text, using map-reduce for long filings
+    use_pipeline = True  # Runs PDF reports as checkpointed stages that resume from the first stage whose inputs changed (except streaming runs)
+    streaming = False
+
     # Check if the user wants to skip extraction and read from file
     while True:
         skip_extraction = input("Do you want to skip extraction from PDF and read directly from a file(txt/docx)? (yes/no): ").strip().lower()
@@ -67,12 +102,46 @@ def main():
             print('---------------------------------------------------------------------------------------------------')
             print("1. Low Memory Extraction: Suitable for low specification machines.")
             print("2. High Memory Extraction: Suitable for machines with higher memory. \n(Note: High Memory Extraction requires 16+ GB RAM & uses OCR and typically takes around 30 mins or more)")
+            print("3. Parallel OCR Extraction: Same output as High Memory Extraction, with pages processed on all CPU cores.")
+            print("4. Hybrid Extraction: Uses the PDF text layer and runs OCR only on scanned pages without usable text.")
+            print("5. Memory-Budgeted OCR Extraction: Same OCR as High Memory Extraction, keeping pages on disk to stay within a RAM budget you set (works with 4 GB RAM).")
             print('---------------------------------------------------------------------------------------------------')
-            user_input = input("Choose your method:\n'1' for Low Memory Extraction(Fast and Less Accurate)\n'2' for High Memory Extraction(Slow and More Accurate)\nYour Choice: ").strip()
-            if user_input in ['1', '2']:
+            user_input = input("Choose your method:\n'1' for Low Memory Extraction(Fast and Less Accurate)\n'2' for High Memory Extraction(Slow and More Accurate)\n'3' for Parallel OCR Extraction(Faster on multi-core machines and More Accurate)\n'4' for Hybrid Extraction(Fast and Accurate on mostly digital reports)\n'5' for Memory-Budgeted OCR Extraction(Slow and More Accurate, on low memory machines)\nYour Choice: ").strip()
+            if user_input in ['1', '2', '3', '4', '5']:
                 break
             else:
-                print("Invalid input, please enter '1' or '2'.")
+                print("Invalid input, please enter '1', '2', '3', '4' or '5'.")
+
+        ocr_workers = None
+        if user_input == '3':
+            while True:
+                workers_input = input("Enter the number of OCR worker processes (press Enter to use all CPU cores): ").strip()
+                if workers_input == '':
+                    break
+                if workers_input.isdigit() and int(workers_input) > 0:
+                    ocr_workers = int(workers_input)
+                    break
+                print("Invalid input, please enter a positive whole number.")
+
+        ocr_memory_budget_mb = DEFAULT_OCR_MEMORY_BUDGET_MB
+        if user_input == '5':
+            while True:
+                budget_input = input(f"Enter the RAM budget for OCR in MB (press Enter to use {DEFAULT_OCR_MEMORY_BUDGET_MB}): ").strip()
+                if budget_input == '':
+                    break
+                if budget_input.isdigit() and int(budget_input) > 0:
+                    ocr_memory_budget_mb = int(budget_input)
+                    break
+                print("Invalid input, please enter a positive whole number.")
+
+        # Streamed pages are never held in memory together, so streaming runs skip the checkpointed pipeline
+        while True:
+            streaming = input("Do you want to stream pages straight from extraction into chunking to keep memory use low? (yes/no): ").strip().lower()
+            if streaming in ['yes', 'no']:
+                streaming = streaming == 'yes'
+                break
+            else:
+                print("Invalid input, please enter 'yes' or 'no'.")
 
         print('---------------------------------------------------------------------------------------------------')
         print('Note:')
@@ -85,26 +154,116 @@ def main():
 
         pdf_paths = glob.glob(f'{input_directory}/*.pdf')
 
-        all_text_data = []
-        if user_input == '2':
-            print("You selected High Memory Extraction.")
-            for pdf_path in pdf_paths:
-                all_text_data.extend(extract_text_high_memory_OCR(pdf_path))
-            all_text_data = "\n\n".join(all_text_data)
+        if use_pipeline and not streaming:
+            # Checking to see if OpenAI API key is set up correctly
+            set_openai_api_key()
+            document_db_directory = input("Enter the name of company you are analyzing: ")
+            while True:
+                replace = input("Do you want to replace the Knowledge Base contents if it exists? (yes/no): ").strip().lower()
+                if replace in ["yes", "no"]:
+                    replace = replace == "yes"
+                    break
+                else:
+                    print("Invalid input. Please enter 'yes' or 'no'.")
+            methods = {'1': 'low_memory', '2': 'high_memory_ocr', '3': 'parallel_ocr', '4': 'hybrid', '5': 'budgeted_ocr'}
+            config = PipelineConfig(document_db_directory, methods[user_input], ocr_workers, ocr_memory_budget_mb, remove_running_headers,
+                                    chunking_mode, chunk_size, chunk_overlap, chunk_tokens, chunk_overlap_tokens, remove_duplicate_chunks,
+                                    duplicate_threshold, embedding_backend, vector_store_backend, retrieval_mode, report_mode,
+                                    section_concurrency, context_token_budget, stream_output, replace_existing=replace,
+                                    text_output_path='Output Files/output.txt', summarize_filing=summarize_filing)
+            try:
+                result = run_pipeline(pdf_paths, config)
+            except PipelineError as e:
+                print(f"{e} Run the program again to resume from this step.")
+                exit()
+            if not stream_output or "analyze" not in result.stages_run:
+                print('---------------------------------------------------------------------------------------------------')
+                print("2 Page Summary:")
+                print(result.analysis)
+            if not stream_output or "summarize" not in result.stages_run:
+                print('---------------------------------------------------------------------------------------------------')
+                print("1 Page Summary:")
+                print(result.summary)
+            print('---------------------------------------------------------------------------------------------------')
+            print("Extracted text has been saved to 'Output Files/output.txt'.")
+            if summarize_filing:
+                print("Filing Summary:")
+                print(result.filing_summary)
+                print('---------------------------------------------------------------------------------------------------')
+            print("\nBoth 1 and 2 page summaries have been generated. You can find them with the names 1 Page Summary.docx & 2 Page Summary.docx in the same directory.")
+            return
+
+        if streaming:
+            methods = {'1': 'low_memory', '2': 'high_memory_ocr', '3': 'parallel_ocr', '4': 'hybrid', '5': 'budgeted_ocr'}
+            options = {'3': {'max_workers': ocr_workers}, '5': {'memory_budget_mb': ocr_memory_budget_mb}}.get(user_input, {})
+            print(f"You selected streaming {methods[user_input].replace('_', ' ')} extraction.")
+            page_records = stream_pdf_pages(pdf_paths, methods[user_input], **options)
+            if remove_running_headers:
+                page_records = iter_stripped_pages(page_records)
+            page_records = tee_pages_to_file(page_records, 'Output Files/output.txt')
+            if chunking_mode == "tokens":
+                chunks = list(iter_token_chunks(page_records, chunk_tokens, chunk_overlap_tokens))
+            else:
+                chunks = list(stream_chunk_pages(page_records, chunk_size, chunk_overlap))
+            print("Extracted text has been saved to 'Output Files/output.txt'.")
         else:
-            print("You selected Low Memory Extraction.")
-            all_text_data=""
-            for pdf_path in pdf_paths:
-                all_text_data+=(extract_text_low_memory(pdf_path))
+            all_text_data = []
+            # The source file and page number of every page, for the page metadata of token chunks
+            page_records = []
+            if user_input == '2':
+                print("You selected High Memory Extraction.")
+                for pdf_path in pdf_paths:
+                    pages = extract_text_high_memory_OCR(pdf_path)
+                    pages = strip_running_headers(pages) if remove_running_headers else pages
+                    all_text_data.extend(pages)
+                    page_records.extend(PageRecord(pdf_path, page_number, text) for page_number, text in enumerate(pages, start=1))
+                all_text_data = "\n\n".join(all_text_data)
+            elif user_input == '3':
+                print("You selected Parallel OCR Extraction.")
+                for pdf_path in pdf_paths:
+                    pages = extract_text_parallel_OCR(pdf_path, max_workers=ocr_workers)
+                    pages = strip_running_headers(pages) if remove_running_headers else pages
+                    all_text_data.extend(pages)
+                    page_records.extend(PageRecord(pdf_path, page_number, text) for page_number, text in enumerate(pages, start=1))
+                all_text_data = "\n\n".join(all_text_data)
+            elif user_input == '4':
+                print("You selected Hybrid Extraction.")
+                for pdf_path in pdf_paths:
+                    text = extract_text_hybrid(pdf_path)
+                    text = strip_running_headers_from_text(text) if remove_running_headers else text
+                    all_text_data.append(text)
+                    page_records.extend(records_from_text(text, pdf_path))
+                all_text_data = "".join(all_text_data)
+            elif user_input == '5':
+                print("You selected Memory-Budgeted OCR Extraction.")
+                for pdf_path in pdf_paths:
+                    pages = extract_text_budgeted_OCR(pdf_path, memory_budget_mb=ocr_memory_budget_mb)
+                    pages = strip_running_headers(pages) if remove_running_headers else pages
+                    all_text_data.extend(pages)
+                    page_records.extend(PageRecord(pdf_path, page_number, text) for page_number, text in enumerate(pages, start=1))
+                all_text_data = "\n\n".join(all_text_data)
+            else:
+                print("You selected Low Memory Extraction.")
+                for pdf_path in pdf_paths:
+                    text = extract_text_low_memory(pdf_path)
+                    text = strip_running_headers_from_text(text) if remove_running_headers else text
+                    all_text_data.append(text)
+                    page_records.extend(records_from_text(text, pdf_path))
+                all_text_data = "".join(all_text_data)
 
-        # Save the extracted text to a file if the user chose to do so
-        save_text_to_file(all_text_data, 'Output Files/output.txt')
-        print("Extracted text will saved to 'Output Files/output.txt'.")
+            # Save the extracted text to a file if the user chose to do so
+            save_text_to_file(all_text_data, 'Output Files/output.txt')
+            print("Extracted text will saved to 'Output Files/output.txt'.")
 
     # Chunking the text data into documents for further processing
-    chunk_size = 3000  # Changing these parameters will greatly affect the output
-    chunk_overlap = 200  # Changing these parameters will greatly affect the output
-    chunks = process_pdf_texts(all_text_data, chunk_size, chunk_overlap)
+    if not streaming:
+        if chunking_mode == "tokens":
+            # Text read back from a file has no source and is split into pages at its 'Page N' markers
+            chunks = token_chunk_text(page_records if skip_extraction == 'no' else all_text_data, chunk_tokens, chunk_overlap_tokens)
+        else:
+            chunks = process_pdf_texts(all_text_data, chunk_size, chunk_overlap)
+    if remove_duplicate_chunks:
+        chunks = deduplicate_chunks(chunks, duplicate_threshold)
 
     # Checking to see if OpenAI API key is set up correctly
     set_openai_api_key()
@@ -121,7 +280,8 @@ def main():
             break
         else:
             print("Invalid input. Please enter 'yes' or 'no'.")
-    directory_creation_success_flag = store_embeddings_openai(chunks, document_db_directory,replace)
+    directory_creation_success_flag = store_embeddings_openai(chunks, document_db_directory, replace, embedding_backend=embedding_backend,
+                                                              vector_store_backend=vector_store_backend)
 
     if directory_creation_success_flag:
         print(f"Successfully created and stored embeddings for {document_db_directory}.")
@@ -129,31 +289,55 @@ def main():
         print("Error storing embeddings. Please restart the IDE and try again.")
         exit()
 
-    # Perform LLM-based analysis
-    analysis = analyze_with_llm_openai(document_db_directory)
-    print('---------------------------------------------------------------------------------------------------')
-    print("2 Page Summary:")
-    print(analysis)
-    print('---------------------------------------------------------------------------------------------------')
-    save_text_to_docx(analysis, "Output Files/2 Page Summary.docx")
-
     # File paths
     input_file_path_2page = "Output Files/2 Page Summary.docx"
     output_file_path_1page = "Output Files/1 Page Summary.docx"
 
-    # Step 1: Read the text from the 2-page .docx file
-    text_2page = read_docx_file(input_file_path_2page)
+    if stream_output:
+        # Perform LLM-based analysis, printing and writing it as it is generated
+        print('---------------------------------------------------------------------------------------------------')
+        print("2 Page Summary:")
+        analysis = stream_text_to_docx(stream_analysis_with_llm_openai(document_db_directory, embedding_backend, vector_store_backend,
+                                                                       retrieval_mode, report_mode, section_concurrency,
+                                                                       context_token_budget=context_token_budget),
+                                       input_file_path_2page)
+        print('---------------------------------------------------------------------------------------------------')
+
+        # Summarize the 2 page text as soon as it is complete, without reading it back from the .docx file
+        print("1 Page Summary:")
+        condensed_summary_1page = stream_text_to_docx(stream_summarize_text(analysis), output_file_path_1page)
+        print('---------------------------------------------------------------------------------------------------')
+    else:
+        # Perform LLM-based analysis
+        analysis = analyze_with_llm_openai(document_db_directory, embedding_backend, vector_store_backend, retrieval_mode,
+                                          report_mode, section_concurrency, context_token_budget=context_token_budget)
+        print('---------------------------------------------------------------------------------------------------')
+        print("2 Page Summary:")
+        print(analysis)
+        print('---------------------------------------------------------------------------------------------------')
+        save_text_to_docx(analysis, input_file_path_2page)
 
-    # Step 2: Summarize the text to 300-400 words (approx. 1-page)
-    condensed_summary_1page = summarize_text(text_2page)
+        # Step 1: Summarize the 2 page text to 300-400 words (approx. 1-page), without reading it back from the .docx file
+        condensed_summary_1page = summarize_text(analysis)
 
-    # Step 3: Write the summarized text to the 1-page output .docx file
-    save_text_to_docx(condensed_summary_1page, output_file_path_1page)
-    print("1 Page Summary:")
-    print(condensed_summary_1page)
-    print('---------------------------------------------------------------------------------------------------')
+        # Step 2: Write the summarized text to the 1-page output .docx file
+        save_text_to_docx(condensed_summary_1page, output_file_path_1page)
+        print("1 Page Summary:")
+        print(condensed_summary_1page)
+        print('---------------------------------------------------------------------------------------------------')
+
+    # Optional 1 page summary of the raw filing rather than of the 2 page report
+    if summarize_filing:
+        filing_text = read_text_file('Output Files/output.txt', 'txt') if streaming else all_text_data
+        filing_summary = summarize_text_map_reduce(filing_text)
+        save_text_to_docx(filing_summary, "Output Files/Filing Summary.docx")
+        print("Filing Summary:")
+        print(filing_summary)
+        print('---------------------------------------------------------------------------------------------------')
     print("\nBoth 1 and 2 page summaries have been generated. You can find them with the names 1 Page Summary.docx & 2 Page Summary.docx in the same directory.")
 
 if __name__ == "__main__":
-    main()
+    # 'python main.py --profile' prints a per-stage timing and memory breakdown at the end of the run
+    with tracing_from_arguments(parse_tracing_arguments("Generate 1 and 2 page summaries of a company's PDF reports.")):
+        main()
  
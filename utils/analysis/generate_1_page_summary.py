@@ -1,10 +1,16 @@
 from langchain.prompts import PromptTemplate
-from langchain_community.chat_models import ChatOpenAI
 from langchain.chains.llm import LLMChain
 import logging
 
+from utils.analysis.llm_cache import get_llm_cache, llm_cache_stats, stream_chat
+from utils.scheduler.openai_clients import create_chat_model
+from utils.telemetry.tracing import traced, generation_attributes
+
 logging.basicConfig(level=logging.INFO)
 
+# Returned instead of the summary when it fails
+SUMMARY_ERROR_MESSAGE = "An error occurred during summary generation."
+
 def create_summary_prompt_template() -> PromptTemplate:
     """Creates a prompt template for generating a one-page summary.
 
@@ -23,12 +29,14 @@ def create_summary_prompt_template() -> PromptTemplate:
     """
     return PromptTemplate.from_template(template)
 
-def summarize_text(text: str) -> str:
+@traced(attributes=generation_attributes)
+def summarize_text(text: str, use_cache: bool = True) -> str:
     """
     Generates a one-page summary of the provided text using OpenAI's GPT-4 model.
 
     Args:
         text (str): The text to summarize.
+        use_cache (bool): Whether to reuse a cached response when the same text was summarized before.
 
     Returns:
         str: The one-page summary from the LLM.
@@ -36,15 +44,38 @@ def summarize_text(text: str) -> str:
     try:
         prompt = create_summary_prompt_template()
 
-        llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.0)
+        llm = create_chat_model(model="gpt-4o-mini", temperature=0.0, cache=get_llm_cache() if use_cache else False)
 
         llm_chain = LLMChain(llm=llm, prompt=prompt)
 
         response = llm_chain.run({"context": "", "input": text})
+        logging.info(f"LLM cache: {llm_cache_stats()}")
 
         # If response is a string directly
         return response
     except Exception as e:
         logging.error(f"Error during summary generation: {e}")
-        return "An error occurred during summary generation."
+        return SUMMARY_ERROR_MESSAGE
+
+@traced(item_name="fragments")
+def stream_summarize_text(text: str, use_cache: bool = True):
+    """
+    Streams the one-page summary of `summarize_text` as it is generated.
+
+    Args:
+        text (str): The text to summarize.
+        use_cache (bool): Whether to reuse a cached response when the same text was summarized before.
 
+    Yields:
+        str: Pieces of the summary, as they arrive from the LLM.
+    """
+    try:
+        prompt = create_summary_prompt_template()
+
+        llm = create_chat_model(model="gpt-4o-mini", temperature=0.0, cache=get_llm_cache() if use_cache else False)
+
+        yield from stream_chat(llm, prompt.format_prompt(context="", input=text))
+        logging.info(f"LLM cache: {llm_cache_stats()}")
+    except Exception as e:
+        logging.error(f"Error during summary generation: {e}")
+        yield SUMMARY_ERROR_MESSAGE
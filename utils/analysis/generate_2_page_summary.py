@@ -1,25 +1,69 @@
 from langchain.prompts import PromptTemplate
-from langchain_community.chat_models import ChatOpenAI
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains.retrieval import create_retrieval_chain
 from langchain.chains.llm import LLMChain
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import OpenAIEmbeddings
+from langchain_core.vectorstores import VectorStore
 import logging
 
+from utils.embeddings.vector_store_backends import get_shared_vector_store
+from utils.retrieval.hybrid_retriever import create_retriever
+from utils.analysis.generate_report_sections import generate_report_sections, iter_report_sections, format_context
+from utils.analysis.llm_cache import get_llm_cache, llm_cache_stats, stream_chat
+from utils.scheduler.openai_clients import create_chat_model
+from utils.telemetry.tracing import traced, generation_attributes
+
 logging.basicConfig(level=logging.INFO)
 
-def initialize_document_db(directory: str) -> Chroma:
-    """Initializes the document database.
+# Returned instead of the analysis when it fails
+ANALYSIS_ERROR_MESSAGE = "An error occurred during analysis."
+
+# Instructions for generating the whole 2 page report in a single call
+REPORT_INSTRUCTIONS = """
+        Use the vectors present in database. If not present, use your own knowledge base, but don't overwrite any thing which is already present in the provided knowledge base.
+        Carefully check the company name about which the financial report is being made.
+        Answer in 570 words with 30 words buffer and dont add unnecessary space. Add titles for each section. Don't write any generic text like introducing and concluding, just make it look like a 2 page report.
+        Make sure the entire text fits in 2 A4 size pages and there is no white space in the end rather add some more essential information in the relevant sections. Make sure not to add any '*' or '**' or '***' to any of the headings or subheadings, and make it look like a clean report.
+        Instead of using word 'company' use the name of the company in the report.
+        Make sure you are using the same company name about which the whole report is, throughout the report.
+        Make sure you give the correct information about the company and any external info that you are giving is accurate.
+        Add '###' for any headings or titles. In total there will be only 8 headings. 
+        Give the given company's business overview. Include information such as the company's formation/incorporation date of first headquarter, headquarters location, business description, employee count, latest revenues, stock exchange listing and market capitalization, number of offices and locations, and details on their clients.
+
+        Business Segment Overview
+        Extract the revenue percentage of each component (verticals, products, segments, and sections) as a part of the total revenue.
+        Performance: Evaluate the performance of each component by comparing the current year's sales perrevenue and market share with the previous year's numbers.  
+        Sales Increase/Decrease explanation: Explain the causes of the increase or decrease in the performance of each component.
+
+
+        Breakdown of sales and revenue by geography, specifying the percentage contribution of each region to the total sales.
+
+        Summarize geographical data, such as workforce, clients, and offices, and outline the company's regional plans for expansion or reduction.
+
+        Analyze and explain regional sales fluctuations, including a geographical sales breakdown to identify sales trends.
+
+        Year-over-year sales increase or decline and reasons for the change
+
+        Summary of rationale & considerations (risks & mitigating factors)
+
+        SWOT Analysis
+
+        Information about credit rating/credit rating change/change in the rating outlook.
+    
+        """
+
+def initialize_document_db(directory: str, embedding_backend: str = "openai", vector_store_backend: str = "chroma") -> VectorStore:
+    """Initializes the document database, reusing the handle opened by earlier calls in this process.
 
     Args:
         directory (str): Path to the directory containing the document database.
+        embedding_backend (str): The embedding backend the database was built with ('openai' or 'local').
+        vector_store_backend (str): The vector store the database was built with ('chroma' or 'memmap').
 
     Returns:
-        Chroma: Initialized document database.
+        VectorStore: Initialized document database.
     """
     try:
-        return Chroma(persist_directory=directory, embedding_function=OpenAIEmbeddings())
+        return get_shared_vector_store(directory, embedding_backend, vector_store_backend)
     except Exception as e:
         logging.error(f"Error initializing document database at {directory}: {e}")
         raise
@@ -39,23 +83,40 @@ def create_prompt_template() -> PromptTemplate:
     """
     return PromptTemplate.from_template(template)
 
-def analyze_with_llm_openai(document_db_directory: str) -> str:
+@traced(attributes=generation_attributes)
+def analyze_with_llm_openai(document_db_directory: str, embedding_backend: str = "openai", vector_store_backend: str = "chroma",
+                            retrieval_mode: str = "vector", report_mode: str = "single", max_concurrency: int = 4,
+                            use_cache: bool = True, context_token_budget: int = None) -> str:
     """
     Analyzes documents in a vector database using OpenAI's GPT-4 model.
     
     Args:
         document_db_directory (str): Path to the directory containing the document database.
+        embedding_backend (str): The embedding backend the database was built with ('openai' or 'local').
+        vector_store_backend (str): The vector store the database was built with ('chroma' or 'memmap').
+        retrieval_mode (str): 'vector', or 'hybrid' to fuse vector search with the BM25 keyword index.
+        report_mode (str): 'single' for one retrieval and generation over the whole report, or 'sections'
+            to retrieve and generate each of the 8 sections separately and concurrently.
+        max_concurrency (int): Maximum number of sections generated at the same time in 'sections' mode.
+        use_cache (bool): Whether to reuse responses from the persistent LLM cache when the prompt and context are unchanged.
+        context_token_budget (int): Maximum tokens of retrieved context per generation, filled with diverse chunks
+            reranked by maximal marginal relevance. None passes the retriever's top chunks unchanged.
     
     Returns:
         str: The analysis result from the LLM.
     """
     try:
-        document_db = initialize_document_db(document_db_directory)
-        retriever = document_db.as_retriever()
+        document_db = initialize_document_db(document_db_directory, embedding_backend, vector_store_backend)
+        retriever = create_retriever(document_db, document_db_directory, retrieval_mode, context_token_budget=context_token_budget)
         
         prompt = create_prompt_template()
 
-        llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.0)
+        llm = create_chat_model(model="gpt-4o-mini", temperature=0.0, cache=get_llm_cache() if use_cache else False)
+
+        if report_mode == "sections":
+            answer = generate_report_sections(retriever, llm, max_concurrency=max_concurrency)
+            logging.info(f"LLM cache: {llm_cache_stats()}")
+            return answer
 
         llm_chain = LLMChain(llm=llm, prompt=prompt)
         combine_docs_chain = create_stuff_documents_chain(llm, prompt)
@@ -98,40 +159,40 @@ def analyze_with_llm_openai(document_db_directory: str) -> str:
 
 
 
-        response = retrieval_chain.invoke({"input": """
-        Use the vectors present in database. If not present, use your own knowledge base, but don't overwrite any thing which is already present in the provided knowledge base.
-        Carefully check the company name about which the financial report is being made.
-        Answer in 570 words with 30 words buffer and dont add unnecessary space. Add titles for each section. Don't write any generic text like introducing and concluding, just make it look like a 2 page report.
-        Make sure the entire text fits in 2 A4 size pages and there is no white space in the end rather add some more essential information in the relevant sections. Make sure not to add any '*' or '**' or '***' to any of the headings or subheadings, and make it look like a clean report.
-        Instead of using word 'company' use the name of the company in the report.
-        Make sure you are using the same company name about which the whole report is, throughout the report.
-        Make sure you give the correct information about the company and any external info that you are giving is accurate.
-        Add '###' for any headings or titles. In total there will be only 8 headings. 
-        Give the given company's business overview. Include information such as the company's formation/incorporation date of first headquarter, headquarters location, business description, employee count, latest revenues, stock exchange listing and market capitalization, number of offices and locations, and details on their clients.
-
-        Business Segment Overview
-        Extract the revenue percentage of each component (verticals, products, segments, and sections) as a part of the total revenue.
-        Performance: Evaluate the performance of each component by comparing the current year's sales perrevenue and market share with the previous year's numbers.  
-        Sales Increase/Decrease explanation: Explain the causes of the increase or decrease in the performance of each component.
-
-
-        Breakdown of sales and revenue by geography, specifying the percentage contribution of each region to the total sales.
-
-        Summarize geographical data, such as workforce, clients, and offices, and outline the company's regional plans for expansion or reduction.
-
-        Analyze and explain regional sales fluctuations, including a geographical sales breakdown to identify sales trends.
-
-        Year-over-year sales increase or decline and reasons for the change
+        response = retrieval_chain.invoke({"input": REPORT_INSTRUCTIONS})
+        
+        logging.info(f"LLM cache: {llm_cache_stats()}")
+        return response['answer']
+    except Exception as e:
+        logging.error(f"Error during analysis: {e}")
+        return ANALYSIS_ERROR_MESSAGE
 
-        Summary of rationale & considerations (risks & mitigating factors)
+@traced(item_name="fragments")
+def stream_analysis_with_llm_openai(document_db_directory: str, embedding_backend: str = "openai", vector_store_backend: str = "chroma",
+                                    retrieval_mode: str = "vector", report_mode: str = "single", max_concurrency: int = 4,
+                                    use_cache: bool = True, context_token_budget: int = None):
+    """
+    Streams the analysis of `analyze_with_llm_openai` as it is generated.
 
-        SWOT Analysis
+    Takes the same arguments as `analyze_with_llm_openai`. In 'sections' mode the sections still run
+    concurrently and are streamed in report order.
 
-        Information about credit rating/credit rating change/change in the rating outlook.
-    
-        """})
-        
-        return response['answer']
+    Yields:
+        str: Pieces of the analysis text, as they arrive from the LLM.
+    """
+    try:
+        document_db = initialize_document_db(document_db_directory, embedding_backend, vector_store_backend)
+        retriever = create_retriever(document_db, document_db_directory, retrieval_mode, context_token_budget=context_token_budget)
+
+        llm = create_chat_model(model="gpt-4o-mini", temperature=0.0, cache=get_llm_cache() if use_cache else False)
+
+        if report_mode == "sections":
+            yield from iter_report_sections(retriever, llm, max_concurrency=max_concurrency)
+        else:
+            documents = retriever.invoke(REPORT_INSTRUCTIONS)
+            prompt_value = create_prompt_template().format_prompt(context=format_context(documents), input=REPORT_INSTRUCTIONS)
+            yield from stream_chat(llm, prompt_value)
+        logging.info(f"LLM cache: {llm_cache_stats()}")
     except Exception as e:
         logging.error(f"Error during analysis: {e}")
-        return "An error occurred during analysis."
+        yield ANALYSIS_ERROR_MESSAGE
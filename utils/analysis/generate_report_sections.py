@@ -0,0 +1,219 @@
+import time
+import queue
+import asyncio
+import logging
+import threading
+from typing import List, NamedTuple
+
+from langchain.prompts import PromptTemplate
+from langchain.chains.combine_documents import create_stuff_documents_chain
+
+from utils.analysis.llm_cache import astream_chat
+
+logging.basicConfig(level=logging.INFO)
+
+class ReportSection(NamedTuple):
+    """One section of the 2 page report."""
+    title: str
+    query: str  # Targeted retrieval query for this section
+    instruction: str
+    words: int
+
+# The 8 sections of the 2 page report, in report order (about 570 words in total)
+REPORT_SECTIONS = [
+    ReportSection(
+        "Business Overview",
+        "company history incorporation date headquarters business description employees revenue stock exchange listing market capitalization offices locations clients",
+        "Give the company's business overview. Include information such as the company's formation/incorporation date of first headquarter, headquarters location, business description, employee count, latest revenues, stock exchange listing and market capitalization, number of offices and locations, and details on their clients.",
+        90,
+    ),
+    ReportSection(
+        "Business Segment Overview",
+        "revenue by segment product vertical division percentage of total revenue segment performance compared to previous year",
+        "Extract the revenue percentage of each component (verticals, products, segments, and sections) as a part of the total revenue. Evaluate the performance of each component by comparing the current year's revenue and market share with the previous year's numbers, and explain the causes of the increase or decrease in the performance of each component.",
+        90,
+    ),
+    ReportSection(
+        "Geographical Segment Overview",
+        "revenue by geography region country percentage of total sales regional sales growth decline",
+        "Break down sales and revenue by geography, specifying the percentage contribution of each region to the total sales. Analyze and explain regional sales fluctuations to identify sales trends.",
+        80,
+    ),
+    ReportSection(
+        "Regional Presence and Plans",
+        "employees workforce clients offices by region expansion plans new markets closures",
+        "Summarize geographical data, such as workforce, clients, and offices, and outline the company's regional plans for expansion or reduction.",
+        50,
+    ),
+    ReportSection(
+        "Year-over-Year Sales Performance",
+        "total revenue net sales compared to prior year increase decrease reasons fiscal year",
+        "Describe the year-over-year sales increase or decline and the reasons for the change.",
+        60,
+    ),
+    ReportSection(
+        "Rationale and Considerations",
+        "risk factors uncertainties mitigating factors outlook strategy",
+        "Summarize the rationale and considerations for the company, covering the main risks and their mitigating factors.",
+        70,
+    ),
+    ReportSection(
+        "SWOT Analysis",
+        "strengths weaknesses opportunities threats competition market position",
+        "Give a SWOT analysis of the company, with its strengths, weaknesses, opportunities and threats.",
+        80,
+    ),
+    ReportSection(
+        "Credit Rating",
+        "credit rating outlook Moody's S&P Fitch upgrade downgrade debt",
+        "Give information about the credit rating, any credit rating change and any change in the rating outlook.",
+        50,
+    ),
+]
+
+def create_section_prompt_template() -> PromptTemplate:
+    """Creates the prompt template used for a single report section.
+
+    Returns:
+        PromptTemplate: The prompt template.
+    """
+    template = """
+    You are a helpful Financial assistant writing one section of a 2 page financial report.
+    Use the context provided. If the information is not present, use your own knowledge base, but don't overwrite any thing which is already present in the provided context.
+    Carefully check the company name about which the financial report is being made, and use the name of the company instead of the word 'company'.
+    Make sure you give the correct information about the company and any external info that you are giving is accurate.
+    Answer in around {words} words. Don't write a heading for the section and don't write any generic introducing or concluding text.
+    Make sure not to add any '*' or '**' or '***', and make it look like a clean report.
+    context: {context}
+    input: {input}
+    ANSWER
+    """
+    return PromptTemplate.from_template(template)
+
+def assemble_report(sections: List[ReportSection], bodies: List[str]) -> str:
+    """Joins the generated section bodies under their '###' headings, in report order."""
+    return "\n\n".join(f"### {section.title}\n{body.strip()}" for section, body in zip(sections, bodies))
+
+async def agenerate_report_sections(retriever, llm, sections: List[ReportSection] = REPORT_SECTIONS, max_concurrency: int = 4) -> str:
+    """
+    Generates the report one section at a time, with the sections running concurrently.
+
+    Each section retrieves its own context with a targeted query, so the chunks passed to the LLM
+    are relevant to that section only. At most `max_concurrency` sections run at once.
+
+    Args:
+        retriever (BaseRetriever): Retriever over the company's Knowledge Base.
+        llm (BaseLanguageModel): The chat model. Any LangChain model works, e.g. a fake model for offline tests.
+        sections (list of ReportSection): The sections to generate, in report order.
+        max_concurrency (int): Maximum number of sections generated at the same time.
+
+    Returns:
+        str: The assembled report, with a '###' heading per section.
+    """
+    chain = create_stuff_documents_chain(llm, create_section_prompt_template())
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def generate(section):
+        async with semaphore:
+            start = time.perf_counter()
+            documents = await retriever.ainvoke(section.query)
+            body = await chain.ainvoke({"context": documents, "input": section.instruction, "words": section.words})
+            logging.info(f"Generated section '{section.title}' in {time.perf_counter() - start:.2f}s.")
+            return body
+
+    start = time.perf_counter()
+    bodies = await asyncio.gather(*(generate(section) for section in sections))
+    logging.info(f"Generated {len(sections)} report sections in {time.perf_counter() - start:.2f}s.")
+    return assemble_report(sections, bodies)
+
+def generate_report_sections(retriever, llm, sections: List[ReportSection] = REPORT_SECTIONS, max_concurrency: int = 4) -> str:
+    """Synchronous wrapper around `agenerate_report_sections` for callers without an event loop."""
+    return asyncio.run(agenerate_report_sections(retriever, llm, sections, max_concurrency))
+
+def format_context(documents) -> str:
+    """Joins retrieved documents the same way `create_stuff_documents_chain` does, so prompts and cache keys match."""
+    return "\n\n".join(document.page_content for document in documents)
+
+async def astream_report_sections(retriever, llm, sections: List[ReportSection] = REPORT_SECTIONS, max_concurrency: int = 4):
+    """
+    Streams the report in order while the sections are generated concurrently.
+
+    The first section is streamed as its tokens arrive. Later sections keep generating in the
+    background, and their buffered text follows as soon as the sections before them are complete.
+
+    Args:
+        retriever (BaseRetriever): Retriever over the company's Knowledge Base.
+        llm (BaseChatModel): The chat model. It must support streaming, e.g. ChatOpenAI or a fake chat model.
+        sections (list of ReportSection): The sections to generate, in report order.
+        max_concurrency (int): Maximum number of sections generated at the same time.
+
+    Yields:
+        str: Pieces of the report, including the '###' section headings.
+    """
+    prompt = create_section_prompt_template()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    queues = [asyncio.Queue() for _ in sections]
+
+    async def generate(section, pieces):
+        try:
+            async with semaphore:
+                documents = await retriever.ainvoke(section.query)
+                prompt_value = prompt.format_prompt(context=format_context(documents), input=section.instruction, words=section.words)
+                async for piece in astream_chat(llm, prompt_value):
+                    await pieces.put(piece)
+        finally:
+            await pieces.put(None)
+
+    tasks = [asyncio.create_task(generate(section, pieces)) for section, pieces in zip(sections, queues)]
+    try:
+        for index, (section, pieces, task) in enumerate(zip(sections, queues, tasks)):
+            yield ("\n\n" if index else "") + f"### {section.title}\n"
+            started = False
+            while True:
+                piece = await pieces.get()
+                if piece is None:
+                    break
+                if not started:
+                    piece = piece.lstrip()
+                    started = bool(piece)
+                if piece:
+                    yield piece
+            # Raises the section's error, if it failed
+            await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def iter_report_sections(retriever, llm, sections: List[ReportSection] = REPORT_SECTIONS, max_concurrency: int = 4):
+    """
+    Synchronous wrapper around `astream_report_sections` for callers without an event loop.
+
+    The event loop runs on a background thread, and pieces are handed over through a queue.
+
+    Yields:
+        str: Pieces of the report, in order.
+    """
+    handoff = queue.Queue()
+    done = object()
+
+    async def produce():
+        async for piece in astream_report_sections(retriever, llm, sections, max_concurrency):
+            handoff.put(piece)
+
+    def run():
+        try:
+            asyncio.run(produce())
+            handoff.put(done)
+        except BaseException as e:
+            handoff.put(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    while True:
+        item = handoff.get()
+        if item is done:
+            break
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+    thread.join()
@@ -0,0 +1,134 @@
+import os
+import json
+import hashlib
+import argparse
+import logging
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration
+
+from utils.cache.sqlite_lru_cache import SQLiteLRUCache, DEFAULT_CACHE_DIRECTORY
+
+logging.basicConfig(level=logging.INFO)
+
+LLM_CACHE_PATH = os.path.join(DEFAULT_CACHE_DIRECTORY, "llm_cache.sqlite")
+LLM_CACHE_MAX_BYTES = 256 * 1024 * 1024
+LLM_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+
+_llm_cache = None
+
+class SQLiteLLMCache(BaseCache):
+    """LangChain LLM cache stored in a SQLiteLRUCache, with expiry and size-based eviction.
+
+    Responses are keyed by the SHA-256 of the model string (model name and every generation
+    parameter) and the fully rendered prompt. The rendered prompt contains the retrieved chunks, so
+    a different retrieval result never returns a stale answer.
+    """
+
+    def __init__(self, cache):
+        """
+        Args:
+            cache (SQLiteLRUCache): The store holding the responses.
+        """
+        self.cache = cache
+
+    @staticmethod
+    def _key(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\n{prompt}".encode('utf-8')).hexdigest()
+
+    def lookup(self, prompt, llm_string):
+        value = self.cache.get(self._key(prompt, llm_string))
+        if value is None:
+            return None
+        return [loads(generation) for generation in json.loads(value)]
+
+    def update(self, prompt, llm_string, return_val):
+        value = json.dumps([dumps(generation) for generation in return_val]).encode('utf-8')
+        self.cache.set(self._key(prompt, llm_string), value, tag="llm")
+
+    def clear(self, **kwargs):
+        self.cache.clear()
+
+    def stats(self):
+        """Returns the entry count, stored bytes and hit/miss counters of the cache."""
+        return self.cache.stats()
+
+def get_llm_cache():
+    """Returns the shared LLM response cache, opening it on first use.
+
+    Returns:
+        SQLiteLLMCache: The LLM response cache, passed as `cache=` to chat models.
+    """
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = SQLiteLLMCache(SQLiteLRUCache(LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES, LLM_CACHE_TTL_SECONDS))
+    return _llm_cache
+
+def llm_cache_stats():
+    """Returns the statistics of the shared LLM response cache, including hits and misses of this run."""
+    return get_llm_cache().stats()
+
+def _cache_entry(llm, prompt_value):
+    """Returns the cache, prompt and model string that the chat model itself would use for this prompt."""
+    cache = llm.cache if isinstance(llm.cache, BaseCache) else None
+    if cache is None:
+        return None, None, None
+    return cache, dumps(prompt_value.to_messages()), llm._get_llm_string()
+
+def stream_chat(llm, prompt_value):
+    """
+    Streams the response of a chat model as text pieces, going through the model's cache.
+
+    LangChain skips the cache when streaming, so a cached response is yielded in one piece here and
+    a streamed response is stored under the same key a non-streaming call would use.
+
+    Args:
+        llm (BaseChatModel): The chat model.
+        prompt_value (PromptValue): The rendered prompt.
+
+    Yields:
+        str: Pieces of the response text.
+    """
+    cache, prompt, llm_string = _cache_entry(llm, prompt_value)
+    if cache is not None:
+        cached = cache.lookup(prompt, llm_string)
+        if cached:
+            yield cached[0].text
+            return
+    pieces = []
+    for chunk in llm.stream(prompt_value):
+        pieces.append(chunk.content)
+        yield chunk.content
+    if cache is not None:
+        cache.update(prompt, llm_string, [ChatGeneration(message=AIMessage(content="".join(pieces)))])
+
+async def astream_chat(llm, prompt_value):
+    """Async version of `stream_chat`."""
+    cache, prompt, llm_string = _cache_entry(llm, prompt_value)
+    if cache is not None:
+        cached = cache.lookup(prompt, llm_string)
+        if cached:
+            yield cached[0].text
+            return
+    pieces = []
+    async for chunk in llm.astream(prompt_value):
+        pieces.append(chunk.content)
+        yield chunk.content
+    if cache is not None:
+        cache.update(prompt, llm_string, [ChatGeneration(message=AIMessage(content="".join(pieces)))])
+
+def main():
+    """Command line entry point for inspecting and clearing the LLM response cache."""
+    parser = argparse.ArgumentParser(description="Inspect or clear the LLM response cache.")
+    parser.add_argument("--clear", action="store_true", help="Remove every cached response.")
+    args = parser.parse_args()
+
+    cache = get_llm_cache()
+    if args.clear:
+        logging.info(f"Removed {cache.cache.clear()} cached responses.")
+    logging.info(f"LLM cache at {LLM_CACHE_PATH}: {cache.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import time
+import asyncio
+import logging
+
+from langchain.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+
+from utils.analysis.generate_1_page_summary import create_summary_prompt_template, SUMMARY_ERROR_MESSAGE
+from utils.analysis.llm_cache import get_llm_cache, llm_cache_stats
+from utils.processing.token_chunk_text import count_tokens, token_chunk_text
+from utils.processing.split_and_chunk_text import combine_text_data
+from utils.scheduler.openai_clients import create_chat_model
+from utils.telemetry.tracing import traced, generation_attributes
+
+logging.basicConfig(level=logging.INFO)
+
+def create_map_prompt_template() -> PromptTemplate:
+    """Creates the prompt template used to summarize one part of a long document.
+
+    Returns:
+        PromptTemplate: The prompt template.
+    """
+    template = """
+    You are a professional financial analyst summarising one part of a long company report.
+    Summarise the text below in at most {words} words. Keep every figure that matters: revenues, percentages, segment and geographical numbers, year-over-year changes, risks, and credit ratings.
+    Don't add information that is not in the text, and don't add any '*' or '**'.
+    text: {input}
+    SUMMARY
+    """
+    return PromptTemplate.from_template(template)
+
+def create_reduce_prompt_template() -> PromptTemplate:
+    """Creates the prompt template used to merge partial summaries.
+
+    Returns:
+        PromptTemplate: The prompt template.
+    """
+    template = """
+    You are a professional financial analyst. The text below consists of summaries of consecutive parts of one company report.
+    Merge them into one summary of at most {words} words, in the same order, removing repetition but keeping every important figure.
+    Don't add information that is not in the summaries, and don't add any '*' or '**'.
+    summaries: {input}
+    SUMMARY
+    """
+    return PromptTemplate.from_template(template)
+
+def group_by_token_budget(texts, max_tokens, encoding_name="cl100k_base"):
+    """
+    Packs consecutive texts into groups whose combined token count stays within `max_tokens`.
+
+    A text that is larger than the budget on its own forms its own group.
+
+    Args:
+        texts (list of str): The texts, in order.
+        max_tokens (int): Token budget per group.
+        encoding_name (str): tiktoken encoding used for counting.
+
+    Returns:
+        list of list of str: The groups, in order.
+    """
+    groups = []
+    group = []
+    group_tokens = 0
+    for text in texts:
+        tokens = count_tokens(text, encoding_name)
+        if group and group_tokens + tokens > max_tokens:
+            groups.append(group)
+            group = []
+            group_tokens = 0
+        group.append(text)
+        group_tokens += tokens
+    if group:
+        groups.append(group)
+    return groups
+
+def log_progress(stage, done, total):
+    """Default progress callback, logging each finished call."""
+    logging.info(f"Summarization {stage}: {done}/{total} done.")
+
+async def _run_stage(stage, chain, inputs, words, semaphore, progress):
+    done = 0
+
+    async def run(text):
+        nonlocal done
+        async with semaphore:
+            summary = await chain.ainvoke({"input": text, "words": words})
+        done += 1
+        progress(stage, done, len(inputs))
+        return summary
+
+    return await asyncio.gather(*(run(text) for text in inputs))
+
+async def asummarize_map_reduce(text, llm, map_chunk_tokens=6000, reduce_input_tokens=8000, partial_summary_words=250,
+                                max_concurrency=4, max_levels=5, progress=log_progress, encoding_name="cl100k_base"):
+    """
+    Summarizes a document of any length into the 1-page summary with map-reduce.
+
+    The text is cut into chunks of `map_chunk_tokens` tokens that are summarized in parallel (map).
+    Partial summaries are then packed into groups of at most `reduce_input_tokens` tokens and merged
+    in parallel, level by level, until they fit into a single call (reduce). The last call uses the
+    1-page summary prompt.
+
+    Every call goes through the LLM's cache, so when an interrupted job is run again, the calls that
+    had already finished are answered from the cache and the job resumes where it stopped.
+
+    Args:
+        text (str): The text to summarize.
+        llm (BaseLanguageModel): The chat model. Any LangChain model works, e.g. a fake model for offline tests.
+        map_chunk_tokens (int): Tokens per map chunk.
+        reduce_input_tokens (int): Maximum tokens passed to one reduce call and to the final call.
+        partial_summary_words (int): Target length of each map and reduce summary.
+        max_concurrency (int): Maximum number of LLM calls running at the same time.
+        max_levels (int): Maximum number of reduce levels before the final call.
+        progress (callable): Called with (stage, done, total) after every finished call.
+        encoding_name (str): tiktoken encoding used for counting.
+
+    Returns:
+        str: The 1-page summary.
+    """
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    parser = StrOutputParser()
+
+    summaries = [text]
+    if count_tokens(text, encoding_name) > reduce_input_tokens:
+        chunks = [chunk.page_content for chunk in token_chunk_text(text, map_chunk_tokens, 0, encoding_name)]
+        map_chain = create_map_prompt_template() | llm | parser
+        summaries = await _run_stage("map", map_chain, chunks, partial_summary_words, semaphore, progress)
+
+        reduce_chain = create_reduce_prompt_template() | llm | parser
+        level = 1
+        while len(summaries) > 1 and sum(count_tokens(s, encoding_name) for s in summaries) > reduce_input_tokens:
+            if level > max_levels:
+                logging.warning(f"Partial summaries still exceed {reduce_input_tokens} tokens after {max_levels} reduce levels.")
+                break
+            groups = ["\n\n".join(group) for group in group_by_token_budget(summaries, reduce_input_tokens, encoding_name)]
+            summaries = await _run_stage(f"reduce level {level}", reduce_chain, groups, partial_summary_words, semaphore, progress)
+            level += 1
+
+    final_chain = create_summary_prompt_template() | llm | parser
+    summary = await final_chain.ainvoke({"context": "", "input": "\n\n".join(summaries)})
+    progress("final", 1, 1)
+    logging.info(f"Map-reduce summarization finished in {time.perf_counter() - start:.2f}s.")
+    return summary
+
+@traced(attributes=generation_attributes)
+def summarize_text_map_reduce(text, use_cache: bool = True, max_concurrency: int = 4, progress=log_progress) -> str:
+    """
+    Generates a one-page summary of a text of any length using OpenAI's GPT-4 model with map-reduce.
+
+    Args:
+        text (str, list of str or iterable of PageRecord): The text to summarize, e.g. as read back from an
+            output .txt file, which is a list of paragraphs.
+        use_cache (bool): Whether to use the persistent LLM cache, which also lets an interrupted job resume.
+        max_concurrency (int): Maximum number of LLM calls running at the same time.
+        progress (callable): Called with (stage, done, total) after every finished call.
+
+    Returns:
+        str: The one-page summary from the LLM.
+    """
+    try:
+        llm = create_chat_model(model="gpt-4o-mini", temperature=0.0, cache=get_llm_cache() if use_cache else False)
+        summary = asyncio.run(asummarize_map_reduce(combine_text_data(text), llm, max_concurrency=max_concurrency, progress=progress))
+        logging.info(f"LLM cache: {llm_cache_stats()}")
+        return summary
+    except Exception as e:
+        logging.error(f"Error during map-reduce summary generation: {e}")
+        return SUMMARY_ERROR_MESSAGE
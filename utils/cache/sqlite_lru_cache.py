@@ -0,0 +1,199 @@
+import os
+import time
+import atexit
+import sqlite3
+import threading
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+# All persistent caches live under this folder, next to the main script
+DEFAULT_CACHE_DIRECTORY = ".cache"
+
+# A hit only refreshes an entry's last access time when it is older than this, and refreshed times are
+# written in batches, so reads rarely write to the file
+TOUCH_INTERVAL_SECONDS = 60.0
+TOUCH_BATCH_SIZE = 256
+
+class SQLiteLRUCache:
+    """A persistent key-value store in a single SQLite file with size-based LRU eviction.
+
+    Values are stored as bytes. Every entry can carry a tag so that a group of entries
+    (for example all pages of one PDF) can be invalidated together, and an optional expiry time.
+
+    Access times are kept to within `TOUCH_INTERVAL_SECONDS` and written lazily, with the next
+    `set`, once `TOUCH_BATCH_SIZE` are pending or when the cache is closed (at the latest at exit), and the total size of the values is tracked in
+    memory, so cache hits and stores do not scan or commit more than needed.
+    """
+
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, ttl_seconds=None):
+        """Opens (and creates if needed) the cache file.
+
+        Args:
+            path (str): Path to the SQLite file.
+            max_bytes (int): Total size of stored values above which the least recently used entries are evicted.
+            ttl_seconds (float): Default lifetime of new entries. None keeps entries until they are evicted.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._pending_touches = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, tag TEXT, value BLOB, size INTEGER, last_access REAL, expires REAL)"
+        )
+        # Cache files created before entries could expire lack the column
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(entries)")}
+        if "expires" not in columns:
+            self._conn.execute("ALTER TABLE entries ADD COLUMN expires REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_tag ON entries(tag)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries(last_access)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_expires ON entries(expires)")
+        self._conn.commit()
+        self._total_bytes = self._stored_bytes()
+        # Access times still pending when the process ends would otherwise be lost
+        atexit.register(self.close)
+
+    def _stored_bytes(self):
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _flush_touches(self):
+        """Writes the pending access times; the caller commits."""
+        if self._pending_touches:
+            self._conn.executemany("UPDATE entries SET last_access = ? WHERE key = ?",
+                                   [(last_access, key) for key, last_access in self._pending_touches.items()])
+            self._pending_touches.clear()
+
+    def get(self, key):
+        """Returns the value stored for a key and marks it as recently used.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            bytes: The stored value, or None if the key is not cached.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires, size, last_access FROM entries WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row is not None and row[1] is not None and row[1] <= now:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                self._pending_touches.pop(key, None)
+                self._total_bytes -= row[2]
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            if now - self._pending_touches.get(key, row[3]) >= TOUCH_INTERVAL_SECONDS:
+                self._pending_touches[key] = now
+                if len(self._pending_touches) >= TOUCH_BATCH_SIZE:
+                    self._flush_touches()
+                    self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, value, tag="", ttl_seconds=None):
+        """Stores a value, then evicts least recently used entries if the cache is over its size limit.
+
+        Args:
+            key (str): The cache key.
+            value (bytes): The value to store.
+            tag (str): Group label used by `delete_tag`.
+            ttl_seconds (float): Lifetime of this entry. Defaults to the cache's `ttl_seconds`.
+        """
+        now = time.time()
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires = now + ttl_seconds if ttl_seconds is not None else None
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, tag, value, size, last_access, expires) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, tag, value, len(value), now, expires),
+            )
+            self._pending_touches.pop(key, None)
+            self._total_bytes += len(value) - (previous[0] if previous else 0)
+            self._flush_touches()
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Deletes expired entries, then the least recently used entries until the total size is within the limit."""
+        now = time.time()
+        expired_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries WHERE expires <= ?", (now,)).fetchone()[0]
+        if expired_bytes:
+            self._conn.execute("DELETE FROM entries WHERE expires <= ?", (now,))
+            self._total_bytes -= expired_bytes
+        if self._total_bytes <= self.max_bytes:
+            return
+        # Other processes may write to the same file, so the running total is confirmed before evicting
+        total = self._total_bytes = self._stored_bytes()
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self._total_bytes = total
+        logging.info(f"Evicted {evicted} entries from {self.path}.")
+
+    def delete_tag(self, tag):
+        """Deletes every entry stored with the given tag.
+
+        Args:
+            tag (str): The group label.
+
+        Returns:
+            int: The number of deleted entries.
+        """
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM entries WHERE tag = ?", (tag,)).rowcount
+            self._conn.commit()
+            self._total_bytes = self._stored_bytes()
+            return deleted
+
+    def clear(self):
+        """Deletes every entry in the cache.
+
+        Returns:
+            int: The number of deleted entries.
+        """
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM entries").rowcount
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+            self._pending_touches.clear()
+            self._total_bytes = 0
+            return deleted
+
+    def stats(self):
+        """Returns the entry count, stored bytes and hit/miss counters of this cache.
+
+        Returns:
+            dict: Cache statistics.
+        """
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        """Writes the pending access times and closes the underlying SQLite connection."""
+        atexit.unregister(self.close)
+        with self._lock:
+            if self._conn is None:
+                return
+            self._flush_touches()
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
@@ -1,6 +1,8 @@
 from docx import Document
 import logging
 
+from utils.telemetry.tracing import traced, docx_attributes
+
 logging.basicConfig(level=logging.INFO)
 
 def add_heading(doc: Document, text: str, level: int) -> None:
@@ -28,6 +30,41 @@ def add_bold_paragraph(doc: Document, line: str) -> None:
     except IndexError:
         logging.error(f"Error processing bold text in line: {line}")
 
+def add_line(doc: Document, line: str) -> None:
+    """Adds one line of LLM output to the document, as a heading, bold paragraph or paragraph.
+    
+    Args:
+        doc (Document): The Word document.
+        line (str): The line of text.
+    """
+    try:
+        if line.startswith('####'):
+            add_heading(doc, line.replace('####', ''), level=1)
+        elif line.startswith('###'):
+            add_heading(doc, line.replace('###', ''), level=2)
+        elif line.startswith('- **'):
+            add_bold_paragraph(doc, line)
+        elif line.strip() == '':
+            return
+        else:
+            doc.add_paragraph(line.strip())
+    except Exception as e:
+        logging.error(f"Error processing line: {line}. Error: {e}")
+
+def save_docx(doc: Document, output_path: str) -> None:
+    """Saves a Word document, logging the outcome.
+    
+    Args:
+        doc (Document): The Word document.
+        output_path (str): Path to the output Word document.
+    """
+    try:
+        doc.save(output_path)
+        logging.info(f"Document saved successfully at {output_path}")
+    except Exception as e:
+        logging.error(f"Error saving document at {output_path}: {e}")
+
+@traced(attributes=docx_attributes)
 def save_text_to_docx(text_data: str, output_path: str) -> None:
     """Saves text data to a Word document.
     
@@ -39,22 +76,62 @@ def save_text_to_docx(text_data: str, output_path: str) -> None:
     lines = text_data.split('\n')
 
     for line in lines:
-        try:
-            if line.startswith('####'):
-                add_heading(doc, line.replace('####', ''), level=1)
-            elif line.startswith('###'):
-                add_heading(doc, line.replace('###', ''), level=2)
-            elif line.startswith('- **'):
-                add_bold_paragraph(doc, line)
-            elif line.strip() == '':
-                continue
-            else:
-                doc.add_paragraph(line.strip())
-        except Exception as e:
-            logging.error(f"Error processing line: {line}. Error: {e}")
+        add_line(doc, line)
+
+    save_docx(doc, output_path)
+
+class IncrementalDocxWriter:
+    """Builds a Word document from streamed text, adding each line as soon as it is complete.
+
+    Lines are formatted with the same rules as `save_text_to_docx`, so the saved document is the
+    same as writing the whole text at the end.
+    """
 
+    def __init__(self, output_path: str):
+        """
+        Args:
+            output_path (str): Path to the output Word document, written by `close`.
+        """
+        self.output_path = output_path
+        self.doc = Document()
+        self._buffer = ""
+
+    def write(self, text: str) -> None:
+        """Adds a piece of streamed text, writing every line it completes."""
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split('\n')
+        for line in lines:
+            add_line(self.doc, line)
+
+    def close(self) -> None:
+        """Writes the last line and saves the document."""
+        if self._buffer:
+            add_line(self.doc, self._buffer)
+            self._buffer = ""
+        save_docx(self.doc, self.output_path)
+
+@traced()
+def stream_text_to_docx(text_stream, output_path: str, echo: bool = True) -> str:
+    """Writes streamed text to a Word document line by line, echoing it to the console as it arrives.
+    
+    Args:
+        text_stream (iterable of str): Pieces of text, e.g. tokens from an LLM.
+        output_path (str): Path to the output Word document.
+        echo (bool): Whether to print each piece as it arrives.
+
+    Returns:
+        str: The complete text.
+    """
+    writer = IncrementalDocxWriter(output_path)
+    pieces = []
     try:
-        doc.save(output_path)
-        logging.info(f"Document saved successfully at {output_path}")
-    except Exception as e:
-        logging.error(f"Error saving document at {output_path}: {e}")
+        for piece in text_stream:
+            if echo:
+                print(piece, end='', flush=True)
+            writer.write(piece)
+            pieces.append(piece)
+    finally:
+        writer.close()
+        if echo:
+            print()
+    return "".join(pieces)
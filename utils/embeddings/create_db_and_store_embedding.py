@@ -52,31 +52,156 @@
 
 
 import os
+import time
 import shutil
-from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
+import hashlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import openai
 import logging
 
+from utils.embeddings.embedding_cache import CachedEmbeddings
+from utils.embeddings.embedding_backends import get_shared_embedding_function
+from utils.embeddings.vector_store_backends import open_vector_store, release_shared_vector_stores
+from utils.embeddings.memmap_vector_store import MemmapVectorStore
+from utils.retrieval.bm25_index import store_bm25_index
+from utils.telemetry.tracing import traced, embedding_attributes
+
 logging.basicConfig(level=logging.INFO)
 
-def store_embeddings_openai(chunks, document_db_directory, replace_existing=True):
-    """Stores embeddings of document chunks into a Chroma vector database using OpenAI embeddings.
+def chunk_id(chunk):
+    """Returns a stable ID for a chunk, so re-ingesting the same chunk updates it instead of adding a copy."""
+    source = chunk.metadata.get("source", "")
+    return hashlib.sha256(f"{source}\n{chunk.page_content}".encode('utf-8')).hexdigest()
+
+def ingest_batches(chunks, embed_batch, write_batch, batch_size=166, max_in_flight=4):
+    """Embeds batches of chunks concurrently and writes each batch as soon as its embeddings arrive.
+
+    At most `max_in_flight` embedding requests run at a time. Writes happen on the calling thread,
+    one batch at a time, so the vector store only ever has a single writer.
+
+    Args:
+        chunks (list of Document): The chunks to ingest.
+        embed_batch (callable): Takes a list of texts and returns a list of vectors.
+        write_batch (callable): Takes a list of chunks and their vectors and stores them.
+        batch_size (int): Number of chunks per embedding request.
+        max_in_flight (int): Maximum number of concurrent embedding requests.
+
+    Returns:
+        dict: The number of chunks and batches, elapsed seconds and chunks per second.
+    """
+    start = time.perf_counter()
+    batches = iter([chunks[i:i + batch_size] for i in range(0, len(chunks), batch_size)])
+    written = 0
+    batch_count = 0
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        def submit(batch):
+            # Runs in a copy of the caller's context, so the request spans nest under the ingestion span
+            return executor.submit(contextvars.copy_context().run, embed_batch, [chunk.page_content for chunk in batch])
+
+        pending = {}
+        for batch in batches:
+            pending[submit(batch)] = batch
+            if len(pending) >= max_in_flight:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch = pending.pop(future)
+                write_batch(batch, future.result())
+                written += len(batch)
+                batch_count += 1
+                next_batch = next(batches, None)
+                if next_batch is not None:
+                    pending[submit(next_batch)] = next_batch
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "chunks": written,
+        "batches": batch_count,
+        "seconds": elapsed,
+        "chunks_per_second": written / elapsed if elapsed > 0 else 0.0,
+    }
+    logging.info(f"Ingested {written} chunks in {batch_count} batches in {elapsed:.2f}s ({stats['chunks_per_second']:.1f} chunks/sec).")
+    return stats
+
+def chroma_batch_writer(vector_store):
+    """Returns a `write_batch` function that stores pre-computed embeddings in a Chroma collection.
+
+    Args:
+        vector_store (Chroma): The open vector store handle.
+
+    Returns:
+        callable: Takes a list of chunks and their vectors and upserts them into the collection.
+    """
+    def write_batch(batch, vectors):
+        ids = [chunk_id(chunk) for chunk in batch]
+        texts = [chunk.page_content for chunk in batch]
+        metadatas = [chunk.metadata for chunk in batch]
+        # Identical chunks share an ID, which Chroma rejects within one upsert, so only the last of them is written
+        last_index = {id_: i for i, id_ in enumerate(ids)}
+        unique = sorted(last_index.values())
+        # Chroma rejects empty metadata dicts, so chunks with and without metadata are written separately
+        with_metadata = [i for i in unique if metadatas[i]]
+        without_metadata = [i for i in unique if not metadatas[i]]
+        for indices, include_metadata in ((with_metadata, True), (without_metadata, False)):
+            if not indices:
+                continue
+            vector_store._collection.upsert(
+                ids=[ids[i] for i in indices],
+                embeddings=[vectors[i] for i in indices],
+                documents=[texts[i] for i in indices],
+                metadatas=[metadatas[i] for i in indices] if include_metadata else None,
+            )
+    return write_batch
+
+def memmap_batch_writer(vector_store):
+    """Returns a `write_batch` function that appends pre-computed embeddings to a MemmapVectorStore.
+
+    Args:
+        vector_store (MemmapVectorStore): The open vector store.
+
+    Returns:
+        callable: Takes a list of chunks and their vectors and appends the ones not stored yet.
+    """
+    def write_batch(batch, vectors):
+        vector_store.add_embeddings([chunk_id(chunk) for chunk in batch], [chunk.page_content for chunk in batch],
+                                    vectors, [chunk.metadata for chunk in batch])
+    return write_batch
+
+@traced(attributes=embedding_attributes)
+def store_embeddings_openai(chunks, document_db_directory, replace_existing=True, use_cache=True,
+                            embedding_function=None, max_in_flight=4, embedding_backend="openai",
+                            vector_store_backend="chroma", build_keyword_index=True):
+    """Stores embeddings of document chunks into a vector database, using OpenAI embeddings by default.
+
+    A single vector store handle is opened for the whole run. Batches are embedded concurrently and
+    written into the collection as they complete.
 
     Args:
         chunks (list): List of document chunks to be embedded.
-        document_db_directory (str): Directory where the Chroma vector database is persisted.
+        document_db_directory (str): Directory where the vector database is persisted.
         replace_existing (bool): Whether to replace existing contents if the directory exists.
+        use_cache (bool): Whether to reuse vectors from the persistent embedding cache, so only new chunks are sent to OpenAI.
+        embedding_function (Embeddings): Embedding function to use instead of OpenAI, e.g. a fake embedder for offline runs.
+        max_in_flight (int): Maximum number of concurrent embedding requests.
+        embedding_backend (str): 'openai', or 'local' to embed offline on the CPU. Ignored if `embedding_function` is given.
+        vector_store_backend (str): 'chroma', or 'memmap' for the memory-mapped NumPy store.
+        build_keyword_index (bool): Whether to also build the BM25 keyword index used for hybrid retrieval.
 
     Returns:
         bool: True if embeddings are stored successfully, False otherwise.
     """
     try:
-        # Initialize OpenAI API
-        openai.api_key = os.getenv('OPENAI_API_KEY')
+        if embedding_function is None and embedding_backend == "openai":
+            # Initialize OpenAI API
+            openai.api_key = os.getenv('OPENAI_API_KEY')
+
+            if not openai.api_key:
+                raise ValueError("OpenAI API key not found in environment variables.")
 
-        if not openai.api_key:
-            raise ValueError("OpenAI API key not found in environment variables.")
+        # Handles opened for queries would go stale once the contents change
+        release_shared_vector_stores(document_db_directory)
 
         # Check if the directory exists
         if os.path.exists(document_db_directory):
@@ -94,19 +219,23 @@ def store_embeddings_openai(chunks, document_db_directory, replace_existing=True
         # Define maximum batch size
         max_batch_size = 166
 
-        # Initialize OpenAI embeddings
-        embeddings = OpenAIEmbeddings()
-
-        # Process chunks in batches
-        for i in range(0, len(chunks), max_batch_size):
-            batch_chunks = chunks[i:i + max_batch_size]
+        # Initialize embeddings
+        embeddings = embedding_function or get_shared_embedding_function(embedding_backend)
+        if use_cache:
+            embeddings = CachedEmbeddings(embeddings)
 
-            # Store embeddings in the Chroma vector database for each batch
-            Chroma.from_documents(documents=batch_chunks, embedding=embeddings, persist_directory=document_db_directory)
-
-        # Persist the changes to the database
-        chroma_instance = Chroma(persist_directory=document_db_directory)
-        chroma_instance.persist()
+        # One vector store handle for the whole ingestion
+        vector_store = open_vector_store(document_db_directory, embeddings, vector_store_backend)
+        if isinstance(vector_store, MemmapVectorStore):
+            write_batch = memmap_batch_writer(vector_store)
+        else:
+            write_batch = chroma_batch_writer(vector_store)
+        ingest_batches(chunks, embeddings.embed_documents, write_batch,
+                       batch_size=max_batch_size, max_in_flight=max_in_flight)
+        if build_keyword_index:
+            store_bm25_index(document_db_directory, [chunk_id(chunk) for chunk in chunks],
+                             [chunk.page_content for chunk in chunks], [chunk.metadata for chunk in chunks],
+                             append=not replace_existing)
 
         logging.info(f"Embeddings stored successfully in {document_db_directory}.")
         return True
@@ -114,7 +243,6 @@ def store_embeddings_openai(chunks, document_db_directory, replace_existing=True
     except ValueError as ve:
         logging.error(f"ValueError: {ve}")
     except Exception as e:
-        logging.error(f"Error storing embeddings with OpenAI: {e}")
+        logging.error(f"Error storing embeddings with {embedding_backend} embeddings: {e}")
 
     return False
-
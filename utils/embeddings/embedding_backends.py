@@ -0,0 +1,47 @@
+import threading
+
+from utils.embeddings.local_embeddings import LocalSentenceEmbeddings
+from utils.scheduler.openai_clients import create_openai_embeddings
+
+# Embedding backends that can be selected for ingestion and retrieval
+EMBEDDING_BACKENDS = ("openai", "local")
+
+_shared_embedding_functions = {}
+_shared_embedding_functions_lock = threading.Lock()
+
+def get_embedding_function(backend="openai", **options):
+    """Creates the embedding function for the selected backend.
+
+    The same backend must be used to build a knowledge base and to query it.
+
+    Args:
+        backend (str): 'openai' for OpenAIEmbeddings, or 'local' for the offline CPU model.
+        **options: Keyword arguments passed to the embedding class (e.g. `num_threads` for 'local').
+
+    Returns:
+        Embeddings: The embedding function.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if backend == "openai":
+        return create_openai_embeddings(**options)
+    if backend == "local":
+        return LocalSentenceEmbeddings(**options)
+    raise ValueError(f"Unsupported embedding backend: {backend}. Choose one of {EMBEDDING_BACKENDS}.")
+
+def get_shared_embedding_function(backend="openai"):
+    """Returns an embedding function shared by every caller in this process, creating it on first use.
+
+    Reusing it avoids rebuilding API clients, or reloading the local model, for every request.
+
+    Args:
+        backend (str): 'openai' or 'local'.
+
+    Returns:
+        Embeddings: The shared embedding function.
+    """
+    with _shared_embedding_functions_lock:
+        if backend not in _shared_embedding_functions:
+            _shared_embedding_functions[backend] = get_embedding_function(backend)
+        return _shared_embedding_functions[backend]
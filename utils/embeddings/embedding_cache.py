@@ -0,0 +1,124 @@
+import os
+import hashlib
+import argparse
+import logging
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from utils.cache.sqlite_lru_cache import SQLiteLRUCache, DEFAULT_CACHE_DIRECTORY
+
+logging.basicConfig(level=logging.INFO)
+
+EMBEDDING_CACHE_PATH = os.path.join(DEFAULT_CACHE_DIRECTORY, "embedding_cache.sqlite")
+EMBEDDING_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+_embedding_cache = None
+
+def get_embedding_cache():
+    """Returns the shared embedding cache, opening it on first use.
+
+    Returns:
+        SQLiteLRUCache: The embedding cache.
+    """
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = SQLiteLRUCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_BYTES)
+    return _embedding_cache
+
+def embedding_model_name(embeddings):
+    """Returns the model name of an embedding function, used to keep vectors of different models apart."""
+    for attribute in ("model", "model_name"):
+        name = getattr(embeddings, attribute, None)
+        if name:
+            return name
+    return type(embeddings).__name__
+
+class CachedEmbeddings(Embeddings):
+    """Embedding function that serves vectors from the persistent embedding cache and only embeds new texts.
+
+    Vectors are keyed by the embedding model name and the SHA-256 of the text, so the cache is shared
+    by every company's knowledge base and repeated boilerplate is only embedded once.
+    """
+
+    def __init__(self, underlying, model_name=None, cache=None):
+        """
+        Args:
+            underlying (Embeddings): The embedding function used for texts that are not cached.
+            model_name (str): Name used in cache keys. Defaults to the model of `underlying`.
+            cache (SQLiteLRUCache): The cache to use. Defaults to the shared embedding cache.
+        """
+        self.underlying = underlying
+        self.model_name = model_name or embedding_model_name(underlying)
+        self.cache = cache or get_embedding_cache()
+
+    def _key(self, text):
+        return f"{self.model_name}/{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def embed_documents(self, texts):
+        """Embeds a list of texts, calling the underlying embedding function only for cache misses.
+
+        Args:
+            texts (list of str): The texts to embed.
+
+        Returns:
+            list of list of float: One vector per text, in order.
+        """
+        keys = [self._key(text) for text in texts]
+        vectors = []
+        missing = {}
+        for index, key in enumerate(keys):
+            value = self.cache.get(key)
+            if value is None:
+                missing.setdefault(key, []).append(index)
+                vectors.append(None)
+            else:
+                vectors.append(np.frombuffer(value, dtype=np.float32).tolist())
+
+        if missing:
+            miss_keys = list(missing)
+            miss_texts = [texts[missing[key][0]] for key in miss_keys]
+            new_vectors = self.underlying.embed_documents(miss_texts)
+            for key, vector in zip(miss_keys, new_vectors):
+                # Vectors are returned at the stored float32 precision, so cached and fresh results match
+                vector = np.asarray(vector, dtype=np.float32)
+                self.cache.set(key, vector.tobytes(), tag=self.model_name)
+                for index in missing[key]:
+                    vectors[index] = vector.tolist()
+
+        logging.info(f"Embedding cache: {len(texts) - sum(len(v) for v in missing.values())} of {len(texts)} texts served from cache.")
+        return vectors
+
+    def embed_query(self, text):
+        """Embeds a single query text, using the cache when possible.
+
+        Args:
+            text (str): The query text.
+
+        Returns:
+            list of float: The query vector.
+        """
+        key = self._key(text)
+        value = self.cache.get(key)
+        if value is not None:
+            return np.frombuffer(value, dtype=np.float32).tolist()
+        vector = np.asarray(self.underlying.embed_query(text), dtype=np.float32)
+        self.cache.set(key, vector.tobytes(), tag=self.model_name)
+        return vector.tolist()
+
+def main():
+    """Command line entry point for inspecting and clearing the embedding cache."""
+    parser = argparse.ArgumentParser(description="Inspect or clear the embedding cache.")
+    parser.add_argument("--clear", action="store_true", help="Remove every cached vector.")
+    parser.add_argument("--model", nargs="+", default=[], help="Remove the cached vectors of the given embedding models.")
+    args = parser.parse_args()
+
+    cache = get_embedding_cache()
+    if args.clear:
+        logging.info(f"Removed {cache.clear()} cached vectors.")
+    for model in args.model:
+        logging.info(f"Removed {cache.delete_tag(model)} cached vectors for {model}.")
+    logging.info(f"Embedding cache at {EMBEDDING_CACHE_PATH}: {cache.stats()}")
+
+if __name__ == "__main__":
+    main()
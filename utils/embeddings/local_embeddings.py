@@ -0,0 +1,194 @@
+import os
+import logging
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from utils.cache.sqlite_lru_cache import DEFAULT_CACHE_DIRECTORY
+
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_LOCAL_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_DIRECTORY = os.path.join(DEFAULT_CACHE_DIRECTORY, "onnx")
+
+def length_bucketed_batches(lengths, max_batch_size=64, max_batch_tokens=16384):
+    """
+    Groups texts of similar length into batches so that little compute is spent on padding.
+
+    Texts are sorted by length and cut into batches of at most `max_batch_size` texts whose padded
+    size (number of texts times the longest length) stays within `max_batch_tokens`.
+
+    Args:
+        lengths (list of int): Length of each text in tokens.
+        max_batch_size (int): Maximum number of texts per batch.
+        max_batch_tokens (int): Maximum padded tokens per batch.
+
+    Returns:
+        list of list of int: The indices of the texts in each batch.
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    batches = []
+    batch = []
+    for index in order:
+        longest = max(lengths[index], 1)
+        if batch and (len(batch) >= max_batch_size or (len(batch) + 1) * longest > max_batch_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(index)
+    if batch:
+        batches.append(batch)
+    return batches
+
+def export_onnx_model(model_name, output_directory=ONNX_DIRECTORY, quantize=True):
+    """
+    Exports a sentence-transformer's encoder to ONNX, optionally with dynamic int8 quantization.
+
+    The export runs once per model; later calls return the existing file.
+
+    Args:
+        model_name (str): Hugging Face model name.
+        output_directory (str): Folder where the ONNX files are kept.
+        quantize (bool): Whether to return the int8-quantized model.
+
+    Returns:
+        str: Path to the ONNX model file.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    model_directory = os.path.join(output_directory, model_name.replace("/", "__"))
+    fp32_path = os.path.join(model_directory, "model.onnx")
+    int8_path = os.path.join(model_directory, "model.int8.onnx")
+
+    if not os.path.exists(fp32_path):
+        os.makedirs(model_directory, exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        sample = tokenizer(["export sample"], return_tensors="pt")
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=14,
+        )
+        logging.info(f"Exported {model_name} to {fp32_path}.")
+
+    if not quantize:
+        return fp32_path
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        logging.info(f"Quantized {fp32_path} to {int8_path}.")
+    return int8_path
+
+class LocalSentenceEmbeddings(Embeddings):
+    """Embedding function that runs a sentence-transformer model on the CPU, without network calls.
+
+    The 'torch' backend runs the model through sentence-transformers. The 'onnx' backend runs an
+    exported (and by default int8-quantized) copy of the encoder with ONNX Runtime, using mean
+    pooling and L2 normalisation like sentence-transformers does.
+    """
+
+    def __init__(self, model_name=DEFAULT_LOCAL_MODEL, backend="onnx", quantize=True, num_threads=None,
+                 max_batch_size=64, max_batch_tokens=16384, max_length=256):
+        """
+        Args:
+            model_name (str): Hugging Face model name.
+            backend (str): 'onnx' or 'torch'.
+            quantize (bool): Whether the ONNX backend uses the int8-quantized model.
+            num_threads (int): Number of CPU threads used for inference. Defaults to the runtime's choice.
+            max_batch_size (int): Maximum number of texts per batch.
+            max_batch_tokens (int): Maximum padded tokens per batch.
+            max_length (int): Texts are truncated to this many tokens.
+        """
+        if backend not in ("onnx", "torch"):
+            raise ValueError(f"Unsupported local embedding backend: {backend}")
+        self.model_name = model_name
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_length = max_length
+        # Quantized vectors differ slightly, so they are cached under their own name
+        self.model = f"{model_name}#{backend}-int8" if backend == "onnx" and quantize else f"{model_name}#{backend}"
+
+        if backend == "torch":
+            import torch
+            from sentence_transformers import SentenceTransformer
+            if num_threads:
+                torch.set_num_threads(num_threads)
+            self._model = SentenceTransformer(model_name, device="cpu")
+            self._model.max_seq_length = max_length
+        else:
+            import onnxruntime
+            from tokenizers import Tokenizer
+            options = onnxruntime.SessionOptions()
+            if num_threads:
+                options.intra_op_num_threads = num_threads
+            model_path = export_onnx_model(model_name, quantize=quantize)
+            self._session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+            self._tokenizer = Tokenizer.from_pretrained(model_name)
+            self._tokenizer.enable_truncation(max_length)
+            self._tokenizer.no_padding()
+
+    def _embed_onnx(self, texts):
+        encodings = self._tokenizer.encode_batch(texts)
+        lengths = [len(encoding.ids) for encoding in encodings]
+        vectors = [None] * len(texts)
+        for batch in length_bucketed_batches(lengths, self.max_batch_size, self.max_batch_tokens):
+            longest = max(lengths[index] for index in batch)
+            input_ids = np.zeros((len(batch), longest), dtype=np.int64)
+            attention_mask = np.zeros((len(batch), longest), dtype=np.int64)
+            for row, index in enumerate(batch):
+                input_ids[row, :lengths[index]] = encodings[index].ids
+                attention_mask[row, :lengths[index]] = 1
+            hidden = self._session.run(["last_hidden_state"], {"input_ids": input_ids, "attention_mask": attention_mask})[0]
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            for row, index in enumerate(batch):
+                vectors[index] = pooled[row].tolist()
+        return vectors
+
+    def _embed_torch(self, texts):
+        # Rough token estimate for bucketing; sentence-transformers tokenizes each batch itself
+        lengths = [min(len(text) // 4 + 2, self.max_length) for text in texts]
+        vectors = [None] * len(texts)
+        for batch in length_bucketed_batches(lengths, self.max_batch_size, self.max_batch_tokens):
+            embedded = self._model.encode([texts[index] for index in batch], batch_size=len(batch),
+                                          normalize_embeddings=True, convert_to_numpy=True)
+            for row, index in enumerate(batch):
+                vectors[index] = embedded[row].tolist()
+        return vectors
+
+    def embed_documents(self, texts):
+        """Embeds a list of texts on the CPU.
+
+        Args:
+            texts (list of str): The texts to embed.
+
+        Returns:
+            list of list of float: One normalised vector per text, in order.
+        """
+        if not texts:
+            return []
+        if self.backend == "onnx":
+            return self._embed_onnx(list(texts))
+        return self._embed_torch(list(texts))
+
+    def embed_query(self, text):
+        """Embeds a single query text.
+
+        Args:
+            text (str): The query text.
+
+        Returns:
+            list of float: The normalised query vector.
+        """
+        return self.embed_documents([text])[0]
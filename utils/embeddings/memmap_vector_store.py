@@ -0,0 +1,282 @@
+import os
+import json
+import hashlib
+import logging
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.vectorstores import VectorStore
+
+logging.basicConfig(level=logging.INFO)
+
+INDEX_FILE = "index.json"
+VECTORS_FILE = "vectors.bin"
+SCALES_FILE = "scales.bin"
+DOCUMENTS_FILE = "documents.jsonl"
+OFFSETS_FILE = "offsets.bin"
+
+SUPPORTED_DTYPES = ("float16", "int8")
+
+def quantize_vectors(vectors, dtype):
+    """
+    Normalises vectors to unit length and converts them to the storage type.
+
+    int8 vectors are scaled per row so their largest component maps to 127; the scale is returned
+    so search scores can be converted back to cosine similarities.
+
+    Args:
+        vectors (numpy.ndarray): float32 array of shape (n, dimension).
+        dtype (str): 'float16' or 'int8'.
+
+    Returns:
+        tuple: The stored vectors and the per-row scales (None for float16).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+class MemmapVectorStore(VectorStore):
+    """Vector store kept in a memory-mapped NumPy file, with exact top-k cosine search.
+
+    A store is a directory holding:
+        index.json       - dtype, dimension, number of committed rows and size of documents.jsonl.
+        vectors.bin      - one float16 or int8 row per chunk, normalised to unit length.
+        scales.bin       - float32 scale per row (int8 stores only).
+        documents.jsonl  - one JSON line per chunk with its ID, text and metadata.
+        offsets.bin      - uint64 byte offset of each line in documents.jsonl.
+
+    Opening a store only reads index.json. Vectors are searched in place through np.memmap, and
+    only the documents that are returned are read from the sidecar. Appends write the data files
+    first and update index.json last, so readers never see a half-written row.
+    """
+
+    def __init__(self, directory, embedding_function, dtype="float16", search_block_rows=65536):
+        """
+        Args:
+            directory (str): Folder holding the store. Created on the first append.
+            embedding_function (Embeddings): Used to embed queries and texts added with `add_texts`.
+            dtype (str): 'float16' or 'int8'. Ignored for existing stores, which keep their own type.
+            search_block_rows (int): Rows scored per matrix product, which bounds temporary memory during search.
+        """
+        self.directory = directory
+        self.embedding_function = embedding_function
+        self.search_block_rows = search_block_rows
+        self._vectors = None
+        self._scales = None
+        self._offsets = None
+        self._ids = None
+
+        index_path = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as file:
+                self._index = json.load(file)
+        else:
+            if dtype not in SUPPORTED_DTYPES:
+                raise ValueError(f"Unsupported vector dtype: {dtype}. Choose one of {SUPPORTED_DTYPES}.")
+            self._index = {"dtype": dtype, "dimension": None, "count": 0}
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def __len__(self):
+        return self._index["count"]
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _open_arrays(self):
+        """Maps the committed rows of the data files into memory, once per commit."""
+        if self._vectors is not None:
+            return
+        count = self._index["count"]
+        if count == 0:
+            return
+        dimension = self._index["dimension"]
+        self._vectors = np.memmap(self._path(VECTORS_FILE), dtype=self._index["dtype"], mode='r', shape=(count, dimension))
+        self._offsets = np.memmap(self._path(OFFSETS_FILE), dtype=np.uint64, mode='r', shape=(count,))
+        if self._index["dtype"] == "int8":
+            self._scales = np.memmap(self._path(SCALES_FILE), dtype=np.float32, mode='r', shape=(count,))
+
+    def _load_ids(self):
+        """Returns the row index of each stored ID."""
+        if self._ids is None:
+            self._ids = {}
+            if self._index["count"]:
+                with open(self._path(DOCUMENTS_FILE), 'r', encoding='utf-8') as file:
+                    for row, (line, _) in enumerate(zip(file, range(self._index["count"]))):
+                        self._ids[json.loads(line)["id"]] = row
+        return self._ids
+
+    def add_embeddings(self, ids, texts, vectors, metadatas=None):
+        """
+        Appends pre-computed embeddings to the store. IDs that are already stored are skipped.
+
+        Args:
+            ids (list of str): Stable chunk IDs.
+            texts (list of str): Chunk texts.
+            vectors (list of list of float): One embedding per text.
+            metadatas (list of dict): Optional metadata per text.
+
+        Returns:
+            list of str: The IDs that were added.
+        """
+        metadatas = metadatas or [{}] * len(texts)
+        known = self._load_ids()
+        keep = []
+        new_ids = set()
+        for index, id_ in enumerate(ids):
+            if id_ not in known and id_ not in new_ids:
+                new_ids.add(id_)
+                keep.append(index)
+        if not keep:
+            return []
+
+        vectors = np.asarray([vectors[i] for i in keep], dtype=np.float32)
+        if self._index["dimension"] is None:
+            self._index["dimension"] = int(vectors.shape[1])
+        elif vectors.shape[1] != self._index["dimension"]:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store's dimension {self._index['dimension']}.")
+        stored, scales = quantize_vectors(vectors, self._index["dtype"])
+
+        os.makedirs(self.directory, exist_ok=True)
+        count = self._index["count"]
+        # Truncate any rows left by an interrupted append before writing new ones
+        for name, row_bytes in ((VECTORS_FILE, stored.itemsize * stored.shape[1]), (OFFSETS_FILE, 8), (SCALES_FILE, 4)):
+            path = self._path(name)
+            if os.path.exists(path) and os.path.getsize(path) != count * row_bytes:
+                os.truncate(path, count * row_bytes)
+        documents_path = self._path(DOCUMENTS_FILE)
+        documents_end = self._index.get("documents_end", 0)
+        if os.path.exists(documents_path) and os.path.getsize(documents_path) != documents_end:
+            os.truncate(documents_path, documents_end)
+
+        lines = [
+            (json.dumps({"id": ids[i], "text": texts[i], "metadata": metadatas[i] or {}}, ensure_ascii=False) + "\n").encode('utf-8')
+            for i in keep
+        ]
+        offsets = np.cumsum([documents_end] + [len(line) for line in lines[:-1]], dtype=np.uint64)
+        with open(documents_path, 'ab') as file:
+            file.write(b"".join(lines))
+        with open(self._path(OFFSETS_FILE), 'ab') as file:
+            file.write(offsets.tobytes())
+        with open(self._path(VECTORS_FILE), 'ab') as file:
+            file.write(stored.tobytes())
+        if scales is not None:
+            with open(self._path(SCALES_FILE), 'ab') as file:
+                file.write(scales.tobytes())
+
+        self._index["count"] = count + len(keep)
+        self._index["documents_end"] = documents_end + sum(len(line) for line in lines)
+        temporary_path = self._path(INDEX_FILE + ".tmp")
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump(self._index, file)
+        os.replace(temporary_path, self._path(INDEX_FILE))
+
+        # Only committed rows are known, so a failed append can be retried
+        for row, index in enumerate(keep, start=count):
+            known[ids[index]] = row
+        self._vectors = self._scales = self._offsets = None
+        return [ids[i] for i in keep]
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        """Embeds and appends texts. IDs default to a hash of the text."""
+        texts = list(texts)
+        if ids is None:
+            ids = [hashlib.sha256(text.encode('utf-8')).hexdigest() for text in texts]
+        vectors = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(ids, texts, vectors, metadatas)
+
+    def search_by_vector(self, vector, k=4):
+        """
+        Exact top-k cosine search over every stored row.
+
+        Args:
+            vector (list of float): The query embedding.
+            k (int): Number of results.
+
+        Returns:
+            tuple: Arrays of row indices and cosine similarities, best first.
+        """
+        self._open_arrays()
+        count = self._index["count"]
+        if count == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, self.search_block_rows):
+            block = self._vectors[start:start + self.search_block_rows]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        if self._scales is not None:
+            scores *= self._scales
+
+        k = min(k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    def get_documents(self, indices):
+        """Reads the documents of the given rows from the sidecar file."""
+        self._open_arrays()
+        documents = []
+        with open(self._path(DOCUMENTS_FILE), 'rb') as file:
+            for index in indices:
+                file.seek(int(self._offsets[index]))
+                record = json.loads(file.readline())
+                documents.append(Document(page_content=record["text"], metadata=record["metadata"]))
+        return documents
+
+    def get_vectors(self, indices):
+        """Returns the stored vectors of the given rows as unit-length float32 arrays."""
+        self._open_arrays()
+        indices = np.asarray(indices, dtype=np.int64)
+        vectors = np.asarray(self._vectors[indices], dtype=np.float32)
+        if self._scales is not None:
+            vectors *= self._scales[indices][:, None]
+        return vectors
+
+    def get_vectors_by_id(self, ids):
+        """
+        Returns the stored vectors of the given chunk IDs.
+
+        Args:
+            ids (list of str): Chunk IDs.
+
+        Returns:
+            dict: Unit-length float32 vector of each ID that is stored; unknown IDs are left out.
+        """
+        known = self._load_ids()
+        found = [id_ for id_ in ids if id_ in known]
+        if not found:
+            return {}
+        return dict(zip(found, self.get_vectors([known[id_] for id_ in found])))
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4):
+        indices, scores = self.search_by_vector(embedding, k)
+        return list(zip(self.get_documents(indices), scores.tolist()))
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [document for document, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities; map them to [0, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, directory=None, dtype="float16", **kwargs):
+        if directory is None:
+            raise ValueError("MemmapVectorStore.from_texts requires a directory.")
+        store = cls(directory, embedding, dtype=dtype)
+        store.add_texts(texts, metadatas, **kwargs)
+        return store
@@ -0,0 +1,68 @@
+import os
+import threading
+
+from utils.embeddings.memmap_vector_store import MemmapVectorStore
+from utils.embeddings.embedding_cache import CachedEmbeddings
+from utils.embeddings.embedding_backends import get_shared_embedding_function
+
+# Vector stores that can hold a company's Knowledge Base
+VECTOR_STORE_BACKENDS = ("chroma", "memmap")
+
+_shared_vector_stores = {}
+_shared_vector_stores_lock = threading.Lock()
+
+def open_vector_store(directory, embedding_function, backend="chroma", **options):
+    """Opens the vector store of a Knowledge Base directory.
+
+    Chroma is only imported when it is selected, so the memmap backend runs without chromadb.
+
+    Args:
+        directory (str): The Knowledge Base directory.
+        embedding_function (Embeddings): Used to embed queries.
+        backend (str): 'chroma', or 'memmap' for the memory-mapped NumPy store.
+        **options: Keyword arguments passed to the store (e.g. `dtype='int8'` for 'memmap').
+
+    Returns:
+        VectorStore: The open vector store.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if backend == "chroma":
+        from langchain_community.vectorstores import Chroma
+        return Chroma(persist_directory=directory, embedding_function=embedding_function, **options)
+    if backend == "memmap":
+        return MemmapVectorStore(directory, embedding_function, **options)
+    raise ValueError(f"Unsupported vector store backend: {backend}. Choose one of {VECTOR_STORE_BACKENDS}.")
+
+def get_shared_vector_store(directory, embedding_backend="openai", backend="chroma"):
+    """Returns the open vector store of a Knowledge Base, shared by every caller in this process.
+
+    The store is opened on first use with the shared, cached embedding function of its backend, so
+    later queries skip opening the store and building clients.
+
+    Args:
+        directory (str): The Knowledge Base directory.
+        embedding_backend (str): The embedding backend the Knowledge Base was built with.
+        backend (str): The vector store the Knowledge Base was built with.
+
+    Returns:
+        VectorStore: The shared vector store.
+    """
+    key = (os.path.abspath(directory), embedding_backend, backend)
+    with _shared_vector_stores_lock:
+        if key not in _shared_vector_stores:
+            embeddings = CachedEmbeddings(get_shared_embedding_function(embedding_backend))
+            _shared_vector_stores[key] = open_vector_store(directory, embeddings, backend)
+        return _shared_vector_stores[key]
+
+def release_shared_vector_stores(directory):
+    """Drops the shared vector stores of a Knowledge Base, e.g. before it is rebuilt.
+
+    Args:
+        directory (str): The Knowledge Base directory.
+    """
+    path = os.path.abspath(directory)
+    with _shared_vector_stores_lock:
+        for key in [key for key in _shared_vector_stores if key[0] == path]:
+            del _shared_vector_stores[key]
@@ -0,0 +1,210 @@
+import os
+import re
+import logging
+import tempfile
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+import pytesseract
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+from utils.extraction.extract_text_high_memory_OCR import load_cached_ocr_pages, store_cached_ocr_page
+from utils.extraction.extract_text_parallel_OCR import split_page_ranges
+from utils.extraction.page_record import PageRecord
+from utils.telemetry.tracing import traced, extraction_attributes
+
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_OCR_MEMORY_BUDGET_MB = 2048
+
+# Rough memory cost of OCR'ing one page: a Tesseract process with its language model, plus a few
+# copies of the grayscale page inside it
+TESSERACT_PROCESS_BYTES = 150 * 2**20
+TESSERACT_PAGE_COPIES = 3
+
+# Header fields of a PGM file, separated by whitespace and '#' comments
+PGM_HEADER_FIELD = re.compile(rb'(?:\s+|#[^\n]*\n)*([^\s#]+)')
+
+class OCRBatchPlan(NamedTuple):
+    """How many pages are rendered and OCR'd together to stay within a memory budget."""
+    page_bytes: int  # Size of the largest page rendered in grayscale
+    batch_size: int  # Pages rendered per Poppler call and OCR'd at the same time
+
+def plan_ocr_batches(pdf_path, dpi, memory_budget_mb, max_workers=None):
+    """
+    Sizes the OCR batches of a PDF to a memory budget.
+
+    Each page in a batch runs in its own Tesseract process, and Poppler renders the next batch
+    meanwhile, so a batch costs one Tesseract process and a few page copies per page, plus the page
+    being rendered. The resolution is never lowered: if a single page does not fit the budget, it is
+    OCR'd on its own anyway.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        dpi (int): Resolution used to render the pages.
+        memory_budget_mb (int): RAM, in MB, for rendering and OCR.
+        max_workers (int): Maximum pages OCR'd at the same time. Defaults to the number of CPUs.
+
+    Returns:
+        OCRBatchPlan: The page size and batch size.
+    """
+    with fitz.open(pdf_path) as doc:
+        largest_page = max((page.rect.width * page.rect.height for page in doc), default=0)
+    # Page sizes are in points, 72 to the inch
+    page_bytes = int(largest_page * (dpi / 72) ** 2)
+    budget = memory_budget_mb * 2**20 - 2 * page_bytes
+    per_page = TESSERACT_PROCESS_BYTES + TESSERACT_PAGE_COPIES * page_bytes
+    if budget < per_page:
+        logging.warning(f"A {dpi} dpi page of {pdf_path} needs about {(per_page + 2 * page_bytes) / 2**20:.0f} MB to OCR, "
+                        f"more than the {memory_budget_mb} MB budget; pages are OCR'd one at a time.")
+    batch_size = max(1, min(max_workers or os.cpu_count() or 1, budget // per_page))
+    return OCRBatchPlan(page_bytes, batch_size)
+
+@traced()
+def render_page_files(pdf_path, dpi, first_page, last_page, output_folder):
+    """Renders a range of pages to grayscale PGM files with Poppler, without loading them.
+
+    Returns:
+        list of str: The paths of the page files, in page order.
+    """
+    return convert_from_path(pdf_path, dpi, output_folder=output_folder, first_page=first_page, last_page=last_page,
+                             grayscale=True, paths_only=True)
+
+def open_pgm(path):
+    """
+    Memory-maps the pixels of an 8-bit binary PGM file, as written by `pdftoppm -gray`.
+
+    Args:
+        path (str): Path to the PGM file.
+
+    Returns:
+        numpy.memmap: The writable (height, width) pixel array, backed by the file.
+
+    Raises:
+        ValueError: If the file is not an 8-bit binary PGM file.
+    """
+    with open(path, 'rb') as file:
+        header = file.read(256)
+    fields = []
+    position = 0
+    for _ in range(4):
+        match = PGM_HEADER_FIELD.match(header, position)
+        if match is None:
+            raise ValueError(f"{path} is not a PGM file.")
+        fields.append(match.group(1))
+        position = match.end()
+    if fields[0] != b"P5" or int(fields[3]) > 255:
+        raise ValueError(f"{path} is not an 8-bit binary PGM file.")
+    width, height = int(fields[1]), int(fields[2])
+    # A single whitespace character separates the header from the pixels
+    return np.memmap(path, dtype=np.uint8, mode='r+', offset=position + 1, shape=(height, width))
+
+@traced()
+def ocr_page_file(path):
+    """
+    Thresholds a rendered grayscale page in place and runs Tesseract on it, then deletes the file.
+
+    The page is thresholded the same way as `ocr_page_image`, but inside the memory-mapped file, so
+    no copy of the page is held in memory and Tesseract reads the result straight from disk.
+
+    Args:
+        path (str): Path to the PGM file of the page.
+
+    Returns:
+        str: The text recognised on the page.
+    """
+    try:
+        page = open_pgm(path)
+        cv2.threshold(page, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU, dst=page)
+        page.flush()
+        # Unmaps the file, which Windows requires before it can be removed
+        del page
+        return pytesseract.image_to_string(path)
+    finally:
+        os.remove(path)
+
+@traced(item_name="pages")
+def iter_pages_budgeted_OCR(pdf_path, dpi=500, memory_budget_mb=DEFAULT_OCR_MEMORY_BUDGET_MB, use_cache=True, spill_directory=None,
+                            max_workers=None):
+    """Yields the OCR text of each page of a PDF file, in page order, keeping rendering and OCR within a memory budget.
+
+    Pages are rendered by Poppler to grayscale files in a temporary folder instead of being loaded as
+    images. Each page is thresholded in place and read by Tesseract from disk, and the number of
+    pages rendered and OCR'd together adapts to the budget (see `plan_ocr_batches`). The next batch
+    is rendered while the current one is OCR'd.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        dpi (int): Resolution used to render the pages.
+        memory_budget_mb (int): RAM, in MB, for rendering and OCR.
+        use_cache (bool): Whether to read and store page text in the persistent page cache.
+            Only pages missing from the cache are rendered and OCR'd.
+        spill_directory (str): Folder for the rendered pages; defaults to the system temporary folder.
+            Use a folder on disk where the temporary folder is a RAM disk (tmpfs), as in many containers.
+        max_workers (int): Maximum pages OCR'd at the same time. Defaults to the number of CPUs.
+
+    Yields:
+        PageRecord: The source file, 1-based page number and text of each page.
+    """
+    try:
+        if use_cache:
+            pdf_hash, text_data = load_cached_ocr_pages(pdf_path, dpi)
+        else:
+            text_data = [None] * pdfinfo_from_path(pdf_path)["Pages"]
+        missing = [page_index + 1 for page_index, text in enumerate(text_data) if text is None]
+        next_page = 0
+        if missing:
+            plan = plan_ocr_batches(pdf_path, dpi, memory_budget_mb, max_workers)
+            batches = split_page_ranges(missing, plan.batch_size)
+            logging.info(f"Running OCR on {len(missing)} of {len(text_data)} pages of {pdf_path} in batches of "
+                         f"{plan.batch_size} pages ({plan.page_bytes / 2**20:.0f} MB per rendered page).")
+            with tempfile.TemporaryDirectory(prefix="ocr_pages_", dir=spill_directory) as folder, \
+                    ThreadPoolExecutor(1) as renderer, ThreadPoolExecutor(plan.batch_size) as ocr_pool:
+                # Each task runs in a copy of this context, so its trace span nests under this generator's
+                rendering = renderer.submit(contextvars.copy_context().run, render_page_files, pdf_path, dpi, *batches[0], folder)
+                for batch_index, (first, last) in enumerate(batches):
+                    paths = rendering.result()
+                    if batch_index + 1 < len(batches):
+                        rendering = renderer.submit(contextvars.copy_context().run, render_page_files, pdf_path, dpi,
+                                                    *batches[batch_index + 1], folder)
+                    futures = [ocr_pool.submit(contextvars.copy_context().run, ocr_page_file, path) for path in paths]
+                    for page_number, future in zip(range(first, last + 1), futures):
+                        text_data[page_number - 1] = future.result()
+                        if use_cache:
+                            store_cached_ocr_page(pdf_hash, page_number - 1, dpi, text_data[page_number - 1])
+                    # Hand out every page that is now complete, in order
+                    while next_page < len(text_data) and text_data[next_page] is not None:
+                        yield PageRecord(pdf_path, next_page + 1, text_data[next_page])
+                        text_data[next_page] = ""
+                        next_page += 1
+        else:
+            logging.info(f"{pdf_path}: all {len(text_data)} pages loaded from the page cache.")
+        for page_index in range(next_page, len(text_data)):
+            yield PageRecord(pdf_path, page_index + 1, text_data[page_index])
+    except Exception as e:
+        logging.error(f"Error extracting text from {pdf_path}: {e}")
+
+@traced(attributes=extraction_attributes)
+def extract_text_budgeted_OCR(pdf_path, dpi=500, memory_budget_mb=DEFAULT_OCR_MEMORY_BUDGET_MB, use_cache=True, spill_directory=None,
+                              max_workers=None):
+    """Extracts text data from a PDF file with OCR, keeping rendering and OCR within a memory budget.
+
+    Pages go through the same thresholding and Tesseract settings as `extract_text_high_memory_OCR`,
+    without every rendered page being held in memory, see `iter_pages_budgeted_OCR`.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        dpi (int): Resolution used to render the pages.
+        memory_budget_mb (int): RAM, in MB, for rendering and OCR.
+        use_cache (bool): Whether to read and store page text in the persistent page cache.
+        spill_directory (str): Folder for the rendered pages; defaults to the system temporary folder.
+        max_workers (int): Maximum pages OCR'd at the same time. Defaults to the number of CPUs.
+
+    Returns:
+        list of str: The extracted text data from each page, in page order.
+    """
+    return [record.text for record in iter_pages_budgeted_OCR(pdf_path, dpi, memory_budget_mb, use_cache, spill_directory, max_workers)]
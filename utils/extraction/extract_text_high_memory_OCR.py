@@ -1,29 +1,114 @@
 import cv2
 import numpy as np
 import pytesseract
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 import logging
 
+from utils.extraction.page_cache import get_page_cache, hash_pdf, ocr_settings, OCR_METHOD
+from utils.extraction.page_record import PageRecord
+from utils.telemetry.tracing import traced, extraction_attributes
+
 logging.basicConfig(level=logging.INFO)
 
-def extract_text_high_memory_OCR(pdf_path):
+@traced()
+def ocr_page_image(page):
+    """Thresholds a rendered page image and runs Tesseract on it.
+
+    Args:
+        page: The rendered page as a PIL image.
+
+    Returns:
+        str: The text recognised on the page.
+    """
+    gray = cv2.cvtColor(np.array(page), cv2.COLOR_RGB2GRAY)
+    thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+    return pytesseract.image_to_string(thresh)
+
+def load_cached_ocr_pages(pdf_path, dpi):
+    """Looks up the OCR text of every page of a PDF in the page cache.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        dpi (int): Resolution used to render the pages.
+
+    Returns:
+        tuple: The PDF content hash and a list with the cached text of each page, or None for pages that are not cached.
+    """
+    cache = get_page_cache()
+    pdf_hash = hash_pdf(pdf_path)
+    page_count = cache.get_page_count(pdf_hash)
+    if page_count is None:
+        page_count = pdfinfo_from_path(pdf_path)["Pages"]
+        cache.set_page_count(pdf_hash, page_count)
+    settings = ocr_settings(dpi)
+    return pdf_hash, [cache.get_page(pdf_hash, page_index, OCR_METHOD, settings) for page_index in range(page_count)]
+
+def store_cached_ocr_page(pdf_hash, page_index, dpi, text):
+    """Stores the OCR text of a page in the page cache."""
+    get_page_cache().set_page(pdf_hash, page_index, OCR_METHOD, ocr_settings(dpi), text)
+
+@traced(attributes=extraction_attributes)
+def extract_text_high_memory_OCR(pdf_path, dpi=500, use_cache=True):
     """Extracts text data from a PDF file using OpenCV and Tesseract.
 
     Args:
         pdf_path: Path to the PDF file.
+        dpi: Resolution used to render the pages.
+        use_cache: Whether to read and store page text in the persistent page cache.
+            Only pages missing from the cache are rendered and OCR'd.
 
     Returns:
         A list of strings containing the extracted text data from each page.
     """
     try:
-        pages = convert_from_path(pdf_path, 500)
-        text_data = []
-        for page_num, page in enumerate(pages):
-            gray = cv2.cvtColor(np.array(page), cv2.COLOR_RGB2GRAY)
-            thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
-            text = pytesseract.image_to_string(thresh)
-            text_data.append(text)
+        if not use_cache:
+            pages = convert_from_path(pdf_path, dpi)
+            return [ocr_page_image(page) for page in pages]
+
+        pdf_hash, text_data = load_cached_ocr_pages(pdf_path, dpi)
+        missing = [page_index for page_index, text in enumerate(text_data) if text is None]
+        if len(missing) == len(text_data):
+            pages = convert_from_path(pdf_path, dpi)
+            for page_num, page in enumerate(pages):
+                text_data[page_num] = ocr_page_image(page)
+                store_cached_ocr_page(pdf_hash, page_num, dpi, text_data[page_num])
+        else:
+            for page_num in missing:
+                page = convert_from_path(pdf_path, dpi, first_page=page_num + 1, last_page=page_num + 1)[0]
+                text_data[page_num] = ocr_page_image(page)
+                store_cached_ocr_page(pdf_hash, page_num, dpi, text_data[page_num])
+        logging.info(f"{pdf_path}: {len(text_data) - len(missing)} of {len(text_data)} pages loaded from the page cache.")
         return text_data
     except Exception as e:
         print(f"Error extracting text from {pdf_path}: {e}")
         return []
+
+@traced(item_name="pages")
+def iter_pages_OCR(pdf_path, dpi=500, use_cache=True):
+    """Yields the OCR text of each page of a PDF file, rendering one page at a time.
+
+    Unlike `extract_text_high_memory_OCR`, only a single rendered page is held in memory.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        dpi (int): Resolution used to render the pages.
+        use_cache (bool): Whether to read and store page text in the persistent page cache.
+
+    Yields:
+        PageRecord: The source file, 1-based page number and text of each page.
+    """
+    try:
+        if use_cache:
+            pdf_hash, text_data = load_cached_ocr_pages(pdf_path, dpi)
+        else:
+            text_data = [None] * pdfinfo_from_path(pdf_path)["Pages"]
+        for page_num, text in enumerate(text_data):
+            if text is None:
+                page = convert_from_path(pdf_path, dpi, first_page=page_num + 1, last_page=page_num + 1)[0]
+                text = ocr_page_image(page)
+                del page
+                if use_cache:
+                    store_cached_ocr_page(pdf_hash, page_num, dpi, text)
+            yield PageRecord(pdf_path, page_num + 1, text)
+    except Exception as e:
+        logging.error(f"Error extracting text from {pdf_path}: {e}")
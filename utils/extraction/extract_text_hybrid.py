@@ -0,0 +1,130 @@
+import string
+import logging
+from typing import NamedTuple
+
+import fitz  # PyMuPDF
+from pdf2image import convert_from_path
+
+from utils.extraction.extract_text_high_memory_OCR import ocr_page_image
+from utils.extraction.page_cache import get_page_cache, hash_pdf, ocr_settings, OCR_METHOD
+from utils.extraction.page_record import PageRecord, format_page
+from utils.telemetry.tracing import traced, extraction_attributes
+
+logging.basicConfig(level=logging.INFO)
+
+# Characters that commonly appear in financial filings and are not treated as garbage
+ALLOWED_SYMBOLS = set(string.punctuation) | set("€£¥₹©®™§°±×÷•–—‘’“”…")
+
+class TextLayerScore(NamedTuple):
+    """Quality measurements of a page's embedded text layer."""
+    char_count: int
+    glyph_coverage: float
+    garbage_ratio: float
+
+def score_text_layer(text):
+    """Scores the embedded text layer of a single page.
+
+    Args:
+        text (str): Text extracted from the page by PyMuPDF.
+
+    Returns:
+        TextLayerScore: The number of non-whitespace characters, the fraction of them that map to
+            a real glyph (not U+FFFD, private-use or control characters) and the fraction of
+            mapped characters that are neither alphanumeric nor common symbols.
+    """
+    chars = [c for c in text if not c.isspace()]
+    if not chars:
+        return TextLayerScore(0, 0.0, 1.0)
+
+    unmapped = 0
+    garbage = 0
+    for c in chars:
+        if c == '\ufffd' or '\ue000' <= c <= '\uf8ff' or ord(c) < 32:
+            unmapped += 1
+        elif not c.isalnum() and c not in ALLOWED_SYMBOLS:
+            garbage += 1
+
+    mapped = len(chars) - unmapped
+    glyph_coverage = mapped / len(chars)
+    garbage_ratio = garbage / mapped if mapped else 1.0
+    return TextLayerScore(len(chars), glyph_coverage, garbage_ratio)
+
+def needs_ocr(score, min_chars=50, min_glyph_coverage=0.9, max_garbage_ratio=0.3):
+    """Decides whether a page's text layer is too poor to use and must be OCR'd.
+
+    Args:
+        score (TextLayerScore): The score returned by `score_text_layer`.
+        min_chars (int): Minimum number of non-whitespace characters for a usable page.
+        min_glyph_coverage (float): Minimum fraction of characters that map to real glyphs.
+        max_garbage_ratio (float): Maximum fraction of unexpected symbols.
+
+    Returns:
+        bool: True if the page should go through OCR.
+    """
+    return (score.char_count < min_chars
+            or score.glyph_coverage < min_glyph_coverage
+            or score.garbage_ratio > max_garbage_ratio)
+
+@traced(item_name="pages")
+def iter_pages_hybrid(pdf_path, dpi=500, min_chars=50, min_glyph_coverage=0.9, max_garbage_ratio=0.3, use_cache=True):
+    """
+    Yields the text of each page of a PDF file using PyMuPDF, and OCR only for pages without a usable text layer.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        dpi (int): Resolution used to render pages that need OCR.
+        min_chars (int): Minimum number of non-whitespace characters for a usable page.
+        min_glyph_coverage (float): Minimum fraction of characters that map to real glyphs.
+        max_garbage_ratio (float): Maximum fraction of unexpected symbols.
+        use_cache (bool): Whether to reuse OCR text of pages from the persistent page cache.
+
+    Yields:
+        PageRecord: The source file, 1-based page number and text of each page.
+    """
+    try:
+        cache = get_page_cache() if use_cache else None
+        pdf_hash = hash_pdf(pdf_path) if use_cache else None
+        settings = ocr_settings(dpi)
+        doc = fitz.open(pdf_path)
+        try:
+            ocr_pages = 0
+            for page_num in range(len(doc)):
+                page_text = doc.load_page(page_num).get_text()
+                score = score_text_layer(page_text)
+                if needs_ocr(score, min_chars, min_glyph_coverage, max_garbage_ratio):
+                    page_text = cache.get_page(pdf_hash, page_num, OCR_METHOD, settings) if use_cache else None
+                    if page_text is None:
+                        image = convert_from_path(pdf_path, dpi, first_page=page_num + 1, last_page=page_num + 1)[0]
+                        page_text = ocr_page_image(image)
+                        if use_cache:
+                            cache.set_page(pdf_hash, page_num, OCR_METHOD, settings, page_text)
+                    ocr_pages += 1
+                yield PageRecord(pdf_path, page_num + 1, page_text)
+            logging.info(f"{pdf_path}: {ocr_pages} of {len(doc)} pages sent to OCR.")
+        finally:
+            doc.close()
+    except fitz.FileDataError:
+        logging.error(f"File data error while processing {pdf_path}. The file may be corrupted or invalid.")
+    except Exception as e:
+        logging.error(f"Unexpected error extracting text from {pdf_path}: {e}")
+
+@traced(attributes=extraction_attributes)
+def extract_text_hybrid(pdf_path, dpi=500, min_chars=50, min_glyph_coverage=0.9, max_garbage_ratio=0.3, use_cache=True):
+    """
+    Extracts text from each page of a PDF file using PyMuPDF, and OCR only for pages without a usable text layer.
+
+    The output has the same per-page layout as `extract_text_low_memory`.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        dpi (int): Resolution used to render pages that need OCR.
+        min_chars (int): Minimum number of non-whitespace characters for a usable page.
+        min_glyph_coverage (float): Minimum fraction of characters that map to real glyphs.
+        max_garbage_ratio (float): Maximum fraction of unexpected symbols.
+        use_cache (bool): Whether to reuse OCR text of pages from the persistent page cache.
+
+    Returns:
+        str: Extracted text from the PDF.
+    """
+    records = iter_pages_hybrid(pdf_path, dpi, min_chars, min_glyph_coverage, max_garbage_ratio, use_cache)
+    return "".join(format_page(record) for record in records)
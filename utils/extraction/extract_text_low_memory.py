@@ -1,30 +1,53 @@
 import fitz  # PyMuPDF
 import logging
 
+from utils.extraction.page_cache import get_page_cache, hash_pdf, PYMUPDF_METHOD
+from utils.extraction.page_record import PageRecord, format_page
+from utils.telemetry.tracing import traced, extraction_attributes
+
 logging.basicConfig(level=logging.INFO)
 
-def extract_text_low_memory(pdf_path):
+@traced(item_name="pages")
+def iter_pages_low_memory(pdf_path, use_cache=True):
     """
-    Extracts text from each page of a PDF file using PyMuPDF.
-    
+    Yields the text of each page of a PDF file using PyMuPDF, one page at a time.
+
     Args:
         pdf_path (str): Path to the PDF file.
+        use_cache (bool): Whether to read and store page text in the persistent page cache.
 
-    Returns:
-        str: Extracted text from the PDF.
+    Yields:
+        PageRecord: The source file, 1-based page number and text of each page.
     """
-    text = ""
     try:
+        cache = get_page_cache() if use_cache else None
+        pdf_hash = hash_pdf(pdf_path) if use_cache else None
         doc = fitz.open(pdf_path)
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            text += f'\n\nPage {page_num + 1}\n'
-            text += page.get_text()
-        doc.close()
+        try:
+            for page_num in range(len(doc)):
+                page_text = cache.get_page(pdf_hash, page_num, PYMUPDF_METHOD) if use_cache else None
+                if page_text is None:
+                    page_text = doc.load_page(page_num).get_text()
+                    if use_cache:
+                        cache.set_page(pdf_hash, page_num, PYMUPDF_METHOD, "", page_text)
+                yield PageRecord(pdf_path, page_num + 1, page_text)
+        finally:
+            doc.close()
     except fitz.FileDataError:
         logging.error(f"File data error while processing {pdf_path}. The file may be corrupted or invalid.")
-    except fitz.FitzError:
-        logging.error(f"Fitz error while processing {pdf_path}.")
     except Exception as e:
         logging.error(f"Unexpected error extracting text from {pdf_path}: {e}")
-    return text
+
+@traced(attributes=extraction_attributes)
+def extract_text_low_memory(pdf_path, use_cache=True):
+    """
+    Extracts text from each page of a PDF file using PyMuPDF.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        use_cache (bool): Whether to read and store page text in the persistent page cache.
+
+    Returns:
+        str: Extracted text from the PDF.
+    """
+    return "".join(format_page(record) for record in iter_pages_low_memory(pdf_path, use_cache))
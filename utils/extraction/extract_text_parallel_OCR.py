@@ -0,0 +1,136 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import pytesseract
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+from utils.extraction.extract_text_high_memory_OCR import ocr_page_image, load_cached_ocr_pages, store_cached_ocr_page
+from utils.extraction.page_record import PageRecord
+from utils.telemetry.tracing import traced, extraction_attributes
+
+logging.basicConfig(level=logging.INFO)
+
+def ocr_page_range(pdf_path, first_page, last_page, dpi=500, tesseract_cmd=None):
+    """Renders and OCRs a range of pages, one page at a time.
+
+    Runs inside a worker process. Only a single rendered page is held in memory at once.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        first_page (int): First page of the range (1-based, inclusive).
+        last_page (int): Last page of the range (1-based, inclusive).
+        dpi (int): Resolution used to render the pages.
+        tesseract_cmd (str): Path to the Tesseract executable. Worker processes do not inherit
+            the value set by `set_paths` on platforms that spawn instead of fork.
+
+    Returns:
+        list of str: The extracted text of each page in the range, in page order.
+    """
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    text_data = []
+    for page_number in range(first_page, last_page + 1):
+        page = convert_from_path(pdf_path, dpi, first_page=page_number, last_page=page_number)[0]
+        text_data.append(ocr_page_image(page))
+        del page
+    return text_data
+
+def split_page_ranges(page_numbers, pages_per_task):
+    """Groups page numbers into runs of consecutive pages, each at most `pages_per_task` long.
+
+    Args:
+        page_numbers (list of int): Sorted 1-based page numbers.
+        pages_per_task (int): Maximum number of pages in each range.
+
+    Returns:
+        list of tuple: The 1-based, inclusive (first_page, last_page) ranges.
+    """
+    page_ranges = []
+    for page_number in page_numbers:
+        if page_ranges:
+            first, last = page_ranges[-1]
+            if page_number == last + 1 and last - first + 1 < pages_per_task:
+                page_ranges[-1] = (first, page_number)
+                continue
+        page_ranges.append((page_number, page_number))
+    return page_ranges
+
+@traced(item_name="pages")
+def iter_pages_parallel_OCR(pdf_path, max_workers=None, dpi=500, pages_per_task=1, use_cache=True):
+    """Yields the OCR text of each page of a PDF file, in page order, while worker processes OCR the pages in parallel.
+
+    Each worker renders only its own pages with `first_page`/`last_page`, so peak memory stays at
+    roughly one rendered page per worker.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        max_workers (int): Number of worker processes. Defaults to the number of CPUs.
+        dpi (int): Resolution used to render the pages.
+        pages_per_task (int): Number of consecutive pages handed to a worker at a time.
+        use_cache (bool): Whether to read and store page text in the persistent page cache.
+            Only pages missing from the cache are sent to the workers.
+
+    Yields:
+        PageRecord: The source file, 1-based page number and text of each page.
+    """
+    if use_cache:
+        pdf_hash, text_data = load_cached_ocr_pages(pdf_path, dpi)
+    else:
+        text_data = [None] * pdfinfo_from_path(pdf_path)["Pages"]
+    missing = [page_index + 1 for page_index, text in enumerate(text_data) if text is None]
+    if not missing:
+        logging.info(f"{pdf_path}: all {len(text_data)} pages loaded from the page cache.")
+        for page_index, text in enumerate(text_data):
+            yield PageRecord(pdf_path, page_index + 1, text)
+        return
+
+    page_ranges = split_page_ranges(missing, pages_per_task)
+    max_workers = max_workers or os.cpu_count() or 1
+    tesseract_cmd = pytesseract.pytesseract.tesseract_cmd
+
+    logging.info(f"Running OCR on {len(missing)} of {len(text_data)} pages of {pdf_path} with {max_workers} workers.")
+    next_page = 0
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(page_ranges))) as executor:
+        results = executor.map(
+            ocr_page_range,
+            [pdf_path] * len(page_ranges),
+            [first for first, _ in page_ranges],
+            [last for _, last in page_ranges],
+            [dpi] * len(page_ranges),
+            [tesseract_cmd] * len(page_ranges),
+        )
+        for (first, _), range_text in zip(page_ranges, results):
+            for offset, text in enumerate(range_text):
+                text_data[first - 1 + offset] = text
+                if use_cache:
+                    store_cached_ocr_page(pdf_hash, first - 1 + offset, dpi, text)
+            # Hand out every page that is now complete, in order
+            while next_page < len(text_data) and text_data[next_page] is not None:
+                yield PageRecord(pdf_path, next_page + 1, text_data[next_page])
+                text_data[next_page] = ""
+                next_page += 1
+    for page_index in range(next_page, len(text_data)):
+        yield PageRecord(pdf_path, page_index + 1, text_data[page_index])
+
+@traced(attributes=extraction_attributes)
+def extract_text_parallel_OCR(pdf_path, max_workers=None, dpi=500, pages_per_task=1, use_cache=True):
+    """Extracts text data from a PDF file by running OCR on pages in parallel worker processes.
+
+    Produces the same output as `extract_text_high_memory_OCR`, see `iter_pages_parallel_OCR`.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        max_workers (int): Number of worker processes. Defaults to the number of CPUs.
+        dpi (int): Resolution used to render the pages.
+        pages_per_task (int): Number of consecutive pages handed to a worker at a time.
+        use_cache (bool): Whether to read and store page text in the persistent page cache.
+
+    Returns:
+        list of str: The extracted text data from each page, in page order.
+    """
+    try:
+        return [record.text for record in iter_pages_parallel_OCR(pdf_path, max_workers, dpi, pages_per_task, use_cache)]
+    except Exception as e:
+        print(f"Error extracting text from {pdf_path}: {e}")
+        return []
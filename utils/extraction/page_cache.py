@@ -0,0 +1,115 @@
+import os
+import hashlib
+import argparse
+import logging
+
+from utils.cache.sqlite_lru_cache import SQLiteLRUCache, DEFAULT_CACHE_DIRECTORY
+
+logging.basicConfig(level=logging.INFO)
+
+PAGE_CACHE_PATH = os.path.join(DEFAULT_CACHE_DIRECTORY, "page_cache.sqlite")
+PAGE_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# Extraction method names used in cache keys
+PYMUPDF_METHOD = "pymupdf"
+OCR_METHOD = "ocr"
+
+_page_cache = None
+
+def hash_pdf(pdf_path, block_size=1024 * 1024):
+    """Computes the SHA-256 hash of a PDF file's contents.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        block_size (int): Number of bytes read at a time.
+
+    Returns:
+        str: The hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def ocr_settings(dpi):
+    """Describes the OCR settings that affect the extracted text, for use in cache keys.
+
+    Args:
+        dpi (int): Resolution used to render the pages.
+
+    Returns:
+        str: The settings string.
+    """
+    return f"dpi={dpi};threshold=otsu-inv;tesseract-config="
+
+class PageCache:
+    """Persistent cache of extracted page text keyed by PDF content hash, page, method and settings."""
+
+    def __init__(self, path=PAGE_CACHE_PATH, max_bytes=PAGE_CACHE_MAX_BYTES):
+        self.store = SQLiteLRUCache(path, max_bytes)
+
+    @staticmethod
+    def _key(pdf_hash, page_index, method, settings):
+        return f"{pdf_hash}/{page_index}/{method}/{settings}"
+
+    def get_page(self, pdf_hash, page_index, method, settings=""):
+        """Returns the cached text of a page, or None if it has not been extracted before."""
+        value = self.store.get(self._key(pdf_hash, page_index, method, settings))
+        return None if value is None else value.decode('utf-8')
+
+    def set_page(self, pdf_hash, page_index, method, settings, text):
+        """Stores the extracted text of a page."""
+        self.store.set(self._key(pdf_hash, page_index, method, settings), text.encode('utf-8'), tag=pdf_hash)
+
+    def get_page_count(self, pdf_hash):
+        """Returns the cached page count of a PDF, or None if it is not known."""
+        value = self.store.get(self._key(pdf_hash, "pages", "", ""))
+        return None if value is None else int(value)
+
+    def set_page_count(self, pdf_hash, page_count):
+        """Stores the page count of a PDF so that fully cached files never need poppler."""
+        self.store.set(self._key(pdf_hash, "pages", "", ""), str(page_count).encode('utf-8'), tag=pdf_hash)
+
+    def invalidate(self, pdf_path):
+        """Removes every cached page of a PDF.
+
+        Args:
+            pdf_path (str): Path to the PDF file.
+
+        Returns:
+            int: The number of deleted entries.
+        """
+        return self.store.delete_tag(hash_pdf(pdf_path))
+
+    def clear(self):
+        """Removes every cached page."""
+        return self.store.clear()
+
+def get_page_cache():
+    """Returns the shared page cache, opening it on first use.
+
+    Returns:
+        PageCache: The page cache.
+    """
+    global _page_cache
+    if _page_cache is None:
+        _page_cache = PageCache()
+    return _page_cache
+
+def main():
+    """Command line entry point for inspecting and invalidating the page cache."""
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the extracted page cache.")
+    parser.add_argument("--clear", action="store_true", help="Remove every cached page.")
+    parser.add_argument("--pdf", nargs="+", default=[], help="Remove the cached pages of the given PDF files.")
+    args = parser.parse_args()
+
+    cache = get_page_cache()
+    if args.clear:
+        logging.info(f"Removed {cache.clear()} cached entries.")
+    for pdf_path in args.pdf:
+        logging.info(f"Removed {cache.invalidate(pdf_path)} cached entries for {pdf_path}.")
+    logging.info(f"Page cache at {PAGE_CACHE_PATH}: {cache.store.stats()}")
+
+if __name__ == "__main__":
+    main()
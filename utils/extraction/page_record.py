@@ -0,0 +1,39 @@
+import re
+from typing import NamedTuple
+
+PAGE_MARKER_PATTERN = re.compile(r'\n\nPage (\d+)\n')
+
+class PageRecord(NamedTuple):
+    """The extracted text of a single PDF page."""
+    source: str
+    page_number: int
+    text: str
+
+def format_page(record):
+    """Formats a page record with the page marker used by the PyMuPDF extractor.
+
+    Args:
+        record (PageRecord): The page record.
+
+    Returns:
+        str: The page text preceded by its 'Page N' marker.
+    """
+    return f'\n\nPage {record.page_number}\n{record.text}'
+
+def records_from_text(text, source=""):
+    """Recovers page records from text that contains the 'Page N' markers written by `format_page`.
+
+    Args:
+        text (str): The extracted text, e.g. the contents of 'Output Files/output.txt'.
+        source (str): Source name to attach to the records.
+
+    Returns:
+        list of PageRecord: One record per marked page, or a single page 1 record if the text has no markers.
+    """
+    parts = PAGE_MARKER_PATTERN.split(text)
+    if len(parts) == 1:
+        return [PageRecord(source, 1, text)]
+    records = [PageRecord(source, 0, parts[0])] if parts[0].strip() else []
+    for index in range(1, len(parts), 2):
+        records.append(PageRecord(source, int(parts[index]), parts[index + 1]))
+    return records
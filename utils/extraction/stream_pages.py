@@ -0,0 +1,40 @@
+import logging
+
+from utils.extraction.extract_text_low_memory import iter_pages_low_memory
+from utils.extraction.extract_text_high_memory_OCR import iter_pages_OCR
+from utils.extraction.extract_text_parallel_OCR import iter_pages_parallel_OCR
+from utils.extraction.extract_text_hybrid import iter_pages_hybrid
+from utils.extraction.extract_text_budgeted_OCR import iter_pages_budgeted_OCR
+
+logging.basicConfig(level=logging.INFO)
+
+# Page generators for each extraction method offered in main.py
+PAGE_EXTRACTORS = {
+    'low_memory': iter_pages_low_memory,
+    'high_memory_ocr': iter_pages_OCR,
+    'parallel_ocr': iter_pages_parallel_OCR,
+    'hybrid': iter_pages_hybrid,
+    'budgeted_ocr': iter_pages_budgeted_OCR,
+}
+
+def stream_pdf_pages(pdf_paths, method, **options):
+    """
+    Yields page records from several PDF files, one page at a time, without holding the corpus in memory.
+
+    Args:
+        pdf_paths (list of str): Paths to the PDF files, processed in order.
+        method (str): One of the keys of `PAGE_EXTRACTORS`.
+        **options: Extra keyword arguments passed to the page generator (e.g. `max_workers` or `memory_budget_mb`).
+
+    Yields:
+        PageRecord: The source file, 1-based page number and text of each page.
+
+    Raises:
+        ValueError: If the extraction method is unknown.
+    """
+    if method not in PAGE_EXTRACTORS:
+        raise ValueError(f"Unsupported extraction method: {method}")
+    extractor = PAGE_EXTRACTORS[method]
+    for pdf_path in pdf_paths:
+        logging.info(f"Streaming pages of {pdf_path} using {method} extraction.")
+        yield from extractor(pdf_path, **options)
@@ -0,0 +1,250 @@
+import os
+import re
+import csv
+import glob
+import json
+import time
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import NamedTuple
+
+from utils.config.set_path_for_tesseract_and_poppler import set_paths
+from utils.pipeline.pipeline_runner import PipelineConfig, PIPELINE_CHECKPOINT_DIRECTORY, run_pipeline
+
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_BATCH_OUTPUT_DIRECTORY = "Batch Output"
+BATCH_REPORT_NAME = "batch_report.json"
+
+# The last CPU-bound stage; later stages mostly wait on the embedding and LLM APIs
+LAST_CPU_STAGE = "chunk"
+
+class BatchJob(NamedTuple):
+    """The PDF reports and settings of one company in a batch."""
+    company: str
+    pdf_paths: list
+    config: PipelineConfig
+
+def company_directory_name(company):
+    """Turns a company name into a folder name that is safe on every operating system."""
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', company).strip('._') or "company"
+
+def _parse_value(value):
+    """Parses a CSV cell as JSON (numbers, booleans, null), keeping it as text otherwise."""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+def read_manifest(manifest_path):
+    """
+    Reads a batch manifest.
+
+    A JSON manifest is either a list of company entries, or an object with a `companies` list and
+    `defaults` applied to every entry. A CSV manifest has one row per company. Each entry has a
+    `company` name and an `input_directory` holding its PDF reports; every other key is a
+    PipelineConfig setting, e.g. `extraction_method` or `chunking_mode`.
+
+    Args:
+        manifest_path (str): Path to the .json or .csv manifest.
+
+    Returns:
+        list of dict: One entry per company, with the defaults applied.
+
+    Raises:
+        ValueError: If an entry has no company or input directory.
+    """
+    if manifest_path.lower().endswith(".csv"):
+        with open(manifest_path, newline='', encoding='utf-8') as file:
+            entries = [{key: _parse_value(value) for key, value in row.items() if value != ""} for row in csv.DictReader(file)]
+        defaults = {}
+    else:
+        with open(manifest_path, encoding='utf-8') as file:
+            manifest = json.load(file)
+        entries = manifest.get("companies", []) if isinstance(manifest, dict) else manifest
+        defaults = manifest.get("defaults", {}) if isinstance(manifest, dict) else {}
+
+    companies = []
+    for entry in entries:
+        entry = {**defaults, **entry}
+        if not entry.get("company") or not entry.get("input_directory"):
+            raise ValueError(f"Manifest entry needs a 'company' and an 'input_directory': {entry}")
+        companies.append(entry)
+    return companies
+
+def create_batch_jobs(entries, output_directory=DEFAULT_BATCH_OUTPUT_DIRECTORY):
+    """
+    Creates one job per manifest entry, with output paths isolated per company.
+
+    The Word documents of each company are written to `<output_directory>/<company>` and its
+    Knowledge Base to `<output_directory>/<company>/knowledge_base`, unless the entry sets
+    `output_directory` or `document_db_directory`.
+
+    Args:
+        entries (list of dict): Manifest entries from `read_manifest`.
+        output_directory (str): Folder holding one subfolder per company.
+
+    Returns:
+        list of BatchJob: The jobs, in manifest order.
+
+    Raises:
+        ValueError: If two companies map to the same folder or an entry has an unknown setting.
+    """
+    jobs = []
+    folders = set()
+    for entry in entries:
+        settings = dict(entry)
+        company = settings.pop("company")
+        input_directory = settings.pop("input_directory")
+        folder = company_directory_name(company)
+        if folder in folders:
+            raise ValueError(f"Two companies in the manifest share the output folder '{folder}'.")
+        folders.add(folder)
+
+        unknown = set(settings) - set(PipelineConfig._fields)
+        if unknown:
+            raise ValueError(f"Unknown settings for {company}: {sorted(unknown)}")
+        company_directory = settings.setdefault("output_directory", os.path.join(output_directory, folder))
+        settings.setdefault("document_db_directory", os.path.join(company_directory, "knowledge_base"))
+        settings.setdefault("text_output_path", os.path.join(company_directory, "output.txt"))
+        # Output from concurrent jobs would interleave on the console
+        settings["stream_output"] = False
+        pdf_paths = sorted(glob.glob(os.path.join(input_directory, "*.pdf")))
+        jobs.append(BatchJob(company, pdf_paths, PipelineConfig(**settings)))
+    return jobs
+
+def _initialize_cpu_worker(poppler_path, tesseract_path):
+    if poppler_path and tesseract_path:
+        set_paths(poppler_path, tesseract_path)
+
+def _run_stages(job, checkpoint_directory, stop_after=None):
+    """Runs the pipeline stages of one job and returns (stages run, seconds per stage, wall seconds)."""
+    if not job.pdf_paths:
+        raise ValueError(f"No PDF files found for {job.company}.")
+    start = time.perf_counter()
+    result = run_pipeline(job.pdf_paths, job.config, checkpoint_directory=checkpoint_directory, stop_after=stop_after)
+    return result.stages_run, result.stage_seconds, time.perf_counter() - start
+
+def run_batch(jobs, output_directory=DEFAULT_BATCH_OUTPUT_DIRECTORY, cpu_workers=2, io_workers=4,
+              checkpoint_directory=PIPELINE_CHECKPOINT_DIRECTORY, poppler_path=None, tesseract_path=None):
+    """
+    Runs the pipeline for many companies, overlapping CPU-bound and I/O-bound stages across jobs.
+
+    Extraction, cleaning and chunking run in a process pool. As soon as a company's chunks are
+    checkpointed, its embedding, analysis, summary and rendering are queued on a thread pool, whose
+    API calls share the rate-limited request scheduler, while the process pool extracts the next
+    companies. A failed company is recorded and does not stop the batch; running the batch again
+    resumes every company from its checkpoints.
+
+    Args:
+        jobs (list of BatchJob): The companies to process.
+        output_directory (str): Folder receiving the batch report.
+        cpu_workers (int): Processes running extraction, cleaning and chunking.
+        io_workers (int): Threads running embedding, analysis, summarization and rendering.
+        checkpoint_directory (str): Directory holding the stage checkpoints.
+        poppler_path (str): Poppler bin folder to add to PATH in each extraction process, if needed.
+        tesseract_path (str): Tesseract executable to use in each extraction process, if needed.
+
+    Returns:
+        dict: The batch report, also written to `<output_directory>/batch_report.json`.
+    """
+    start = time.perf_counter()
+    outcomes = {job.company: {"company": job.company, "status": "failed", "output_directory": job.config.output_directory,
+                              "pdf_count": len(job.pdf_paths), "stages_run": [], "stage_seconds": {}}
+                for job in jobs}
+
+    def record(job, phase, future):
+        outcome = outcomes[job.company]
+        try:
+            stages_run, stage_seconds, seconds = future.result()
+        except Exception as e:
+            outcome.update(error=f"{type(e).__name__}: {e}", failed_phase=phase)
+            logging.error(f"Batch job for {job.company} failed during {phase} stages: {e}")
+            return False
+        outcome["stages_run"] += stages_run
+        outcome["stage_seconds"].update(stage_seconds)
+        outcome[f"{phase}_seconds"] = seconds
+        return True
+
+    with ProcessPoolExecutor(cpu_workers, initializer=_initialize_cpu_worker, initargs=(poppler_path, tesseract_path)) as cpu_pool, \
+            ThreadPoolExecutor(io_workers) as io_pool:
+        cpu_futures = {cpu_pool.submit(_run_stages, job, checkpoint_directory, LAST_CPU_STAGE): job for job in jobs}
+        io_futures = {}
+        for future in as_completed(cpu_futures):
+            job = cpu_futures[future]
+            if record(job, "cpu", future):
+                io_futures[io_pool.submit(_run_stages, job, checkpoint_directory)] = job
+        for future in as_completed(io_futures):
+            job = io_futures[future]
+            if record(job, "io", future):
+                outcomes[job.company]["status"] = "succeeded"
+                logging.info(f"Batch job for {job.company} finished; documents are in {job.config.output_directory}.")
+
+    report = summarize_batch([outcomes[job.company] for job in jobs], time.perf_counter() - start)
+    os.makedirs(output_directory, exist_ok=True)
+    with open(os.path.join(output_directory, BATCH_REPORT_NAME), 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    log_batch_report(report)
+    return report
+
+def summarize_batch(outcomes, wall_seconds):
+    """
+    Builds the throughput and failure report of a batch.
+
+    Args:
+        outcomes (list of dict): One outcome per company, in manifest order.
+        wall_seconds (float): Duration of the whole batch.
+
+    Returns:
+        dict: Totals, throughput, time spent per stage and the outcome of every company.
+    """
+    succeeded = [outcome for outcome in outcomes if outcome["status"] == "succeeded"]
+    stage_totals = {}
+    for outcome in outcomes:
+        for stage_name, seconds in outcome["stage_seconds"].items():
+            stage_totals[stage_name] = stage_totals.get(stage_name, 0.0) + seconds
+    return {
+        "companies": len(outcomes),
+        "succeeded": len(succeeded),
+        "failed": len(outcomes) - len(succeeded),
+        "wall_seconds": wall_seconds,
+        "companies_per_hour": len(succeeded) * 3600 / wall_seconds if wall_seconds > 0 else 0.0,
+        "stage_seconds": stage_totals,
+        "failures": [{"company": o["company"], "phase": o.get("failed_phase"), "error": o.get("error")}
+                     for o in outcomes if o["status"] != "succeeded"],
+        "jobs": outcomes,
+    }
+
+def log_batch_report(report):
+    """Logs the totals, busiest stages and failures of a batch report."""
+    logging.info(f"Batch finished in {report['wall_seconds']:.1f}s: {report['succeeded']} of {report['companies']} companies "
+                 f"succeeded ({report['companies_per_hour']:.1f} companies/hour).")
+    for stage_name, seconds in sorted(report["stage_seconds"].items(), key=lambda item: -item[1]):
+        logging.info(f"  {stage_name}: {seconds:.1f}s in total")
+    for failure in report["failures"]:
+        logging.error(f"  {failure['company']} failed during {failure['phase']} stages: {failure['error']}")
+
+def main():
+    """Command line entry point running the pipeline for every company of a manifest."""
+    parser = argparse.ArgumentParser(description="Summarize the PDF reports of many companies without prompts.")
+    parser.add_argument("manifest", help="JSON or CSV manifest with a company and input_directory per entry.")
+    parser.add_argument("--output-directory", default=DEFAULT_BATCH_OUTPUT_DIRECTORY, help="Folder for the per-company outputs and the report.")
+    parser.add_argument("--cpu-workers", type=int, default=2, help="Processes running extraction and chunking.")
+    parser.add_argument("--io-workers", type=int, default=4, help="Threads running embedding, analysis and rendering.")
+    parser.add_argument("--poppler-path", help="Poppler bin folder, if it is not on PATH.")
+    parser.add_argument("--tesseract-path", help="Tesseract executable, if it is not on PATH.")
+    args = parser.parse_args()
+
+    if bool(args.poppler_path) != bool(args.tesseract_path):
+        parser.error("--poppler-path and --tesseract-path must be given together.")
+    if not os.getenv("OPENAI_API_KEY"):
+        parser.error("Set the OPENAI_API_KEY environment variable before running a batch.")
+    jobs = create_batch_jobs(read_manifest(args.manifest), args.output_directory)
+    report = run_batch(jobs, args.output_directory, args.cpu_workers, args.io_workers,
+                       poppler_path=args.poppler_path, tesseract_path=args.tesseract_path)
+    if report["failed"]:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
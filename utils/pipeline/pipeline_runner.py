@@ -0,0 +1,475 @@
+import os
+import json
+import time
+import glob
+import shutil
+import hashlib
+import argparse
+import logging
+from typing import NamedTuple, Callable, Optional
+
+from langchain_core.documents import Document
+
+from utils.cache.sqlite_lru_cache import DEFAULT_CACHE_DIRECTORY
+from utils.extraction.page_cache import hash_pdf
+from utils.extraction.page_record import PageRecord
+from utils.extraction.stream_pages import stream_pdf_pages, PAGE_EXTRACTORS
+from utils.extraction.extract_text_budgeted_OCR import DEFAULT_OCR_MEMORY_BUDGET_MB
+from utils.processing.strip_running_headers import iter_stripped_pages
+from utils.processing.process_text import process_pdf_texts
+from utils.processing.token_chunk_text import token_chunk_text
+from utils.processing.deduplicate_chunks import deduplicate_chunks
+from utils.processing.text_read_and_write import tee_pages_to_file
+from utils.embeddings.create_db_and_store_embedding import store_embeddings_openai
+from utils.analysis.generate_2_page_summary import analyze_with_llm_openai, stream_analysis_with_llm_openai, ANALYSIS_ERROR_MESSAGE
+from utils.analysis.generate_1_page_summary import summarize_text, stream_summarize_text, SUMMARY_ERROR_MESSAGE
+from utils.analysis.map_reduce_summary import summarize_text_map_reduce
+from utils.docx_io.save_analysis_to_docx import save_text_to_docx
+from utils.telemetry.tracing import record_span, add_tracing_arguments, tracing_from_arguments
+
+logging.basicConfig(level=logging.INFO)
+
+PIPELINE_CHECKPOINT_DIRECTORY = os.path.join(DEFAULT_CACHE_DIRECTORY, "pipeline")
+
+# Written into the Knowledge Base directory, so an embed checkpoint is only reused for the Knowledge Base it built
+KNOWLEDGE_BASE_MARKER = "pipeline_checkpoint.txt"
+
+class PipelineError(Exception):
+    """Raised when a pipeline stage fails. Nothing is checkpointed for the failed stage."""
+
+class PipelineConfig(NamedTuple):
+    """Settings of one pipeline run. Each stage's checkpoint key includes only the settings that affect its output."""
+    document_db_directory: str
+    extraction_method: str = "hybrid"  # One of the keys of PAGE_EXTRACTORS
+    ocr_workers: Optional[int] = None  # Worker processes for 'parallel_ocr'
+    ocr_memory_budget_mb: int = DEFAULT_OCR_MEMORY_BUDGET_MB  # RAM for rendering and OCR with 'budgeted_ocr'
+    remove_running_headers: bool = True
+    chunking_mode: str = "characters"  # 'characters' or 'tokens'
+    chunk_size: int = 3000
+    chunk_overlap: int = 200
+    chunk_tokens: int = 800
+    chunk_overlap_tokens: int = 100
+    remove_duplicate_chunks: bool = True
+    duplicate_threshold: float = 0.85
+    embedding_backend: str = "openai"
+    vector_store_backend: str = "chroma"
+    retrieval_mode: str = "hybrid"
+    report_mode: str = "sections"
+    section_concurrency: int = 4
+    context_token_budget: Optional[int] = 3000
+    stream_output: bool = False  # Prints the analysis and summary as they are generated
+    output_directory: str = "Output Files"
+    replace_existing: bool = True  # Replaces the Knowledge Base contents; False adds the chunks to what it already holds
+    text_output_path: Optional[str] = None  # File the cleaned page text is written to, e.g. 'Output Files/output.txt'
+    summarize_filing: bool = False  # Also writes a 1 page map-reduce summary of the cleaned text; needs text_output_path
+
+class KnowledgeBase(NamedTuple):
+    """The embedded chunks, handed from the embed stage to the analyze stage."""
+    directory: str
+    embedding_backend: str
+    vector_store_backend: str
+    chunk_count: int
+    # Key of the embed checkpoint, which covers the content of the chunks, so the checkpoints of later
+    # stages change whenever the chunks do, even if their number does not
+    checkpoint_key: str = ""
+
+class RenderedReport(NamedTuple):
+    """Paths of the Word documents written by the render stage."""
+    two_page_path: str
+    one_page_path: str
+    filing_summary_path: str = ""  # Empty unless the filing was summarized
+
+class SummaryInputs(NamedTuple):
+    """The 2 page analysis and its 1 page summary, handed from the summarize stage to the render stage."""
+    analysis: str
+    summary: str
+    filing_summary: str = ""  # 1 page summary of the whole cleaned text, if requested
+
+class PipelineStage(NamedTuple):
+    """One step of the pipeline.
+
+    `run` takes the previous stage's artifact, the config and the stage's checkpoint key, and returns
+    this stage's artifact. `encode` and `decode` convert the artifact to and from JSON-compatible data,
+    `params` lists the settings the output depends on, and `is_valid` checks that a checkpoint's side
+    effects (a Knowledge Base or output files) still exist.
+    """
+    name: str
+    run: Callable
+    params: Callable
+    encode: Callable
+    decode: Callable
+    is_valid: Callable = lambda config, key: True
+
+class PipelineResult(NamedTuple):
+    """Outcome of a pipeline run."""
+    analysis: str
+    summary: str
+    report: RenderedReport
+    stages_run: list  # Names of the stages that ran; the others were restored from checkpoints
+    stage_seconds: dict  # Seconds spent in each stage that ran
+    filing_summary: str = ""
+
+def _extract(pdf_paths, config, key):
+    options = {}
+    if config.extraction_method == 'parallel_ocr':
+        options = {'max_workers': config.ocr_workers}
+    elif config.extraction_method == 'budgeted_ocr':
+        options = {'memory_budget_mb': config.ocr_memory_budget_mb}
+    pages = list(stream_pdf_pages(pdf_paths, config.extraction_method, **options))
+    if not pages:
+        raise PipelineError("No text was extracted from the input files.")
+    return pages
+
+def _clean(pages, config, key):
+    if config.remove_running_headers:
+        pages = iter_stripped_pages(pages)
+    if config.text_output_path:
+        os.makedirs(os.path.dirname(config.text_output_path) or ".", exist_ok=True)
+        pages = tee_pages_to_file(pages, config.text_output_path)
+    return list(pages)
+
+def _text_output_is_valid(config, key):
+    return not config.text_output_path or os.path.isfile(config.text_output_path)
+
+def _file_hash(path):
+    """Returns the SHA-256 of a file's contents, or None if there is no such file."""
+    if not path or not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+def _chunk(pages, config, key):
+    if config.chunking_mode == "tokens":
+        chunks = token_chunk_text(pages, config.chunk_tokens, config.chunk_overlap_tokens)
+    else:
+        chunks = process_pdf_texts(pages, config.chunk_size, config.chunk_overlap)
+    if config.remove_duplicate_chunks:
+        chunks = deduplicate_chunks(chunks, config.duplicate_threshold)
+    if not chunks:
+        raise PipelineError("Chunking produced no documents.")
+    return chunks
+
+def _embed(chunks, config, key):
+    if not store_embeddings_openai(chunks, config.document_db_directory, replace_existing=config.replace_existing,
+                                   embedding_backend=config.embedding_backend, vector_store_backend=config.vector_store_backend):
+        raise PipelineError(f"Storing embeddings in {config.document_db_directory} failed.")
+    with open(os.path.join(config.document_db_directory, KNOWLEDGE_BASE_MARKER), 'w', encoding='utf-8') as file:
+        file.write(key)
+    return KnowledgeBase(config.document_db_directory, config.embedding_backend, config.vector_store_backend, len(chunks), key)
+
+def _knowledge_base_is_valid(config, key):
+    try:
+        with open(os.path.join(config.document_db_directory, KNOWLEDGE_BASE_MARKER), encoding='utf-8') as file:
+            return file.read().strip() == key
+    except OSError:
+        return False
+
+def _print_stream(pieces, title):
+    print('---------------------------------------------------------------------------------------------------')
+    print(f"{title}:")
+    text = []
+    for piece in pieces:
+        print(piece, end='', flush=True)
+        text.append(piece)
+    print()
+    return "".join(text)
+
+def _analyze(knowledge_base, config, key):
+    arguments = (knowledge_base.directory, knowledge_base.embedding_backend, knowledge_base.vector_store_backend,
+                 config.retrieval_mode, config.report_mode, config.section_concurrency)
+    if config.stream_output:
+        analysis = _print_stream(stream_analysis_with_llm_openai(*arguments, context_token_budget=config.context_token_budget),
+                                 "2 Page Summary")
+    else:
+        analysis = analyze_with_llm_openai(*arguments, context_token_budget=config.context_token_budget)
+    if analysis.endswith(ANALYSIS_ERROR_MESSAGE):
+        raise PipelineError("Generating the 2 page analysis failed.")
+    return analysis
+
+def _summarize(analysis, config, key):
+    # The analysis is summarized straight from memory, without reading it back from the .docx file
+    if config.stream_output:
+        summary = _print_stream(stream_summarize_text(analysis), "1 Page Summary")
+    else:
+        summary = summarize_text(analysis)
+    if summary.endswith(SUMMARY_ERROR_MESSAGE):
+        raise PipelineError("Generating the 1 page summary failed.")
+    filing_summary = ""
+    if config.summarize_filing:
+        # The clean stage has written the text by now, since stages run in order
+        if not config.text_output_path:
+            raise PipelineError("Summarizing the filing needs text_output_path to be set.")
+        with open(config.text_output_path, encoding='utf-8') as file:
+            filing_summary = summarize_text_map_reduce(file.read())
+        if filing_summary.endswith(SUMMARY_ERROR_MESSAGE):
+            raise PipelineError("Generating the filing summary failed.")
+    return SummaryInputs(analysis, summary, filing_summary)
+
+def _report_paths(config):
+    return RenderedReport(os.path.join(config.output_directory, "2 Page Summary.docx"),
+                          os.path.join(config.output_directory, "1 Page Summary.docx"),
+                          os.path.join(config.output_directory, "Filing Summary.docx") if config.summarize_filing else "")
+
+def _render(summaries, config, key):
+    report = _report_paths(config)
+    os.makedirs(config.output_directory, exist_ok=True)
+    save_text_to_docx(summaries.analysis, report.two_page_path)
+    save_text_to_docx(summaries.summary, report.one_page_path)
+    if report.filing_summary_path:
+        save_text_to_docx(summaries.filing_summary, report.filing_summary_path)
+    return report
+
+def _report_is_valid(config, key):
+    return all(os.path.isfile(path) for path in _report_paths(config) if path)
+
+def _encode_pages(pages):
+    return [list(page) for page in pages]
+
+def _decode_pages(data):
+    return [PageRecord(*page) for page in data]
+
+def _encode_chunks(chunks):
+    return [{"page_content": chunk.page_content, "metadata": chunk.metadata} for chunk in chunks]
+
+def _decode_chunks(data):
+    return [Document(page_content=chunk["page_content"], metadata=chunk["metadata"]) for chunk in data]
+
+def _identity(value):
+    return value
+
+# The stages in order; each consumes the artifact of the one before it
+PIPELINE_STAGES = (
+    PipelineStage("extract", _extract, lambda c: {"method": c.extraction_method}, _encode_pages, _decode_pages),
+    PipelineStage("clean", _clean,
+                  lambda c: {"remove_running_headers": c.remove_running_headers,
+                             "text_output_path": c.text_output_path and os.path.abspath(c.text_output_path)},
+                  _encode_pages, _decode_pages, _text_output_is_valid),
+    PipelineStage("chunk", _chunk,
+                  lambda c: {"mode": c.chunking_mode, "size": c.chunk_size, "overlap": c.chunk_overlap, "tokens": c.chunk_tokens,
+                             "overlap_tokens": c.chunk_overlap_tokens, "deduplicate": c.remove_duplicate_chunks,
+                             "duplicate_threshold": c.duplicate_threshold},
+                  _encode_chunks, _decode_chunks),
+    PipelineStage("embed", _embed,
+                  lambda c: {"directory": os.path.abspath(c.document_db_directory), "embedding_backend": c.embedding_backend,
+                             "vector_store_backend": c.vector_store_backend, "replace_existing": c.replace_existing},
+                  lambda kb: kb._asdict(), lambda data: KnowledgeBase(**data), _knowledge_base_is_valid),
+    PipelineStage("analyze", _analyze,
+                  lambda c: {"retrieval_mode": c.retrieval_mode, "report_mode": c.report_mode,
+                             "context_token_budget": c.context_token_budget},
+                  _identity, _identity),
+    # The filing summary depends on the cleaned text rather than on the analysis, so the text is part of the key
+    PipelineStage("summarize", _summarize,
+                  lambda c: {"filing_text": _file_hash(c.text_output_path)} if c.summarize_filing else {},
+                  lambda s: s._asdict(), lambda data: SummaryInputs(**data)),
+    PipelineStage("render", _render,
+                  lambda c: {"output_directory": os.path.abspath(c.output_directory), "summarize_filing": c.summarize_filing},
+                  lambda r: r._asdict(), lambda data: RenderedReport(**data), _report_is_valid),
+)
+
+STAGE_NAMES = tuple(stage.name for stage in PIPELINE_STAGES)
+
+def fingerprint_inputs(pdf_paths):
+    """Hashes the paths and contents of the input PDFs, which are the input of the extract stage.
+
+    Args:
+        pdf_paths (list of str): Paths to the PDF files, in processing order.
+
+    Returns:
+        str: The hex digest.
+    """
+    return _hash(json.dumps([[path, hash_pdf(path)] for path in pdf_paths]))
+
+def _hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class CheckpointStore:
+    """Stores stage artifacts as JSON files named by the stage and its checkpoint key.
+
+    Each checkpoint has a small metadata file with the artifact's content hash, written after the
+    artifact, so downstream keys can be computed without loading large artifacts and a checkpoint
+    interrupted while being written is never used.
+    """
+
+    def __init__(self, directory=PIPELINE_CHECKPOINT_DIRECTORY):
+        self.directory = directory
+
+    def _path(self, stage_name, key, suffix):
+        return os.path.join(self.directory, stage_name, f"{key}{suffix}")
+
+    def load_metadata(self, stage_name, key):
+        """Returns the metadata of a checkpoint, or None if it does not exist."""
+        try:
+            with open(self._path(stage_name, key, ".meta.json"), encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, stage_name, key):
+        """Returns the encoded artifact of a checkpoint."""
+        with open(self._path(stage_name, key, ".json"), encoding='utf-8') as file:
+            return json.load(file)
+
+    def save(self, stage_name, key, data, seconds):
+        """Stores an encoded artifact and returns its content hash."""
+        os.makedirs(os.path.join(self.directory, stage_name), exist_ok=True)
+        text = json.dumps(data, ensure_ascii=False)
+        artifact_hash = _hash(text)
+        for suffix, content in ((".json", text), (".meta.json", json.dumps({"artifact_hash": artifact_hash, "seconds": seconds,
+                                                                            "created": time.time()}))):
+            temporary_path = self._path(stage_name, key, suffix + ".tmp")
+            with open(temporary_path, 'w', encoding='utf-8') as file:
+                file.write(content)
+            os.replace(temporary_path, self._path(stage_name, key, suffix))
+        return artifact_hash
+
+    def clear(self):
+        """Removes every checkpoint."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+class PipelineRunner:
+    """Runs extract, clean, chunk, embed, analyze, summarize and render as checkpointed stages.
+
+    Artifacts are handed from stage to stage in memory. A stage's checkpoint key is the hash of its
+    settings and of the content hash of its input artifact, so when a run crashes or its settings
+    change, the next run restores every stage whose inputs are unchanged and resumes from the first
+    stage whose inputs changed. Restored artifacts are only loaded when a later stage needs them.
+    """
+
+    def __init__(self, config, checkpoint_directory=PIPELINE_CHECKPOINT_DIRECTORY):
+        """
+        Args:
+            config (PipelineConfig): The settings of the run.
+            checkpoint_directory (str): Directory holding the stage checkpoints.
+        """
+        self.config = config
+        self.store = CheckpointStore(checkpoint_directory)
+
+    def stage_key(self, stage, input_hash):
+        """Returns the checkpoint key of a stage for the given input artifact hash."""
+        return _hash(json.dumps({"stage": stage.name, "params": stage.params(self.config), "input": input_hash}, sort_keys=True))
+
+    def run(self, pdf_paths, rerun_from=None, stop_after=None, progress=None):
+        """
+        Runs the pipeline, restoring every stage that has a valid checkpoint.
+
+        Args:
+            pdf_paths (list of str): Paths to the PDF files of one company, in processing order.
+            rerun_from (str): Name of a stage to run again even if it is checkpointed, along with every later stage.
+            stop_after (str): Name of the last stage to run, e.g. to checkpoint the CPU-bound stages in one
+                worker and continue from the checkpoint in another. None runs every stage.
+            progress (callable): Called with (stage name, event, seconds) as stages are 'restored', 'started' and
+                'finished'; seconds is 0 except for 'finished'.
+
+        Returns:
+            PipelineResult: The analysis, summary, written documents and the stages that ran. The analysis,
+                summary and report are None when the run stops before the render stage.
+
+        Raises:
+            PipelineError: If a stage fails. Earlier stages stay checkpointed, so the next run resumes at the failed stage.
+            ValueError: If `rerun_from` or the extraction method is unknown.
+        """
+        for stage_name in (rerun_from, stop_after):
+            if stage_name is not None and stage_name not in STAGE_NAMES:
+                raise ValueError(f"Unknown stage: {stage_name}. Choose one of {STAGE_NAMES}.")
+        if self.config.extraction_method not in PAGE_EXTRACTORS:
+            raise ValueError(f"Unsupported extraction method: {self.config.extraction_method}")
+
+        forced = STAGE_NAMES[STAGE_NAMES.index(rerun_from):] if rerun_from else ()
+        input_hash = fingerprint_inputs(pdf_paths)
+        keys = {}
+        artifacts = {}
+        previous = None
+        stages_run = []
+        stage_seconds = {}
+
+        for stage in PIPELINE_STAGES:
+            key = keys[stage.name] = self.stage_key(stage, input_hash)
+            metadata = self.store.load_metadata(stage.name, key)
+            if metadata is not None and stage.name not in forced and stage.is_valid(self.config, key):
+                logging.info(f"Pipeline stage '{stage.name}' restored from its checkpoint.")
+                if progress:
+                    progress(stage.name, "restored", 0.0)
+            else:
+                stage_input = pdf_paths if previous is None else self._artifact(previous, keys, artifacts)
+                logging.info(f"Running pipeline stage '{stage.name}'.")
+                if progress:
+                    progress(stage.name, "started", 0.0)
+                start = time.perf_counter()
+                with record_span(f"pipeline.{stage.name}", checkpoint_key=key):
+                    artifacts[stage.name] = stage.run(stage_input, self.config, key)
+                stage_seconds[stage.name] = time.perf_counter() - start
+                metadata = {"artifact_hash": self.store.save(stage.name, key, stage.encode(artifacts[stage.name]),
+                                                             stage_seconds[stage.name])}
+                stages_run.append(stage.name)
+                logging.info(f"Pipeline stage '{stage.name}' finished in {stage_seconds[stage.name]:.2f}s.")
+                if progress:
+                    progress(stage.name, "finished", stage_seconds[stage.name])
+                if previous is not None:
+                    # Earlier artifacts are no longer needed, so large pages and chunks are released
+                    artifacts.pop(previous.name, None)
+            input_hash = metadata["artifact_hash"]
+            previous = stage
+            if stage.name == stop_after and stop_after != "render":
+                return PipelineResult(None, None, None, stages_run, stage_seconds)
+
+        summaries = self._artifact(PIPELINE_STAGES[STAGE_NAMES.index("summarize")], keys, artifacts)
+        report = self._artifact(PIPELINE_STAGES[STAGE_NAMES.index("render")], keys, artifacts)
+        return PipelineResult(summaries.analysis, summaries.summary, report, stages_run, stage_seconds, summaries.filing_summary)
+
+    def _artifact(self, stage, keys, artifacts):
+        """Returns a stage's artifact of this run, loading it from its checkpoint if the stage was restored."""
+        if stage.name not in artifacts:
+            artifacts[stage.name] = stage.decode(self.store.load(stage.name, keys[stage.name]))
+        return artifacts[stage.name]
+
+def run_pipeline(pdf_paths, config, rerun_from=None, checkpoint_directory=PIPELINE_CHECKPOINT_DIRECTORY, stop_after=None,
+                 progress=None):
+    """
+    Runs the checkpointed pipeline for the PDF reports of one company.
+
+    Args:
+        pdf_paths (list of str): Paths to the PDF files, in processing order.
+        config (PipelineConfig): The settings of the run.
+        rerun_from (str): Name of a stage to run again even if it is checkpointed, along with every later stage.
+        checkpoint_directory (str): Directory holding the stage checkpoints.
+        stop_after (str): Name of the last stage to run. None runs every stage.
+        progress (callable): Called with (stage name, event, seconds) as stages are restored, started and finished.
+
+    Returns:
+        PipelineResult: The analysis, summary, written documents and the stages that ran.
+    """
+    return PipelineRunner(config, checkpoint_directory).run(pdf_paths, rerun_from, stop_after, progress)
+
+def main():
+    """Command line entry point running the pipeline for a folder of PDF reports."""
+    parser = argparse.ArgumentParser(description="Run the checkpointed summarization pipeline for one company's PDF reports.")
+    parser.add_argument("input_directory", nargs="?", help="Folder containing the PDF reports of one company.")
+    parser.add_argument("--company", help="Name of the company, used as the Knowledge Base directory.")
+    parser.add_argument("--method", default="hybrid", choices=sorted(PAGE_EXTRACTORS), help="Extraction method.")
+    parser.add_argument("--ocr-memory-budget", type=int, default=DEFAULT_OCR_MEMORY_BUDGET_MB,
+                        help="RAM in MB for rendering and OCR with the budgeted_ocr method.")
+    parser.add_argument("--output-directory", default="Output Files", help="Folder for the Word documents and output.txt.")
+    parser.add_argument("--summarize-filing", action="store_true", help="Also write a 1 page summary of the whole extracted text.")
+    parser.add_argument("--rerun-from", choices=STAGE_NAMES, help="Run this stage and every later stage even if checkpointed.")
+    parser.add_argument("--clear", action="store_true", help="Remove every pipeline checkpoint.")
+    add_tracing_arguments(parser)
+    args = parser.parse_args()
+
+    if args.clear:
+        CheckpointStore().clear()
+        logging.info(f"Removed the pipeline checkpoints in {PIPELINE_CHECKPOINT_DIRECTORY}.")
+    if args.input_directory is None:
+        return
+    if args.company is None:
+        parser.error("--company is required to run the pipeline.")
+
+    config = PipelineConfig(args.company, extraction_method=args.method, ocr_memory_budget_mb=args.ocr_memory_budget,
+                            output_directory=args.output_directory, text_output_path=os.path.join(args.output_directory, "output.txt"),
+                            summarize_filing=args.summarize_filing)
+    with tracing_from_arguments(args):
+        result = run_pipeline(sorted(glob.glob(os.path.join(args.input_directory, "*.pdf"))), config, args.rerun_from)
+    logging.info(f"Stages run: {result.stages_run or 'none'}; documents written to {result.report.two_page_path} "
+                 f"and {result.report.one_page_path}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import math
+import logging
+
+import mmh3
+import numpy as np
+
+from utils.processing.token_chunk_text import count_tokens
+
+logging.basicConfig(level=logging.INFO)
+
+EMPTY_BIN = np.uint64(np.iinfo(np.uint64).max)
+SHINGLE_PRIME = np.uint64(0x9E3779B97F4A7C15)
+
+def _mix64(values):
+    """Scrambles 64-bit hashes in place so that their low bits are well distributed (xorshift-multiply finaliser)."""
+    values ^= values >> np.uint64(32)
+    values *= np.uint64(0xD6E8FEB86659FD93)
+    values ^= values >> np.uint64(29)
+    return values
+
+def word_hashes(texts):
+    """
+    Hashes every whitespace-separated word of many texts with vectorised NumPy operations.
+
+    The texts are lower-cased and concatenated into one byte buffer. Each word is hashed from its
+    first and last eight bytes and its length, so words of up to 16 bytes are hashed in full.
+
+    Args:
+        texts (list of str): The texts to split into words.
+
+    Returns:
+        tuple: A uint64 array with the hash of each word, and the number of words in each text.
+    """
+    # Padded so that 8 bytes can be read from any position without copying the buffer
+    joined = "\n".join(texts).lower() + "\n" * 9
+    encoded = joined.encode('utf-8')
+    if len(encoded) == len(joined):
+        # Plain ASCII, so every text takes as many bytes as characters
+        offsets = np.cumsum([0] + [len(text) + 1 for text in texts])
+    else:
+        offsets = np.cumsum([0] + [len(text.lower().encode('utf-8')) + 1 for text in texts])
+    data = np.frombuffer(encoded, dtype=np.uint8)
+    size = len(data) - 8
+
+    # Control characters and spaces separate words; word boundaries are where this flips
+    is_word = np.zeros(size + 1, dtype=bool)
+    np.greater(data[:size], 32, out=is_word[1:])
+    boundaries = np.flatnonzero(is_word[1:] != is_word[:-1])
+    starts, ends = boundaries[0::2], boundaries[1::2]
+
+    # Unaligned view that reads the 8 bytes starting at every position of the buffer
+    eight_bytes = np.ndarray((size,), dtype='<u8', buffer=data, strides=(1,))
+    lengths = np.subtract(ends, starts, out=np.empty(len(starts), dtype=np.uint64), casting='unsafe')
+    # Shifting out the high bytes keeps only the bytes that belong to a word shorter than 8 bytes
+    unused_bits = np.uint64(64) - np.minimum(lengths, np.uint64(8)) * np.uint64(8)
+    heads = eight_bytes[starts]
+    heads <<= unused_bits
+    heads >>= unused_bits
+    # A short word lies entirely in its head, so its tail is read from the same place
+    tails = eight_bytes[np.maximum(ends - 8, starts)]
+    tails <<= unused_bits
+    tails >>= unused_bits
+    hashes = heads * SHINGLE_PRIME
+    hashes += tails
+    hashes += lengths
+    words_per_text = np.diff(np.searchsorted(starts, offsets))
+    return _mix64(hashes), words_per_text
+
+def minhash_signatures(texts, num_perm=128, shingle_size=5):
+    """
+    Computes one-permutation MinHash signatures of word shingles for many texts at once.
+
+    Shingle hashes, bin assignment and the per-bin minimum are computed with vectorised NumPy
+    operations over the whole corpus, so no Python code runs per word.
+
+    Args:
+        texts (list of str): The texts to sign.
+        num_perm (int): Number of signature bins. Must be a power of two.
+        shingle_size (int): Number of consecutive words in each shingle.
+
+    Returns:
+        numpy.ndarray: A (len(texts), num_perm) uint64 array. Bins without any shingle hold `EMPTY_BIN`.
+    """
+    # The extra row collects the shingles that run across the end of a text
+    signatures = np.full((len(texts) + 1, num_perm), EMPTY_BIN, dtype=np.uint64)
+    hashes, words_per_text = word_hashes(texts)
+    if len(hashes) < shingle_size:
+        return signatures[:-1]
+
+    count = len(hashes) - shingle_size + 1
+    shingles = hashes[:count].copy()
+    for offset in range(1, shingle_size):
+        shingles *= SHINGLE_PRIME
+        shingles += hashes[offset:offset + count]
+    _mix64(shingles)
+
+    positions = (shingles & np.uint64(num_perm - 1)).astype(np.int64)
+    positions += np.repeat(np.arange(len(texts)) * num_perm, words_per_text)[:count]
+    # The last shingle_size - 1 shingles before each text's end also hold words of the next text
+    text_ends = np.cumsum(words_per_text)
+    crossing = (text_ends[:, None] - np.arange(1, shingle_size)).ravel()
+    positions[crossing[(crossing >= 0) & (crossing < count)]] = len(texts) * num_perm
+    shingles >>= np.uint64(int(math.log2(num_perm)))
+    np.minimum.at(signatures.reshape(-1), positions, shingles)
+    return signatures[:-1]
+
+def estimate_jaccard(signature_a, signature_b):
+    """Estimates the Jaccard similarity of two texts from their one-permutation MinHash signatures."""
+    both_empty = (signature_a == EMPTY_BIN) & (signature_b == EMPTY_BIN)
+    compared = signature_a.shape[0] - int(both_empty.sum())
+    if compared == 0:
+        return 0.0
+    return int(((signature_a == signature_b) & ~both_empty).sum()) / compared
+
+def _estimate_jaccard_rows(signatures_a, signatures_b):
+    """Estimates the Jaccard similarity of each pair of rows of two signature arrays at once."""
+    both_empty = (signatures_a == EMPTY_BIN) & (signatures_b == EMPTY_BIN)
+    compared = signatures_a.shape[1] - both_empty.sum(axis=1)
+    matches = ((signatures_a == signatures_b) & ~both_empty).sum(axis=1)
+    return np.divide(matches, compared, out=np.zeros(len(compared)), where=compared > 0)
+
+def choose_bands(num_perm, threshold):
+    """Chooses the LSH band count whose collision threshold (1/b)^(1/r) is closest to, but not above, the Jaccard threshold."""
+    best = (1, num_perm)
+    for bands in range(1, num_perm + 1):
+        if num_perm % bands:
+            continue
+        rows = num_perm // bands
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+            break
+    return best
+
+def find_duplicate_chunks(chunks, threshold=0.85, num_perm=128, shingle_size=5, batch_size=166):
+    """
+    Finds exact and near-duplicate chunks using MinHash signatures and an LSH index.
+
+    A chunk is a duplicate if its text equals an earlier chunk's (ignoring case and surrounding
+    whitespace, compared by 128-bit murmur hash), or if its estimated
+    Jaccard similarity to an earlier kept chunk is at least `threshold`. The first occurrence is kept.
+
+    Args:
+        chunks (list of Document): The chunks to check, in document order.
+        threshold (float): Jaccard similarity at or above which a chunk counts as a near-duplicate.
+        num_perm (int): Number of MinHash signature bins. Must be a power of two.
+        shingle_size (int): Number of consecutive words in each shingle.
+        batch_size (int): Number of chunks sent per embedding request, used to report saved calls.
+
+    Returns:
+        tuple: The sorted indices of duplicate chunks and a dict of statistics.
+    """
+    texts = [chunk.page_content for chunk in chunks]
+    duplicate = np.zeros(len(texts), dtype=bool)
+
+    first_seen = {}
+    for index, text in enumerate(texts):
+        key = mmh3.hash128(text.strip().lower())
+        if key in first_seen:
+            duplicate[index] = True
+        else:
+            first_seen[key] = index
+    exact = int(duplicate.sum())
+
+    signatures = minhash_signatures(texts, num_perm, shingle_size)
+    bands, rows = choose_bands(num_perm, threshold)
+    multipliers = _mix64(np.arange(1, rows + 1, dtype=np.uint64)) | np.uint64(1)
+    for band in range(bands):
+        band_values = signatures[:, band * rows:(band + 1) * rows]
+        band_hashes = (band_values * multipliers).sum(axis=1)
+        band_hashes[(band_values == EMPTY_BIN).all(axis=1)] = EMPTY_BIN
+        order = np.argsort(band_hashes, kind="stable")
+        sorted_hashes = band_hashes[order]
+        # Bucket boundaries in the sorted hashes; an empty corpus has no buckets at all
+        starts = np.flatnonzero(np.r_[True, sorted_hashes[1:] != sorted_hashes[:-1]])[:len(order)]
+        ends = np.r_[starts[1:], len(order)]
+        signed = sorted_hashes[starts] != EMPTY_BIN
+        # Buckets of one band never share a chunk, so all pairs are compared at once; the earlier chunk is kept
+        pairs = signed & (ends - starts == 2)
+        first, second = order[starts[pairs]], order[starts[pairs] + 1]
+        live = ~duplicate[first] & ~duplicate[second]
+        first, second = first[live], second[live]
+        duplicate[second[_estimate_jaccard_rows(signatures[first], signatures[second]) >= threshold]] = True
+        crowded = signed & (ends - starts > 2)
+        for start, end in zip(starts[crowded].tolist(), ends[crowded].tolist()):
+            representatives = []
+            for index in order[start:end]:
+                if duplicate[index]:
+                    continue
+                if any(estimate_jaccard(signatures[index], signatures[other]) >= threshold for other in representatives):
+                    duplicate[index] = True
+                else:
+                    representatives.append(index)
+
+    duplicates = np.flatnonzero(duplicate).tolist()
+    kept = len(texts) - len(duplicates)
+    stats = {
+        "chunks": len(texts),
+        "exact_duplicates": exact,
+        "near_duplicates": len(duplicates) - exact,
+        "kept": kept,
+        "characters_saved": sum(len(chunks[index].page_content) for index in duplicates),
+        "embedding_calls_saved": math.ceil(len(texts) / batch_size) - math.ceil(kept / batch_size),
+    }
+    return duplicates, stats
+
+def deduplicate_chunks(chunks, threshold=0.85, num_perm=128, shingle_size=5, batch_size=166):
+    """
+    Removes exact and near-duplicate chunks before embedding and logs how much was saved.
+
+    Args:
+        chunks (list of Document): The chunks to deduplicate, in document order.
+        threshold (float): Jaccard similarity at or above which a chunk counts as a near-duplicate.
+        num_perm (int): Number of MinHash signature bins. Must be a power of two.
+        shingle_size (int): Number of consecutive words in each shingle.
+        batch_size (int): Number of chunks sent per embedding request, used to report saved calls.
+
+    Returns:
+        list of Document: The chunks with duplicates removed, in their original order.
+    """
+    try:
+        duplicates, stats = find_duplicate_chunks(chunks, threshold, num_perm, shingle_size, batch_size)
+        removed = set(duplicates)
+        try:
+            stats["tokens_saved"] = sum(count_tokens(chunks[index].page_content) for index in duplicates)
+        except Exception:
+            stats["tokens_saved"] = None
+        logging.info(
+            f"Removed {len(duplicates)} of {stats['chunks']} chunks ({stats['exact_duplicates']} exact, "
+            f"{stats['near_duplicates']} near-duplicates). Saved {stats['tokens_saved']} tokens and "
+            f"{stats['embedding_calls_saved']} embedding calls."
+        )
+        return [chunk for index, chunk in enumerate(chunks) if index not in removed]
+    except Exception as e:
+        logging.error(f"Unexpected error in deduplicating chunks: {e}")
+        return chunks
@@ -8,7 +8,7 @@ def process_pdf_texts(pdf_texts, chunk_size, chunk_overlap):
     Processes the given PDF texts by chunking them into smaller segments.
 
     Args:
-        pdf_texts (list of str): The text data extracted from PDFs.
+        pdf_texts (str, list of str or iterable of PageRecord): The text data extracted from PDFs.
         chunk_size (int): The maximum size of each chunk.
         chunk_overlap (int): The overlap size between consecutive chunks.
 
@@ -1,5 +1,7 @@
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
+
+from utils.telemetry.tracing import traced, chunking_attributes
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -34,14 +36,81 @@ def split_text(combined_text, chunk_size, chunk_overlap):
         raise
 
 
-def chunk_text(text_data, chunk_size, chunk_overlap):
+def fast_split_text(text, chunk_size, chunk_overlap, separators=("\n\n", "\n", " ")):
+    """
+    Splits text into chunks in a single linear pass.
+
+    Each chunk ends at the last paragraph break, line break or space found in the second half of
+    its window, falling back to a hard cut. The next chunk starts `chunk_overlap` characters
+    before the end of the previous one, moved forward to the next word boundary.
+
+    Args:
+        text (str): The text to be split.
+        chunk_size (int): The maximum size of each chunk.
+        chunk_overlap (int): The overlap size between consecutive chunks.
+        separators (tuple of str): Preferred break points, in order of preference.
+
+    Returns:
+        list of str: A list of chunked text.
+
+    Raises:
+        ValueError: If the overlap is not smaller than the chunk size.
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError(f"Chunk overlap ({chunk_overlap}) must be smaller than chunk size ({chunk_size}).")
+
+    chunks = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + chunk_size, length)
+        if end < length:
+            lower_bound = start + chunk_size // 2
+            for separator in separators:
+                cut = text.rfind(separator, lower_bound, end)
+                if cut != -1:
+                    end = cut
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= length:
+            break
+        next_start = max(end - chunk_overlap, start + 1)
+        if chunk_overlap:
+            boundary = text.find(" ", next_start, end)
+            if boundary != -1:
+                next_start = boundary + 1
+        start = next_start
+    return chunks
+
+
+def combine_text_data(text_data):
+    """
+    Combines text data of any supported shape into a single string.
+
+    Args:
+        text_data (str, list of str or iterable of PageRecord): A single string is used as is.
+            Lists of strings and page records are joined with blank lines between items.
+
+    Returns:
+        str: The combined text.
+    """
+    if isinstance(text_data, str):
+        return text_data
+    return "\n\n".join(item.text if hasattr(item, "text") else item for item in text_data)
+
+
+@traced(attributes=chunking_attributes)
+def chunk_text(text_data, chunk_size, chunk_overlap, splitter="fast"):
     """
-    Chunks the given text data into smaller segments using RecursiveCharacterTextSplitter.
+    Chunks the given text data into smaller segments.
 
     Args:
-        text_data (list of str): The text data to be chunked.
+        text_data (str, list of str or iterable of PageRecord): The text data to be chunked.
         chunk_size (int): The maximum size of each chunk.
         chunk_overlap (int): The overlap size between consecutive chunks.
+        splitter (str): 'fast' for the single-pass `fast_split_text`, or 'recursive' for RecursiveCharacterTextSplitter.
 
     Returns:
         list of Document: A list of Document objects containing the chunked text.
@@ -51,8 +120,11 @@ def chunk_text(text_data, chunk_size, chunk_overlap):
         Exception: If there is an unexpected error during the chunking process.
     """
     try:
-        combined_text = "\n\n".join(text_data)  # Join the list of strings into a single string
-        chunks = split_text(combined_text, chunk_size, chunk_overlap)
+        combined_text = combine_text_data(text_data)
+        if splitter == "recursive":
+            chunks = split_text(combined_text, chunk_size, chunk_overlap)
+        else:
+            chunks = fast_split_text(combined_text, chunk_size, chunk_overlap)
         documents = [Document(page_content=chunk) for chunk in chunks]
         return documents
     except ValueError as ve:
@@ -0,0 +1,64 @@
+from langchain.schema import Document
+from utils.processing.split_and_chunk_text import fast_split_text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+def _split_buffer(buffer, chunk_size, chunk_overlap):
+    """Splits the buffered text and returns the chunks together with the start offset of the last chunk."""
+    text = "".join(buffer)
+    chunks = fast_split_text(text, chunk_size, chunk_overlap)
+    if not chunks:
+        return [], ""
+    last_start = text.rfind(chunks[-1])
+    return chunks, text[last_start:] if last_start >= 0 else chunks[-1]
+
+def stream_chunk_pages(page_records, chunk_size, chunk_overlap, lookahead_chunks=4):
+    """
+    Chunks a stream of page records into Documents while holding only a bounded window of text.
+
+    Pages are buffered until about `lookahead_chunks` chunks worth of text is available. The buffer
+    is then split, every chunk except the last is yielded, and the last chunk is kept as the start
+    of the next window so chunk boundaries and overlaps match a split of the whole text.
+    Chunks never span two source files.
+
+    Args:
+        page_records (iterable of PageRecord): Pages in reading order.
+        chunk_size (int): The maximum size of each chunk.
+        chunk_overlap (int): The overlap size between consecutive chunks.
+        lookahead_chunks (int): Number of chunks of text buffered before splitting.
+
+    Yields:
+        Document: The chunked text, with the source file in its metadata.
+    """
+    window = chunk_size * lookahead_chunks
+    buffer = []
+    buffered = 0
+    source = None
+    chunk_count = 0
+
+    for record in page_records:
+        if source is not None and record.source != source:
+            for chunk in fast_split_text("".join(buffer), chunk_size, chunk_overlap):
+                chunk_count += 1
+                yield Document(page_content=chunk, metadata={"source": source})
+            buffer, buffered = [], 0
+        source = record.source
+
+        if buffer:
+            buffer.append("\n\n")
+        buffer.append(record.text)
+        buffered += len(record.text) + 2
+
+        if buffered >= window:
+            chunks, remainder = _split_buffer(buffer, chunk_size, chunk_overlap)
+            for chunk in chunks[:-1]:
+                chunk_count += 1
+                yield Document(page_content=chunk, metadata={"source": source})
+            buffer, buffered = [remainder], len(remainder)
+
+    if buffer:
+        for chunk in fast_split_text("".join(buffer), chunk_size, chunk_overlap):
+            chunk_count += 1
+            yield Document(page_content=chunk, metadata={"source": source})
+    logging.info(f"Streamed text into {chunk_count} documents.")
@@ -0,0 +1,158 @@
+import re
+import math
+import logging
+from collections import Counter
+
+from utils.extraction.page_record import PageRecord, records_from_text, format_page
+
+logging.basicConfig(level=logging.INFO)
+
+DIGITS_PATTERN = re.compile(r'\d+')
+SPACES_PATTERN = re.compile(r'\s+')
+# A normalised line made only of numbers and punctuation, such as '#', '- # -' or '#,###'
+NUMBER_LINE_PATTERN = re.compile(r'[\W#_]*#[\W#_]*')
+
+def normalize_line(line):
+    """Normalises a line for comparison across pages, so that 'Page 12 of 300' and 'Page 13 of 300' match."""
+    return SPACES_PATTERN.sub(' ', DIGITS_PATTERN.sub('#', line.strip().lower()))
+
+def line_key(line, page_index):
+    """
+    Returns the key under which a line is matched across pages.
+
+    Lines with text match on their normalised form. A line with only numbers, such as a page number
+    or a table cell, only matches lines whose first number has the same offset from the page index,
+    so page numbers match while figures in the last lines of pages do not.
+
+    Args:
+        line (str): The line.
+        page_index (int): 0-based index of the page within its document.
+
+    Returns:
+        str or tuple: The key of the line.
+    """
+    normalized = normalize_line(line)
+    if NUMBER_LINE_PATTERN.fullmatch(normalized):
+        return normalized, int(DIGITS_PATTERN.search(line).group()) - page_index
+    return normalized
+
+def _zone_indices(lines, zone_lines):
+    """Returns the indices of the top and bottom zones of a page.
+
+    Each zone holds at most `zone_lines` non-empty lines and at most a third of the page, so the
+    zones never overlap and the middle of a short page is never treated as a header or footer.
+    """
+    non_empty = [index for index, line in enumerate(lines) if line.strip()]
+    if len(non_empty) < 2:
+        return [], []
+    size = min(zone_lines, max(1, len(non_empty) // 3))
+    return non_empty[:size], non_empty[-size:]
+
+def learn_running_lines(page_texts, zone_lines=3, min_fraction=0.5, min_pages=3):
+    """
+    Learns which lines recur at the top and bottom of a document's pages.
+
+    Args:
+        page_texts (list of str): The text of each page of one document.
+        zone_lines (int): Number of non-empty lines at the top and bottom of each page that are checked.
+        min_fraction (float): Fraction of pages a line must appear on to count as a running header or footer.
+        min_pages (int): Documents with fewer pages are left unchanged.
+
+    Returns:
+        tuple: The sets of header and footer line keys (see `line_key`).
+    """
+    if len(page_texts) < min_pages:
+        return set(), set()
+
+    top_counts = Counter()
+    bottom_counts = Counter()
+    for page_index, text in enumerate(page_texts):
+        lines = text.split('\n')
+        top, bottom = _zone_indices(lines, zone_lines)
+        top_counts.update({line_key(lines[index], page_index) for index in top})
+        bottom_counts.update({line_key(lines[index], page_index) for index in bottom})
+
+    required = max(2, math.ceil(min_fraction * len(page_texts)))
+    headers = {line for line, count in top_counts.items() if count >= required}
+    footers = {line for line, count in bottom_counts.items() if count >= required}
+    return headers, footers
+
+def strip_running_headers(page_texts, zone_lines=3, min_fraction=0.5, min_pages=3):
+    """
+    Removes running headers, footers and page numbers from the pages of one document.
+
+    Lines are only removed from the top and bottom zones of each page, so body text that happens
+    to repeat is kept. Runs in time linear in the size of the document.
+
+    Args:
+        page_texts (list of str): The text of each page of one document.
+        zone_lines (int): Number of non-empty lines at the top and bottom of each page that are checked.
+        min_fraction (float): Fraction of pages a line must appear on to count as a running header or footer.
+        min_pages (int): Documents with fewer pages are left unchanged.
+
+    Returns:
+        list of str: The cleaned text of each page.
+    """
+    headers, footers = learn_running_lines(page_texts, zone_lines, min_fraction, min_pages)
+    if not headers and not footers:
+        return list(page_texts)
+
+    cleaned_pages = []
+    removed = 0
+    for page_index, text in enumerate(page_texts):
+        lines = text.split('\n')
+        top, bottom = _zone_indices(lines, zone_lines)
+        drop = {index for index in top if line_key(lines[index], page_index) in headers}
+        drop.update(index for index in bottom if line_key(lines[index], page_index) in footers)
+        removed += len(drop)
+        cleaned_pages.append('\n'.join(line for index, line in enumerate(lines) if index not in drop))
+    logging.info(f"Removed {removed} running header and footer lines from {len(page_texts)} pages.")
+    return cleaned_pages
+
+def strip_running_headers_from_text(text, zone_lines=3, min_fraction=0.5, min_pages=3):
+    """
+    Removes running headers and footers from the output of the PyMuPDF or hybrid extractor.
+
+    Args:
+        text (str): Text of one document with the 'Page N' markers written by the extractor.
+        zone_lines (int): Number of non-empty lines at the top and bottom of each page that are checked.
+        min_fraction (float): Fraction of pages a line must appear on to count as a running header or footer.
+        min_pages (int): Documents with fewer pages are left unchanged.
+
+    Returns:
+        str: The cleaned text, with the 'Page N' markers kept.
+    """
+    records = records_from_text(text)
+    if len(records) == 1:
+        return text
+    cleaned = strip_running_headers([record.text for record in records], zone_lines, min_fraction, min_pages)
+    return "".join(format_page(record._replace(text=page_text)) for record, page_text in zip(records, cleaned))
+
+def iter_stripped_pages(page_records, zone_lines=3, min_fraction=0.5, min_pages=3):
+    """
+    Removes running headers and footers from a stream of page records.
+
+    The pages of one source file are buffered, cleaned together and yielded before the next file is read.
+
+    Args:
+        page_records (iterable of PageRecord): Pages in reading order.
+        zone_lines (int): Number of non-empty lines at the top and bottom of each page that are checked.
+        min_fraction (float): Fraction of pages a line must appear on to count as a running header or footer.
+        min_pages (int): Documents with fewer pages are left unchanged.
+
+    Yields:
+        PageRecord: The cleaned page records.
+    """
+    document = []
+    for record in page_records:
+        if document and record.source != document[0].source:
+            yield from _strip_document(document, zone_lines, min_fraction, min_pages)
+            document = []
+        document.append(record)
+    if document:
+        yield from _strip_document(document, zone_lines, min_fraction, min_pages)
+
+def _strip_document(records, zone_lines, min_fraction, min_pages):
+    cleaned = strip_running_headers([record.text for record in records], zone_lines, min_fraction, min_pages)
+    for record, text in zip(records, cleaned):
+        yield PageRecord(record.source, record.page_number, text)
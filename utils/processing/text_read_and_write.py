@@ -1,4 +1,5 @@
 from utils.processing.split_and_chunk_text import chunk_text
+from utils.extraction.page_record import format_page
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -24,6 +25,32 @@ def save_text_to_file(text, file_path):
 
 
 
+def tee_pages_to_file(page_records, file_path):
+    """
+    Writes page records to a file as they pass through, without collecting them in memory.
+
+    Args:
+        page_records (iterable of PageRecord): The pages to save.
+        file_path (str): The path to the file where the text will be saved.
+
+    Yields:
+        PageRecord: The same page records, unchanged.
+
+    Raises:
+        IOError: If there is an error saving the text to the file.
+    """
+    try:
+        with open(file_path, 'w', encoding='utf-8') as file:
+            for record in page_records:
+                file.write(format_page(record))
+                yield record
+        logging.info(f"Text successfully saved to {file_path}.")
+    except IOError as e:
+        logging.error(f"Error saving text to file: {e}")
+        raise
+
+
+
 def load_text_from_file(file_path):
     """
     Loads text data from a file, splitting it by double newline separation.
@@ -0,0 +1,154 @@
+import re
+import logging
+from functools import lru_cache
+
+import tiktoken
+from langchain.schema import Document
+
+from utils.extraction.page_record import records_from_text
+from utils.processing.split_and_chunk_text import combine_text_data
+from utils.telemetry.tracing import traced, chunking_attributes
+
+logging.basicConfig(level=logging.INFO)
+
+PARAGRAPH_PATTERN = re.compile(r'\n\s*\n')
+# "\n\n" is a single token in the OpenAI encodings
+SEPARATOR_TOKENS = 1
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name="cl100k_base"):
+    """Returns a tiktoken encoding, loading it only once."""
+    return tiktoken.get_encoding(encoding_name)
+
+@lru_cache(maxsize=65536)
+def count_tokens(text, encoding_name="cl100k_base"):
+    """Counts the tokens in a piece of text. Results are cached, so repeated paragraphs are only encoded once."""
+    return len(get_encoding(encoding_name).encode(text, disallowed_special=()))
+
+def _iter_units(text, max_tokens, encoding_name):
+    """Splits page text into packing units of (text, tokens, separator) that each fit the budget.
+
+    Units are paragraphs. Paragraphs over the budget are split into lines, and lines over the
+    budget into token windows. The separator is the text that joined the unit to the previous one.
+    """
+    for paragraph in PARAGRAPH_PATTERN.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph, encoding_name)
+        if tokens <= max_tokens:
+            yield paragraph, tokens, "\n\n"
+            continue
+        separator = "\n\n"
+        for line in paragraph.split("\n"):
+            line = line.strip()
+            if not line:
+                continue
+            line_tokens = count_tokens(line, encoding_name)
+            if line_tokens <= max_tokens:
+                yield line, line_tokens, separator
+            else:
+                encoding = get_encoding(encoding_name)
+                encoded = encoding.encode(line, disallowed_special=())
+                for start in range(0, len(encoded), max_tokens):
+                    window = encoded[start:start + max_tokens]
+                    yield encoding.decode(window), len(window), separator if start == 0 else ""
+            separator = "\n"
+
+def _make_document(items, source):
+    parts = [items[0][0]]
+    for text, _, _, separator in items[1:]:
+        parts.append(separator)
+        parts.append(text)
+    return Document(
+        page_content="".join(parts),
+        metadata={"source": source, "page_start": items[0][2], "page_end": items[-1][2]},
+    )
+
+def iter_token_chunks(page_records, max_tokens=800, overlap_tokens=100, encoding_name="cl100k_base", page_break_fill=0.8):
+    """
+    Packs a stream of page records into Documents of at most `max_tokens` tokens.
+
+    Chunks are built from whole paragraphs (or lines, for paragraphs over the budget) and never span
+    two source files. When a new page starts and the current chunk is already `page_break_fill` full,
+    the chunk is closed at the page boundary. Each chunk starts with the trailing paragraphs of the
+    previous one, up to `overlap_tokens`. Every paragraph is encoded once and the running chunk size
+    is kept incrementally.
+
+    Args:
+        page_records (iterable of PageRecord): Pages in reading order.
+        max_tokens (int): The maximum number of tokens in each chunk.
+        overlap_tokens (int): The maximum number of tokens repeated from the previous chunk.
+        encoding_name (str): The tiktoken encoding used to count tokens.
+        page_break_fill (float): Fraction of the budget above which a chunk is closed at a page boundary.
+
+    Yields:
+        Document: The chunked text with `source`, `page_start` and `page_end` metadata.
+
+    Raises:
+        ValueError: If the overlap is not smaller than the token budget.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError(f"Overlap tokens ({overlap_tokens}) must be smaller than max tokens ({max_tokens}).")
+
+    items = []  # (text, tokens, page_number, separator) of the units in the current chunk
+    used = 0
+    source = None
+
+    def carry_overlap():
+        carried, carried_tokens = [], 0
+        for item in reversed(items):
+            if carried_tokens + item[1] + SEPARATOR_TOKENS > overlap_tokens:
+                break
+            carried.insert(0, item)
+            carried_tokens += item[1] + SEPARATOR_TOKENS
+        return carried, carried_tokens
+
+    for record in page_records:
+        if items and record.source != source:
+            yield _make_document(items, source)
+            items, used = [], 0
+        elif items and used >= page_break_fill * max_tokens:
+            yield _make_document(items, source)
+            items, used = carry_overlap()
+        source = record.source
+
+        for text, tokens, separator in _iter_units(record.text, max_tokens, encoding_name):
+            if items and used + SEPARATOR_TOKENS + tokens > max_tokens:
+                yield _make_document(items, source)
+                items, used = carry_overlap()
+                if items and used + SEPARATOR_TOKENS + tokens > max_tokens:
+                    items, used = [], 0
+            used += tokens + (SEPARATOR_TOKENS if items else 0)
+            items.append((text, tokens, record.page_number, separator))
+
+    if items:
+        yield _make_document(items, source)
+
+@traced(attributes=chunking_attributes)
+def token_chunk_text(text_data, max_tokens=800, overlap_tokens=100, encoding_name="cl100k_base"):
+    """
+    Chunks text data to a token budget, keeping page metadata.
+
+    Args:
+        text_data (str, list of str or iterable of PageRecord): The text data to be chunked. Strings and
+            lists of strings are split into pages at the 'Page N' markers written by the PyMuPDF extractor.
+        max_tokens (int): The maximum number of tokens in each chunk.
+        overlap_tokens (int): The maximum number of tokens repeated from the previous chunk.
+        encoding_name (str): The tiktoken encoding used to count tokens.
+
+    Returns:
+        list of Document: The chunked text with `source`, `page_start` and `page_end` metadata.
+    """
+    try:
+        if isinstance(text_data, str) or (isinstance(text_data, list) and text_data and isinstance(text_data[0], str)):
+            text_data = records_from_text(combine_text_data(text_data))
+        documents = list(iter_token_chunks(text_data, max_tokens, overlap_tokens, encoding_name))
+        logging.info(f"Text processed into {len(documents)} token-budgeted documents.")
+        return documents
+    except ValueError as ve:
+        logging.error(f"ValueError in chunking text by tokens: {ve}")
+        return []
+    except Exception as e:
+        logging.error(f"Unexpected error in chunking text by tokens: {e}")
+        return []
@@ -0,0 +1,211 @@
+import os
+import re
+import json
+import shutil
+import logging
+from collections import Counter
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.retrievers import BaseRetriever
+
+logging.basicConfig(level=logging.INFO)
+
+BM25_DIRECTORY = "bm25"
+
+# Keeps numbers like 2023, 3.5 and 10-K together with the words around them
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-'][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were which will with".split()
+)
+
+def tokenize(text):
+    """Splits text into lowercase terms for the keyword index."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def bm25_index_directory(document_db_directory):
+    """Returns the folder of the keyword index that belongs to a Knowledge Base."""
+    return os.path.join(document_db_directory, BM25_DIRECTORY)
+
+def build_bm25_index(directory, ids, texts, metadatas=None, k1=1.5, b=0.75):
+    """
+    Builds a BM25 inverted index and writes it to `directory`, replacing any index stored there.
+
+    Each posting stores the document's full BM25 term weight, so a query only sums the postings of
+    its terms.
+
+    Args:
+        directory (str): Folder of the index.
+        ids (list of str): Stable chunk IDs. Repeated IDs are indexed once.
+        texts (list of str): Chunk texts.
+        metadatas (list of dict): Optional metadata per chunk.
+        k1 (float): BM25 term frequency saturation.
+        b (float): BM25 length normalisation.
+
+    Returns:
+        int: The number of indexed chunks.
+    """
+    metadatas = metadatas or [{}] * len(texts)
+    seen = set()
+    keep = []
+    for index, id_ in enumerate(ids):
+        if id_ not in seen:
+            seen.add(id_)
+            keep.append(index)
+
+    vocabulary = {}
+    term_postings = []
+    lengths = np.zeros(len(keep), dtype=np.float32)
+    for document_number, index in enumerate(keep):
+        counts = Counter(tokenize(texts[index]))
+        lengths[document_number] = sum(counts.values())
+        for term, count in counts.items():
+            term_id = vocabulary.setdefault(term, len(vocabulary))
+            if term_id == len(term_postings):
+                term_postings.append([])
+            term_postings[term_id].append((document_number, count))
+
+    average_length = float(lengths.mean()) if len(keep) else 0.0
+    indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(postings) for postings in term_postings])
+    postings = np.empty(indptr[-1], dtype=np.int32)
+    weights = np.empty(indptr[-1], dtype=np.float32)
+    for term_id, term_list in enumerate(term_postings):
+        start, end = indptr[term_id], indptr[term_id + 1]
+        documents = np.fromiter((document for document, _ in term_list), dtype=np.int32, count=len(term_list))
+        frequencies = np.fromiter((count for _, count in term_list), dtype=np.float32, count=len(term_list))
+        idf = np.log(1.0 + (len(keep) - len(term_list) + 0.5) / (len(term_list) + 0.5))
+        norm = k1 * (1.0 - b + b * lengths[documents] / max(average_length, 1e-9))
+        postings[start:end] = documents
+        weights[start:end] = idf * frequencies * (k1 + 1.0) / (frequencies + norm)
+
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+    np.save(os.path.join(directory, "indptr.npy"), indptr)
+    np.save(os.path.join(directory, "postings.npy"), postings)
+    np.save(os.path.join(directory, "weights.npy"), weights)
+    lines = [
+        (json.dumps({"id": ids[i], "text": texts[i], "metadata": metadatas[i] or {}}, ensure_ascii=False) + "\n").encode('utf-8')
+        for i in keep
+    ]
+    with open(os.path.join(directory, "documents.jsonl"), 'wb') as file:
+        file.write(b"".join(lines))
+    offsets = np.zeros(len(lines), dtype=np.int64)
+    if lines:
+        offsets[1:] = np.cumsum([len(line) for line in lines[:-1]])
+    np.save(os.path.join(directory, "offsets.npy"), offsets)
+    with open(os.path.join(directory, "vocabulary.json"), 'w', encoding='utf-8') as file:
+        json.dump(vocabulary, file, ensure_ascii=False)
+
+    logging.info(f"Built keyword index of {len(keep)} chunks and {len(vocabulary)} terms in {directory}.")
+    return len(keep)
+
+def read_bm25_documents(directory):
+    """Reads the IDs, texts and metadata stored in an index, e.g. to rebuild it with new chunks."""
+    ids, texts, metadatas = [], [], []
+    path = os.path.join(directory, "documents.jsonl")
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                record = json.loads(line)
+                ids.append(record["id"])
+                texts.append(record["text"])
+                metadatas.append(record["metadata"])
+    return ids, texts, metadatas
+
+def store_bm25_index(document_db_directory, ids, texts, metadatas=None, append=False):
+    """
+    Builds the keyword index of a Knowledge Base next to its vectors.
+
+    Args:
+        document_db_directory (str): The Knowledge Base directory.
+        ids (list of str): Stable chunk IDs.
+        texts (list of str): Chunk texts.
+        metadatas (list of dict): Optional metadata per chunk.
+        append (bool): Whether to keep the chunks that are already indexed.
+
+    Returns:
+        int: The number of indexed chunks.
+    """
+    directory = bm25_index_directory(document_db_directory)
+    metadatas = list(metadatas) if metadatas else [{}] * len(texts)
+    if append:
+        old_ids, old_texts, old_metadatas = read_bm25_documents(directory)
+        ids, texts, metadatas = old_ids + list(ids), old_texts + list(texts), old_metadatas + metadatas
+    return build_bm25_index(directory, ids, texts, metadatas)
+
+class BM25Index:
+    """Read-only view of a BM25 index on disk. Nothing is read until the first search."""
+
+    def __init__(self, directory):
+        """
+        Args:
+            directory (str): Folder of the index.
+        """
+        self.directory = directory
+        self._vocabulary = None
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.directory, "vocabulary.json"))
+
+    def _load(self):
+        if self._vocabulary is not None:
+            return
+        with open(os.path.join(self.directory, "vocabulary.json"), 'r', encoding='utf-8') as file:
+            vocabulary = json.load(file)
+        self._indptr = np.load(os.path.join(self.directory, "indptr.npy"), mmap_mode='r')
+        self._postings = np.load(os.path.join(self.directory, "postings.npy"), mmap_mode='r')
+        self._weights = np.load(os.path.join(self.directory, "weights.npy"), mmap_mode='r')
+        self._offsets = np.load(os.path.join(self.directory, "offsets.npy"), mmap_mode='r')
+        self._vocabulary = vocabulary
+
+    def search(self, query, k=4):
+        """
+        Returns the top-k chunks for a query by BM25 score.
+
+        Args:
+            query (str): The query text.
+            k (int): Number of results.
+
+        Returns:
+            tuple: Arrays of document numbers and scores, best first. Chunks without any query term are not returned.
+        """
+        self._load()
+        scores = np.zeros(len(self._offsets), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self._vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self._indptr[term_id], self._indptr[term_id + 1]
+            # A term has at most one posting per document, so the fancy-indexed add is safe
+            scores[self._postings[start:end]] += self._weights[start:end]
+        matches = np.flatnonzero(scores)
+        if len(matches) > k:
+            matches = matches[np.argpartition(-scores[matches], k - 1)[:k]]
+        matches = matches[np.argsort(-scores[matches])]
+        return matches, scores[matches]
+
+    def get_documents(self, document_numbers):
+        """Reads the given chunks from the index's document file."""
+        self._load()
+        documents = []
+        with open(os.path.join(self.directory, "documents.jsonl"), 'rb') as file:
+            for number in document_numbers:
+                file.seek(int(self._offsets[number]))
+                record = json.loads(file.readline())
+                documents.append(Document(page_content=record["text"], metadata=record["metadata"]))
+        return documents
+
+class BM25IndexRetriever(BaseRetriever):
+    """LangChain retriever over a persisted BM25 index."""
+
+    index: BM25Index
+    k: int = 4
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        document_numbers, _ = self.index.search(query, self.k)
+        return self.index.get_documents(document_numbers)
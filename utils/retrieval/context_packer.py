@@ -0,0 +1,142 @@
+import logging
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+from utils.processing.token_chunk_text import count_tokens
+from utils.embeddings.create_db_and_store_embedding import chunk_id
+from utils.embeddings.memmap_vector_store import MemmapVectorStore
+
+logging.basicConfig(level=logging.INFO)
+
+# create_stuff_documents_chain joins documents with this separator
+DOCUMENT_SEPARATOR = "\n\n"
+
+def mmr_order(query_vector, candidate_vectors, lambda_mult=0.5):
+    """
+    Orders candidates by maximal marginal relevance.
+
+    Each step picks the candidate with the best trade-off between similarity to the query and
+    dissimilarity to the candidates already picked, so near-duplicate chunks sink to the end.
+
+    Args:
+        query_vector (numpy.ndarray): The query embedding.
+        candidate_vectors (numpy.ndarray): One embedding per candidate, shape (n, dimension).
+        lambda_mult (float): 1 ranks by relevance only, 0 by diversity only.
+
+    Returns:
+        list of int: Every candidate index, in MMR order.
+    """
+    count = len(candidate_vectors)
+    if count == 0:
+        return []
+    vectors = candidate_vectors / np.maximum(np.linalg.norm(candidate_vectors, axis=1, keepdims=True), 1e-12)
+    query = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+    relevance = vectors @ query
+    # Highest similarity of each candidate to any picked candidate
+    redundancy = np.full(count, -np.inf, dtype=np.float32)
+    remaining = np.ones(count, dtype=bool)
+    order = []
+    for step in range(count):
+        if step == 0:
+            scores = relevance.copy()
+        else:
+            scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[~remaining] = -np.inf
+        best = int(np.argmax(scores))
+        order.append(best)
+        remaining[best] = False
+        redundancy = np.maximum(redundancy, vectors @ vectors[best])
+    return order
+
+def pack_documents(documents, token_budget, encoding_name="cl100k_base"):
+    """
+    Fills a token budget with documents, in the given order.
+
+    Documents that do not fit are skipped, so smaller ones further down the list can still use the
+    remaining space. The result is checked against the exact token count of the joined context.
+
+    Args:
+        documents (list of Document): Candidates in priority order.
+        token_budget (int): Maximum tokens of the joined page contents.
+        encoding_name (str): tiktoken encoding used for counting.
+
+    Returns:
+        list of Document: The packed documents, in priority order.
+    """
+    separator_tokens = count_tokens(DOCUMENT_SEPARATOR, encoding_name)
+    packed = []
+    used = 0
+    for document in documents:
+        tokens = count_tokens(document.page_content, encoding_name) + (separator_tokens if packed else 0)
+        if used + tokens <= token_budget:
+            packed.append(document)
+            used += tokens
+    # Tokens can merge across the separator, so confirm the budget on the joined text
+    while packed and count_tokens(DOCUMENT_SEPARATOR.join(d.page_content for d in packed), encoding_name) > token_budget:
+        packed.pop()
+    return packed
+
+def stored_vectors(vector_store, ids):
+    """
+    Reads the vectors stored at ingestion for the given chunk IDs.
+
+    Args:
+        vector_store (VectorStore): A Chroma or MemmapVectorStore Knowledge Base.
+        ids (list of str): Chunk IDs, as given by `chunk_id`.
+
+    Returns:
+        dict: float32 vector of each ID found in the store.
+    """
+    if isinstance(vector_store, MemmapVectorStore):
+        return vector_store.get_vectors_by_id(ids)
+    collection = getattr(vector_store, "_collection", None)
+    if collection is None:
+        return {}
+    result = collection.get(ids=list(set(ids)), include=["embeddings"])
+    return {id_: np.asarray(vector, dtype=np.float32) for id_, vector in zip(result["ids"], result["embeddings"])}
+
+class ContextPackingRetriever(BaseRetriever):
+    """Retriever that over-fetches candidates, reranks them with MMR and packs them into a token budget.
+
+    Candidate embeddings are read from the vector store, which holds the vectors computed at
+    ingestion, so reranking only embeds the query. Candidates missing from the store, e.g. in
+    Knowledge Bases written without chunk IDs, are embedded with the embedding function.
+    """
+
+    retriever: BaseRetriever  # Should return more candidates than fit the budget
+    embeddings: Embeddings
+    vector_store: Optional[VectorStore] = None  # Knowledge Base holding the candidates' vectors
+    token_budget: int = 3000
+    lambda_mult: float = 0.5
+    encoding_name: str = "cl100k_base"
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        candidates = []
+        seen = set()
+        for document in self.retriever.invoke(query, config={"callbacks": run_manager.get_child()} if run_manager else None):
+            if document.page_content not in seen:
+                seen.add(document.page_content)
+                candidates.append(document)
+        if not candidates:
+            return []
+
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        ids = [chunk_id(document) for document in candidates]
+        vectors = stored_vectors(self.vector_store, ids) if self.vector_store is not None else {}
+        missing = [index for index, id_ in enumerate(ids) if id_ not in vectors]
+        if missing:
+            logging.info(f"Embedding {len(missing)} candidate chunks that have no stored vector.")
+            for index, vector in zip(missing, self.embeddings.embed_documents([candidates[i].page_content for i in missing])):
+                vectors[ids[index]] = np.asarray(vector, dtype=np.float32)
+        candidate_vectors = np.stack([vectors[id_] for id_ in ids])
+        ranked = [candidates[i] for i in mmr_order(query_vector, candidate_vectors, self.lambda_mult)]
+        packed = pack_documents(ranked, self.token_budget, self.encoding_name)
+        logging.info(f"Packed {len(packed)} of {len(candidates)} candidate chunks into a {self.token_budget} token context.")
+        return packed
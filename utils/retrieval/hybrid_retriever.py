@@ -0,0 +1,57 @@
+import logging
+
+from langchain.retrievers import EnsembleRetriever
+
+from utils.retrieval.bm25_index import BM25Index, BM25IndexRetriever, bm25_index_directory
+from utils.retrieval.context_packer import ContextPackingRetriever
+
+logging.basicConfig(level=logging.INFO)
+
+# 'vector' uses similarity search only, 'hybrid' fuses it with the BM25 keyword index
+RETRIEVAL_MODES = ("vector", "hybrid")
+
+def create_retriever(document_db, document_db_directory, mode="vector", k=4, keyword_weight=0.5,
+                     context_token_budget=None, fetch_k=20):
+    """
+    Creates the retriever used for report generation.
+
+    In 'hybrid' mode the vector and BM25 results are merged with reciprocal rank fusion, so exact
+    terms such as segment names, tickers or fiscal years are found even when they are not close in
+    embedding space. Knowledge Bases built without a keyword index fall back to vector search.
+
+    With a `context_token_budget`, each retriever over-fetches `fetch_k` chunks, and the candidates
+    are reranked with maximal marginal relevance and packed into the budget instead of returning k.
+
+    Args:
+        document_db (VectorStore): The open vector store.
+        document_db_directory (str): The Knowledge Base directory.
+        mode (str): 'vector' or 'hybrid'.
+        k (int): Number of chunks each retriever returns.
+        keyword_weight (float): Weight of the BM25 ranking in the fusion, between 0 and 1.
+        context_token_budget (int): Maximum tokens of retrieved context. None returns the top k chunks.
+        fetch_k (int): Number of candidates each retriever returns when packing to a token budget.
+
+    Returns:
+        BaseRetriever: The retriever.
+
+    Raises:
+        ValueError: If the mode is unknown.
+    """
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unsupported retrieval mode: {mode}. Choose one of {RETRIEVAL_MODES}.")
+    if context_token_budget:
+        k = fetch_k
+    retriever = document_db.as_retriever(search_kwargs={"k": k})
+
+    if mode == "hybrid":
+        index = BM25Index(bm25_index_directory(document_db_directory))
+        if index.exists():
+            keyword_retriever = BM25IndexRetriever(index=index, k=k)
+            retriever = EnsembleRetriever(retrievers=[retriever, keyword_retriever], weights=[1.0 - keyword_weight, keyword_weight])
+        else:
+            logging.warning(f"No keyword index found in {document_db_directory}; using vector search only. Rebuild the Knowledge Base to enable hybrid retrieval.")
+
+    if context_token_budget:
+        retriever = ContextPackingRetriever(retriever=retriever, embeddings=document_db.embeddings, vector_store=document_db,
+                                            token_budget=context_token_budget)
+    return retriever
@@ -0,0 +1,136 @@
+import json
+import time
+import random
+import hashlib
+import argparse
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(level=logging.INFO)
+
+FAKE_EMBEDDING_DIMENSION = 1536
+
+def fake_embedding(text, dimension=FAKE_EMBEDDING_DIMENSION):
+    """Returns a deterministic unit vector for a text (or list of token ids)."""
+    seed = int.from_bytes(hashlib.sha256(json.dumps(text).encode('utf-8')).digest()[:8], "little")
+    generator = random.Random(seed)
+    vector = [generator.gauss(0.0, 1.0) for _ in range(dimension)]
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector]
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Answers /v1/chat/completions and /v1/embeddings like the OpenAI API, with injected latency and rate limiting."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with server.lock:
+            server.stats["requests"] += 1
+            rate_limited = random.random() < server.error_rate
+            if rate_limited:
+                server.stats["rate_limited"] += 1
+        time.sleep(server.latency)
+
+        if rate_limited:
+            self._send_json(429, {"error": {"message": "Rate limit reached (fake server).", "type": "requests",
+                                            "code": "rate_limit_exceeded"}},
+                            {"retry-after-ms": str(int(server.retry_after * 1000))})
+        elif self.path.endswith("/embeddings"):
+            inputs = body.get("input", [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            data = [{"object": "embedding", "index": i, "embedding": fake_embedding(item)} for i, item in enumerate(inputs)]
+            self._send_json(200, {"object": "list", "data": data, "model": body.get("model"),
+                                  "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+        elif self.path.endswith("/chat/completions"):
+            prompt = body.get("messages", [{}])[-1].get("content", "")
+            content = f"Fake response to a {len(prompt)} character prompt."
+            if body.get("stream"):
+                self._stream_chat(body, content)
+            else:
+                self._send_json(200, {"id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                                      "model": body.get("model"),
+                                      "choices": [{"index": 0, "finish_reason": "stop",
+                                                   "message": {"role": "assistant", "content": content}}],
+                                      "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def _stream_chat(self, body, content):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for word in content.split(" "):
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": body.get("model"),
+                     "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Local stand-in for the OpenAI API, for testing the request scheduler without network access or cost.
+
+    Point the clients at it with OPENAI_API_BASE=http://127.0.0.1:<port>/v1 and any OPENAI_API_KEY.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, error_rate=0.2, retry_after=0.5):
+        """
+        Args:
+            host (str): Interface to listen on.
+            port (int): Port to listen on, 0 for any free port.
+            latency (float): Seconds added to every response.
+            error_rate (float): Fraction of requests answered with 429.
+            retry_after (float): Seconds sent in the retry-after-ms header of a 429.
+        """
+        super().__init__((host, port), FakeOpenAIHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "rate_limited": 0}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        """Serves requests on a background thread and returns the server."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+def main():
+    """Command line entry point running the fake OpenAI server."""
+    parser = argparse.ArgumentParser(description="Run a local fake OpenAI API that injects latency and 429 responses.")
+    parser.add_argument("--port", type=int, default=8099, help="Port to listen on.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds added to every response.")
+    parser.add_argument("--error-rate", type=float, default=0.2, help="Fraction of requests answered with 429.")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="Seconds sent as retry-after with a 429.")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(port=args.port, latency=args.latency, error_rate=args.error_rate, retry_after=args.retry_after)
+    logging.info(f"Fake OpenAI API listening; set OPENAI_API_BASE={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info(f"Served {server.stats}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import os
+import logging
+import threading
+
+import httpx
+import openai
+from langchain_community.chat_models import ChatOpenAI
+from langchain_community.embeddings import OpenAIEmbeddings
+
+from utils.scheduler.request_scheduler import ScheduledTransport, AsyncScheduledTransport, get_request_scheduler
+
+logging.basicConfig(level=logging.INFO)
+
+# Long reports can take a while to generate
+OPENAI_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+
+_http_clients = {}
+_http_clients_lock = threading.Lock()
+
+_chat_models = {}
+_chat_models_lock = threading.Lock()
+
+def get_scheduled_http_clients():
+    """Returns the httpx clients shared by every OpenAI client, whose requests go through the shared scheduler.
+
+    Sharing one pair of clients keeps connections alive between calls of every model. The async
+    client keeps a separate connection pool for each event loop (see `AsyncScheduledTransport`),
+    so cached models can be used from any `asyncio.run` call or thread.
+
+    Returns:
+        tuple: (httpx.Client, httpx.AsyncClient).
+    """
+    scheduler = get_request_scheduler()
+    with _http_clients_lock:
+        if _http_clients.get("scheduler") is not scheduler:
+            _http_clients["sync"] = httpx.Client(transport=ScheduledTransport(scheduler), timeout=OPENAI_TIMEOUT)
+            _http_clients["async"] = httpx.AsyncClient(transport=AsyncScheduledTransport(scheduler), timeout=OPENAI_TIMEOUT)
+            _http_clients["scheduler"] = scheduler
+        return _http_clients["sync"], _http_clients["async"]
+
+def create_openai_clients():
+    """Creates OpenAI clients that leave rate limiting and retries to the shared scheduler.
+
+    The API key comes from OPENAI_API_KEY and the base URL from OPENAI_API_BASE or OPENAI_BASE_URL.
+
+    Returns:
+        tuple: (openai.OpenAI, openai.AsyncOpenAI).
+    """
+    http_client, async_http_client = get_scheduled_http_clients()
+    # The scheduler retries, so the SDK's own retries are turned off
+    base_url = os.environ.get("OPENAI_API_BASE") or os.environ.get("OPENAI_BASE_URL") or None
+    return (openai.OpenAI(base_url=base_url, http_client=http_client, max_retries=0),
+            openai.AsyncOpenAI(base_url=base_url, http_client=async_http_client, max_retries=0))
+
+def create_chat_model(**kwargs) -> ChatOpenAI:
+    """Returns a ChatOpenAI model whose requests go through the shared scheduler.
+
+    Models are stateless, so one instance per set of arguments is reused by every caller in the
+    process instead of building new clients for each call.
+
+    Args:
+        **kwargs: Keyword arguments of ChatOpenAI, e.g. model, temperature and cache.
+
+    Returns:
+        ChatOpenAI: The chat model.
+    """
+    try:
+        key = (get_request_scheduler(), tuple(sorted(kwargs.items())))
+        hash(key)
+    except TypeError:
+        key = None
+    with _chat_models_lock:
+        if key is None or key not in _chat_models:
+            client, async_client = create_openai_clients()
+            llm = ChatOpenAI(client=client.chat.completions, async_client=async_client.chat.completions, max_retries=0, **kwargs)
+            if key is None:
+                return llm
+            _chat_models[key] = llm
+        return _chat_models[key]
+
+def create_openai_embeddings(**kwargs) -> OpenAIEmbeddings:
+    """Creates an OpenAIEmbeddings function whose requests go through the shared scheduler.
+
+    Args:
+        **kwargs: Keyword arguments of OpenAIEmbeddings.
+
+    Returns:
+        OpenAIEmbeddings: The embedding function.
+    """
+    client, async_client = create_openai_clients()
+    return OpenAIEmbeddings(client=client.embeddings, async_client=async_client.embeddings, max_retries=0, **kwargs)
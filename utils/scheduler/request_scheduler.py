@@ -0,0 +1,392 @@
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+
+import httpx
+from tenacity import Retrying, AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+from utils.telemetry.tracing import record_span
+
+logging.basicConfig(level=logging.INFO)
+
+# Defaults for a gpt-4o-mini / text-embedding-ada-002 account; raise them to match your OpenAI usage tier
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_TOKENS_PER_MINUTE = 200000
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_MAX_ATTEMPTS = 6
+
+# Responses that are worth retrying: rate limits, timeouts and server errors
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+# Completion tokens assumed for a chat request that does not set max_tokens
+DEFAULT_COMPLETION_TOKENS = 1000
+
+_request_scheduler = None
+_request_scheduler_lock = threading.Lock()
+
+class TokenBucket:
+    """Thread-safe token bucket. Reservations are granted immediately and return how long to wait.
+
+    Because waiting happens outside the lock, the same bucket serves threads (time.sleep) and
+    asyncio tasks (asyncio.sleep).
+    """
+
+    def __init__(self, rate_per_minute):
+        """
+        Args:
+            rate_per_minute (float): Refill rate, which is also the bucket capacity.
+        """
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        """
+        Takes `amount` from the bucket, letting the level go negative.
+
+        Args:
+            amount (float): Requests or tokens to take. Amounts above the capacity are capped.
+
+        Returns:
+            float: Seconds to wait before the reservation is covered.
+        """
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+            self._updated = now
+            self._level -= amount
+            return max(0.0, -self._level / self.rate)
+
+    def pause(self, seconds):
+        """Empties the bucket for `seconds`, e.g. when the server asks to retry later."""
+        with self._lock:
+            self._level = min(self._level, -seconds * self.rate)
+            self._updated = time.monotonic()
+
+class AdaptiveConcurrencyLimiter:
+    """Concurrency limit that halves on rate limiting and grows by one after a window of successes (AIMD)."""
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, min_concurrency=1):
+        """
+        Args:
+            max_concurrency (int): Upper bound of the limit, which is also the starting limit.
+            min_concurrency (int): Lower bound of the limit.
+        """
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = max_concurrency
+        self.in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def try_acquire(self):
+        with self._condition:
+            if self.in_flight < self.limit:
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    async def aacquire(self):
+        # Polling keeps the event loop free without needing a second, asyncio-only limiter
+        while not self.try_acquire():
+            await asyncio.sleep(0.01)
+
+    def release(self, rate_limited=False):
+        """Frees a slot and adapts the limit to the outcome of the request."""
+        with self._condition:
+            self.in_flight -= 1
+            if rate_limited:
+                self.limit = max(self.min_concurrency, self.limit // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+class RetryableResponse(Exception):
+    """Raised inside the retry loop for a response that should be retried."""
+
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code}")
+        self.response = response
+
+def retry_after_seconds(response):
+    """Returns the delay requested by the server's retry-after-ms or retry-after header, or None."""
+    value = response.headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = response.headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return None
+
+class wait_retry_after_or_exponential:
+    """tenacity wait strategy: the server's retry-after when given, otherwise jittered exponential backoff."""
+
+    def __init__(self, multiplier=0.5, max_wait=60.0):
+        self.exponential = wait_random_exponential(multiplier=multiplier, max=max_wait)
+        self.max_wait = max_wait
+
+    def __call__(self, retry_state):
+        error = retry_state.outcome.exception()
+        if isinstance(error, RetryableResponse):
+            delay = retry_after_seconds(error.response)
+            if delay is not None:
+                # A little jitter keeps clients that were told the same time from retrying together
+                return min(self.max_wait, delay + random.uniform(0, 0.25))
+        return self.exponential(retry_state)
+
+def estimate_request_tokens(request):
+    """Estimates the tokens an OpenAI request will use from its JSON body (about 4 characters per token)."""
+    try:
+        body = json.loads(request.content or b"{}")
+    except (ValueError, UnicodeDecodeError):
+        return 1
+    tokens = 0
+    inputs = body.get("input")
+    if isinstance(inputs, str):
+        tokens += len(inputs) // 4
+    elif isinstance(inputs, list):
+        for item in inputs:
+            # Embedding inputs are either strings or lists of token ids
+            tokens += len(item) if isinstance(item, list) else len(str(item)) // 4
+    for message in body.get("messages", []):
+        tokens += len(str(message.get("content", ""))) // 4 + 4
+    if "messages" in body:
+        tokens += body.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+    return max(1, tokens)
+
+class RequestScheduler:
+    """Shared scheduler for every model request: rate limits, adaptive concurrency and retries.
+
+    Requests first reserve one request and their estimated tokens from the per-minute buckets,
+    then wait for a concurrency slot. Rate-limited and failed requests are retried with tenacity,
+    waiting for the server's retry-after when it is given and with jittered exponential backoff
+    otherwise. A 429 also pauses the buckets and halves the concurrency limit for all callers.
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        Args:
+            requests_per_minute (int): Request rate limit.
+            tokens_per_minute (int): Token rate limit.
+            max_concurrency (int): Maximum number of requests in flight.
+            max_attempts (int): Attempts per request, including the first one.
+        """
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = AdaptiveConcurrencyLimiter(max_concurrency)
+        self.max_attempts = max_attempts
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "attempts": 0, "rate_limited": 0, "retries": 0, "failures": 0}
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for name, value in increments.items():
+                self._stats[name] += value
+
+    def stats(self):
+        """Returns request, attempt, rate-limit, retry and failure counts, and the current concurrency limit."""
+        with self._stats_lock:
+            return {**self._stats, "concurrency_limit": self.concurrency.limit}
+
+    def _retrying_options(self):
+        return {
+            "retry": retry_if_exception_type((RetryableResponse, httpx.TransportError)),
+            "stop": stop_after_attempt(self.max_attempts),
+            "wait": wait_retry_after_or_exponential(),
+            "before_sleep": self._before_sleep,
+            "reraise": True,
+        }
+
+    def _before_sleep(self, retry_state):
+        self._count(retries=1)
+        error = retry_state.outcome.exception()
+        logging.warning(f"Model request failed ({error}); retrying in {retry_state.next_action.sleep:.1f}s "
+                        f"(attempt {retry_state.attempt_number + 1} of {self.max_attempts}).")
+
+    def _check(self, response):
+        """Updates limits from a response and raises RetryableResponse if it should be retried."""
+        if response.status_code == 429:
+            self._count(rate_limited=1)
+            delay = retry_after_seconds(response)
+            if delay:
+                self.requests.pause(delay)
+                self.tokens.pause(delay)
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            raise RetryableResponse(response)
+
+    def send(self, request, send):
+        """
+        Sends a request through the scheduler, blocking the calling thread while it waits.
+
+        Args:
+            request (httpx.Request): The request.
+            send (callable): Sends the request once and returns the httpx.Response.
+
+        Returns:
+            httpx.Response: The final response. A response that is still rate limited after the last attempt is returned as is.
+        """
+        self._count(requests=1)
+        estimated = estimate_request_tokens(request)
+        try:
+            for attempt in Retrying(**self._retrying_options()):
+                with attempt:
+                    time.sleep(max(self.requests.reserve(1), self.tokens.reserve(estimated)))
+                    self.concurrency.acquire()
+                    response = None
+                    try:
+                        self._count(attempts=1)
+                        response = send(request)
+                        self._check(response)
+                    except RetryableResponse:
+                        response.read()
+                        response.close()
+                        raise
+                    finally:
+                        self.concurrency.release(rate_limited=response is not None and response.status_code == 429)
+            return response
+        except RetryableResponse as e:
+            self._count(failures=1)
+            return e.response
+
+    async def asend(self, request, send):
+        """Async version of `send`, where `send` is a coroutine function."""
+        self._count(requests=1)
+        estimated = estimate_request_tokens(request)
+        try:
+            async for attempt in AsyncRetrying(**self._retrying_options()):
+                with attempt:
+                    await asyncio.sleep(max(self.requests.reserve(1), self.tokens.reserve(estimated)))
+                    await self.concurrency.aacquire()
+                    response = None
+                    try:
+                        self._count(attempts=1)
+                        response = await send(request)
+                        self._check(response)
+                    except RetryableResponse:
+                        await response.aread()
+                        await response.aclose()
+                        raise
+                    finally:
+                        self.concurrency.release(rate_limited=response is not None and response.status_code == 429)
+            return response
+        except RetryableResponse as e:
+            self._count(failures=1)
+            return e.response
+
+def request_span(request):
+    """Records a model request, including its rate limit waits and retries, as a span named after the endpoint."""
+    endpoint = request.url.path.rsplit("/v1/", 1)[-1].strip("/").replace("/", ".")
+    return record_span(f"openai.{endpoint}", **{"bytes.input": len(request.content),
+                                                "tokens.estimated": estimate_request_tokens(request)})
+
+class ScheduledTransport(httpx.BaseTransport):
+    """httpx transport that sends every request through a RequestScheduler."""
+
+    def __init__(self, scheduler, transport=None):
+        self.scheduler = scheduler
+        self.transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        request.read()
+        with request_span(request) as span:
+            response = self.scheduler.send(request, self.transport.handle_request)
+            span.set_attribute("http.status_code", response.status_code)
+        return response
+
+    def close(self):
+        self.transport.close()
+
+class AsyncScheduledTransport(httpx.AsyncBaseTransport):
+    """Async httpx transport that sends every request through a RequestScheduler.
+
+    A connection pool only works on the event loop that opened its connections, while one transport
+    is shared by every `asyncio.run` call and by the event loops of worker threads. Unless a transport
+    is given, each event loop gets its own pool, dropped once the loop is closed.
+    """
+
+    def __init__(self, scheduler, transport=None):
+        self.scheduler = scheduler
+        self.transport = transport
+        self._loop_transports = {}
+        self._lock = threading.Lock()
+
+    def _current_transport(self):
+        if self.transport is not None:
+            return self.transport
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._loop_transports.get(loop)
+            if transport is None:
+                # Pools of closed loops, e.g. of finished asyncio.run calls, can never be used again
+                for closed_loop in [other for other in self._loop_transports if other.is_closed()]:
+                    del self._loop_transports[closed_loop]
+                transport = self._loop_transports[loop] = httpx.AsyncHTTPTransport()
+            return transport
+
+    async def handle_async_request(self, request):
+        await request.aread()
+        transport = self._current_transport()
+        with request_span(request) as span:
+            response = await self.scheduler.asend(request, transport.handle_async_request)
+            span.set_attribute("http.status_code", response.status_code)
+        return response
+
+    async def aclose(self):
+        # Only the pool of the running loop can be closed from here; the others close with their loops
+        await self._current_transport().aclose()
+        if self.transport is None:
+            with self._lock:
+                self._loop_transports.pop(asyncio.get_running_loop(), None)
+
+def get_request_scheduler():
+    """Returns the scheduler shared by every model request of this process, creating it on first use.
+
+    Returns:
+        RequestScheduler: The shared scheduler.
+    """
+    global _request_scheduler
+    with _request_scheduler_lock:
+        if _request_scheduler is None:
+            _request_scheduler = RequestScheduler()
+        return _request_scheduler
+
+def configure_request_scheduler(**options):
+    """Replaces the shared scheduler, e.g. to set the rate limits of your OpenAI usage tier.
+
+    Args:
+        **options: Keyword arguments of RequestScheduler.
+
+    Returns:
+        RequestScheduler: The new shared scheduler.
+    """
+    global _request_scheduler
+    with _request_scheduler_lock:
+        _request_scheduler = RequestScheduler(**options)
+        return _request_scheduler
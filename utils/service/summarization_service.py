@@ -0,0 +1,348 @@
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import logging
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import List
+
+import uvicorn
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel
+
+from utils.config.set_path_for_tesseract_and_poppler import set_paths
+from utils.pipeline.batch_runner import company_directory_name
+from utils.pipeline.pipeline_runner import PipelineConfig, run_pipeline
+
+logging.basicConfig(level=logging.INFO)
+
+SERVICE_DATA_DIRECTORY = "Service Data"
+MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+# Settings the service chooses itself, so they cannot be set per job
+SERVICE_MANAGED_SETTINGS = ("document_db_directory", "output_directory", "stream_output", "text_output_path")
+
+UPLOAD_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+REPORT_FILES = {"2-page": "2 Page Summary.docx", "1-page": "1 Page Summary.docx"}
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+class JobQueueFull(Exception):
+    """Raised when every worker is busy and the queue of waiting jobs is full."""
+
+class SummarizationJob:
+    """State and progress events of one submitted job."""
+
+    def __init__(self, job_id, company, pdf_paths, config):
+        self.id = job_id
+        self.company = company
+        self.pdf_paths = pdf_paths
+        self.config = config
+        self.status = "queued"
+        self.stage = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.events = []
+        self._lock = threading.Lock()
+
+    def add_event(self, event, **details):
+        with self._lock:
+            self.events.append({"time": time.time(), "event": event, **details})
+
+    def on_progress(self, stage_name, event, seconds):
+        """Progress callback of the pipeline runner."""
+        self.stage = stage_name
+        self.add_event(f"stage_{event}", stage=stage_name, seconds=round(seconds, 3))
+
+    @property
+    def done(self):
+        return self.status in ("succeeded", "failed")
+
+    def describe(self):
+        """Returns the job state as JSON-compatible data."""
+        return {
+            "job_id": self.id,
+            "company": self.company,
+            "status": self.status,
+            "stage": self.stage,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "reports": {kind: f"/jobs/{self.id}/reports/{kind}" for kind in REPORT_FILES} if self.status == "succeeded" else {},
+        }
+
+class JobManager:
+    """Runs summarization jobs on a bounded worker pool.
+
+    At most `max_workers` jobs run at once and at most `max_pending` more wait in the queue; further
+    submissions are rejected with JobQueueFull so clients back off instead of piling up work. Jobs of
+    the same company run one after another, since they share a Knowledge Base: a company's later jobs
+    wait in its own queue rather than in the pool, so they never hold a worker that jobs of other
+    companies could use. Embedding functions,
+    vector store handles and chat models are shared process-wide, so only the first job pays for
+    building them.
+    """
+
+    def __init__(self, data_directory=SERVICE_DATA_DIRECTORY, max_workers=4, max_pending=32):
+        """
+        Args:
+            data_directory (str): Folder holding uploads, Knowledge Bases and job outputs.
+            max_workers (int): Jobs running at the same time.
+            max_pending (int): Jobs that may wait for a worker.
+        """
+        self.data_directory = data_directory
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.jobs = {}
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="summarization-job")
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        # Jobs waiting for the running job of their company; a company is only listed while it has a job in the pool
+        self._company_queues = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def upload_directory(self, upload_id):
+        return os.path.join(self.data_directory, "uploads", upload_id)
+
+    def submit(self, company, pdf_paths, settings=None):
+        """
+        Queues a job for the PDF reports of one company.
+
+        Args:
+            company (str): Name of the company.
+            pdf_paths (list of str): Paths to the uploaded PDF files.
+            settings (dict): PipelineConfig settings, e.g. `extraction_method`.
+
+        Returns:
+            SummarizationJob: The queued job.
+
+        Raises:
+            JobQueueFull: If the workers and the queue are full.
+            ValueError: If a setting is unknown or managed by the service.
+        """
+        settings = dict(settings or {})
+        unknown = set(settings) - (set(PipelineConfig._fields) - set(SERVICE_MANAGED_SETTINGS))
+        if unknown:
+            raise ValueError(f"Unsupported settings: {sorted(unknown)}")
+        folder = company_directory_name(company)
+        job_id = uuid.uuid4().hex
+        config = PipelineConfig(document_db_directory=os.path.join(self.data_directory, "knowledge_bases", folder),
+                                output_directory=os.path.join(self.data_directory, "jobs", job_id),
+                                text_output_path=os.path.join(self.data_directory, "jobs", job_id, "output.txt"),
+                                stream_output=False, **settings)
+        job = SummarizationJob(job_id, company, pdf_paths, config)
+        if not self._slots.acquire(blocking=False):
+            raise JobQueueFull(f"{self.max_workers} jobs are running and {self.max_pending} are waiting.")
+        job.add_event("queued")
+        with self._lock:
+            self.jobs[job.id] = job
+            if folder in self._company_queues:
+                self._company_queues[folder].append(job)
+                return job
+            self._company_queues[folder] = deque()
+        self._executor.submit(self._run, job, folder)
+        return job
+
+    def _run(self, job, folder):
+        try:
+            job.status = "running"
+            job.started = time.time()
+            job.add_event("started")
+            run_pipeline(job.pdf_paths, job.config, progress=job.on_progress)
+            job.status = "succeeded"
+            job.add_event("succeeded")
+        except Exception as e:
+            logging.error(f"Job {job.id} for {job.company} failed: {e}")
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = "failed"
+            job.add_event("failed", error=job.error)
+        finally:
+            job.finished = time.time()
+            self._slots.release()
+            with self._lock:
+                queue = self._company_queues[folder]
+                if queue:
+                    self._executor.submit(self._run, queue.popleft(), folder)
+                else:
+                    del self._company_queues[folder]
+                    self._idle.notify_all()
+
+    def get(self, job_id):
+        """Returns a job, or None if it does not exist."""
+        return self.jobs.get(job_id)
+
+    def stats(self):
+        """Returns the number of jobs in each status and the pool limits."""
+        counts = {}
+        for job in list(self.jobs.values()):
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"jobs": counts, "max_workers": self.max_workers, "max_pending": self.max_pending}
+
+    def shutdown(self):
+        """Waits for the running and queued jobs to finish."""
+        with self._lock:
+            self._idle.wait_for(lambda: not self._company_queues)
+        self._executor.shutdown(wait=True)
+
+class JobRequest(BaseModel):
+    """Body of a job submission."""
+    upload_id: str
+    company: str
+    settings: dict = {}
+
+def create_app(data_directory=SERVICE_DATA_DIRECTORY, max_workers=4, max_pending=32):
+    """
+    Creates the summarization web service.
+
+    Endpoints:
+        POST /uploads: Upload PDF reports; returns an upload_id.
+        POST /jobs: Submit a job for an upload; returns 429 with Retry-After when the queue is full.
+        GET /jobs/{job_id}: Poll a job's status.
+        GET /jobs/{job_id}/events: Stream a job's progress as server-sent events.
+        GET /jobs/{job_id}/reports/{kind}: Download the '2-page' or '1-page' report.
+        GET /health: Job counts and pool limits.
+
+    Args:
+        data_directory (str): Folder holding uploads, Knowledge Bases and job outputs.
+        max_workers (int): Jobs running at the same time.
+        max_pending (int): Jobs that may wait for a worker before submissions are rejected.
+
+    Returns:
+        FastAPI: The application.
+    """
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.jobs = JobManager(data_directory, max_workers, max_pending)
+        if not os.getenv("OPENAI_API_KEY"):
+            logging.warning("OPENAI_API_KEY is not set; jobs will fail at the embedding stage.")
+        yield
+        await asyncio.to_thread(app.state.jobs.shutdown)
+
+    app = FastAPI(title="Financial Report Summarization", lifespan=lifespan)
+
+    def find_job(request, job_id):
+        job = request.app.state.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+        return job
+
+    @app.post("/uploads", status_code=201)
+    async def upload_reports(request: Request, files: List[UploadFile] = File(...)):
+        upload_id = uuid.uuid4().hex
+        directory = request.app.state.jobs.upload_directory(upload_id)
+        os.makedirs(directory)
+        names = []
+        try:
+            for index, upload in enumerate(files):
+                name = f"{index:03d}_{company_directory_name(os.path.splitext(upload.filename or 'report')[0])}.pdf"
+                size = 0
+                # File operations run on worker threads, so large uploads do not block other requests
+                file = await asyncio.to_thread(open, os.path.join(directory, name), 'wb')
+                try:
+                    while block := await upload.read(UPLOAD_BLOCK_SIZE):
+                        if size == 0 and not block.startswith(b"%PDF"):
+                            raise HTTPException(status_code=415, detail=f"{upload.filename} is not a PDF file.")
+                        size += len(block)
+                        if size > MAX_UPLOAD_BYTES:
+                            raise HTTPException(status_code=413, detail=f"{upload.filename} is larger than {MAX_UPLOAD_BYTES} bytes.")
+                        await asyncio.to_thread(file.write, block)
+                finally:
+                    await asyncio.to_thread(file.close)
+                if size == 0:
+                    raise HTTPException(status_code=415, detail=f"{upload.filename} is empty.")
+                names.append(name)
+        except HTTPException:
+            await asyncio.to_thread(shutil.rmtree, directory, True)
+            raise
+        return {"upload_id": upload_id, "files": names}
+
+    @app.post("/jobs", status_code=202)
+    async def submit_job(request: Request, job_request: JobRequest):
+        manager = request.app.state.jobs
+        directory = manager.upload_directory(job_request.upload_id)
+        if not UPLOAD_ID_PATTERN.fullmatch(job_request.upload_id) or not os.path.isdir(directory):
+            raise HTTPException(status_code=404, detail=f"Unknown upload: {job_request.upload_id}")
+        pdf_paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".pdf"))
+        try:
+            job = manager.submit(job_request.company, pdf_paths, job_request.settings)
+        except JobQueueFull as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        return job.describe()
+
+    @app.get("/jobs/{job_id}")
+    async def job_status(request: Request, job_id: str):
+        return find_job(request, job_id).describe()
+
+    @app.get("/jobs/{job_id}/events")
+    async def job_events(request: Request, job_id: str):
+        job = find_job(request, job_id)
+
+        async def stream():
+            sent = 0
+            while True:
+                done = job.done
+                events = job.events[sent:]
+                for event in events:
+                    yield f"data: {json.dumps(event)}\n\n"
+                sent += len(events)
+                if done and sent == len(job.events):
+                    break
+                if await request.is_disconnected():
+                    break
+                await asyncio.sleep(0.5)
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.get("/jobs/{job_id}/reports/{kind}")
+    async def download_report(request: Request, job_id: str, kind: str):
+        job = find_job(request, job_id)
+        if kind not in REPORT_FILES:
+            raise HTTPException(status_code=404, detail=f"Unknown report: {kind}. Choose one of {sorted(REPORT_FILES)}.")
+        if job.status != "succeeded":
+            raise HTTPException(status_code=409, detail=f"Job {job_id} is {job.status}.")
+        path = os.path.join(job.config.output_directory, REPORT_FILES[kind])
+        return FileResponse(path, media_type=DOCX_MEDIA_TYPE, filename=f"{company_directory_name(job.company)} {REPORT_FILES[kind]}")
+
+    @app.get("/health")
+    async def health(request: Request):
+        return request.app.state.jobs.stats()
+
+    return app
+
+app = create_app()
+
+def main():
+    """Command line entry point running the summarization service with uvicorn."""
+    parser = argparse.ArgumentParser(description="Run the financial report summarization web service.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on.")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on.")
+    parser.add_argument("--workers", type=int, default=4, help="Jobs running at the same time.")
+    parser.add_argument("--max-pending", type=int, default=32, help="Jobs that may wait before submissions are rejected.")
+    parser.add_argument("--data-directory", default=SERVICE_DATA_DIRECTORY, help="Folder for uploads, Knowledge Bases and reports.")
+    parser.add_argument("--poppler-path", help="Poppler bin folder, if it is not on PATH.")
+    parser.add_argument("--tesseract-path", help="Tesseract executable, if it is not on PATH.")
+    args = parser.parse_args()
+
+    if bool(args.poppler_path) != bool(args.tesseract_path):
+        parser.error("--poppler-path and --tesseract-path must be given together.")
+    if args.poppler_path:
+        set_paths(args.poppler_path, args.tesseract_path)
+    # uvicorn uses uvloop and httptools when they are installed
+    uvicorn.run(create_app(args.data_directory, args.workers, args.max_pending), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+import os
+import sys
+import time
+import inspect
+import logging
+import argparse
+import functools
+import threading
+from contextlib import contextmanager
+
+from opentelemetry import context, trace
+from opentelemetry.trace import Status, StatusCode
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider, SpanProcessor
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor, BatchSpanProcessor, ConsoleSpanExporter, SpanExporter, SpanExportResult
+
+from utils.cache.sqlite_lru_cache import DEFAULT_CACHE_DIRECTORY
+from utils.extraction.page_record import PAGE_MARKER_PATTERN
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logging.basicConfig(level=logging.INFO)
+
+SERVICE_NAME = "genai-financial-summarization"
+TRACER_NAME = "utils.telemetry"
+DEFAULT_TRACE_DIRECTORY = os.path.join(DEFAULT_CACHE_DIRECTORY, "traces")
+TRACE_EXPORTERS = ("console", "json")
+
+_tracer_provider = None
+_tracer_provider_lock = threading.Lock()
+
+def _windows_peak_working_set():
+    """Returns the peak working set of this process on Windows, or 0 if it cannot be read."""
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + \
+                   [(name, ctypes.c_size_t) for name in ("PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                                                         "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage",
+                                                         "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+    try:
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        if ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except (AttributeError, OSError):
+        pass
+    return 0
+
+def peak_rss_bytes(children=False):
+    """
+    Returns the peak resident set size of this process so far.
+
+    Args:
+        children (bool): Return the peak of the largest finished child process instead, e.g. an OCR
+            worker. Always 0 on Windows.
+
+    Returns:
+        int: The high-water mark in bytes.
+    """
+    if resource is None:
+        return 0 if children else _windows_peak_working_set()
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def count_text_tokens(text):
+    """Counts the tokens of a text with the OpenAI encoding used for chunking."""
+    # Imported here, since token_chunk_text imports modules that are traced
+    from utils.processing.token_chunk_text import count_tokens
+    return count_tokens(text) if text else 0
+
+def file_size(path):
+    """Returns the size of a file in bytes, or 0 if it does not exist."""
+    return os.path.getsize(path) if path and os.path.isfile(path) else 0
+
+def extraction_attributes(result, arguments):
+    """Span attributes of an `extract_text_*` call: PDF size, pages and bytes of extracted text."""
+    if isinstance(result, list):
+        pages, text = len(result), "".join(result)
+    else:
+        text = result or ""
+        pages = len(PAGE_MARKER_PATTERN.findall(text))
+    return {"bytes.input": file_size(arguments.get("pdf_path")), "pages": pages, "bytes.output": len(text.encode('utf-8'))}
+
+def chunking_attributes(result, arguments):
+    """Span attributes of a chunking call: number, bytes and tokens of the chunks."""
+    return {"chunks": len(result),
+            "bytes.output": sum(len(chunk.page_content.encode('utf-8')) for chunk in result),
+            "tokens.output": sum(count_text_tokens(chunk.page_content) for chunk in result)}
+
+def embedding_attributes(result, arguments):
+    """Span attributes of `store_embeddings_openai`: chunks and tokens sent to the embedding model."""
+    chunks = arguments.get("chunks") or []
+    return {"chunks": len(chunks),
+            "bytes.input": sum(len(chunk.page_content.encode('utf-8')) for chunk in chunks),
+            "tokens.input": sum(count_text_tokens(chunk.page_content) for chunk in chunks),
+            "embedding.backend": str(arguments.get("embedding_backend", "openai")),
+            "vector_store.backend": str(arguments.get("vector_store_backend", "chroma")),
+            "succeeded": bool(result)}
+
+def generation_attributes(result, arguments):
+    """Span attributes of an LLM generation: tokens of the input text, if any, and of the response."""
+    attributes = {"tokens.output": count_text_tokens(result), "bytes.output": len((result or "").encode('utf-8'))}
+    if isinstance(arguments.get("text"), str):
+        attributes["tokens.input"] = count_text_tokens(arguments["text"])
+    for name in ("report_mode", "retrieval_mode"):
+        if name in arguments:
+            attributes[name] = str(arguments[name])
+    return attributes
+
+def docx_attributes(result, arguments):
+    """Span attributes of `save_text_to_docx`: bytes of text written and size of the saved document."""
+    return {"bytes.input": len((arguments.get("text_data") or "").encode('utf-8')),
+            "bytes.output": file_size(arguments.get("output_path"))}
+
+def get_tracer():
+    """Returns the tracer of this project. Spans are dropped until `configure_tracing` is called."""
+    return trace.get_tracer(TRACER_NAME)
+
+def _finish_span(span, start, start_peak, busy_seconds=None):
+    """Records latency and memory attributes on a span that is about to end."""
+    end_peak = peak_rss_bytes()
+    span.set_attribute("latency_ms", (time.perf_counter() - start) * 1000)
+    if busy_seconds is not None:
+        span.set_attribute("busy_ms", busy_seconds * 1000)
+    span.set_attribute("memory.peak_rss_bytes", end_peak)
+    span.set_attribute("memory.peak_rss_growth_bytes", max(0, end_peak - start_peak))
+    children_peak = peak_rss_bytes(children=True)
+    if children_peak:
+        span.set_attribute("memory.children_peak_rss_bytes", children_peak)
+
+def _set_attributes(span, attributes):
+    """Sets attributes on a span, dropping None values. Attribute errors never fail the traced call."""
+    try:
+        span.set_attributes({name: value for name, value in attributes().items() if value is not None})
+    except Exception as e:
+        logging.debug(f"Could not record span attributes: {e}")
+
+@contextmanager
+def record_span(name, **attributes):
+    """
+    Records a block of code as a span with its latency and peak RSS.
+
+    Args:
+        name (str): Name of the span.
+        **attributes: Attributes set when the span starts.
+
+    Yields:
+        Span: The current span, to add attributes to. It is not recording when tracing is off.
+    """
+    with get_tracer().start_as_current_span(name, attributes=attributes) as span:
+        if not span.is_recording():
+            yield span
+            return
+        start, start_peak = time.perf_counter(), peak_rss_bytes()
+        try:
+            yield span
+        finally:
+            _finish_span(span, start, start_peak)
+
+def traced(name=None, attributes=None, item_name="items"):
+    """
+    Decorator recording each call of a function as a span with its latency and peak RSS.
+
+    For a generator function, the span covers the whole iteration: `latency_ms` includes the time the
+    consumer spends between items, `busy_ms` only the time spent producing them, and the number of
+    items yielded is recorded under `item_name`. Work done while producing an item is a child of the span.
+
+    Args:
+        name (str): Name of the span; defaults to the function name.
+        attributes (callable): Called with (return value, bound arguments dict) after a successful call,
+            returning extra span attributes. Only called while tracing is on.
+        item_name (str): Attribute holding the number of items yielded by a generator function.
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(function):
+        span_name = name or function.__name__
+        signature = inspect.signature(function)
+
+        def call_attributes(result, args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return attributes(result, bound.arguments)
+
+        if inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def generator_wrapper(*args, **kwargs):
+                span = get_tracer().start_span(span_name)
+                if not span.is_recording():
+                    yield from function(*args, **kwargs)
+                    return
+                start, start_peak = time.perf_counter(), peak_rss_bytes()
+                busy = 0.0
+                items = 0
+                output_bytes = 0
+                iterator = function(*args, **kwargs)
+                try:
+                    while True:
+                        # The span is only current while the generator runs, never while the consumer does
+                        token = context.attach(trace.set_span_in_context(span))
+                        produce_start = time.perf_counter()
+                        try:
+                            item = next(iterator)
+                        except StopIteration:
+                            break
+                        finally:
+                            busy += time.perf_counter() - produce_start
+                            context.detach(token)
+                        items += 1
+                        text = getattr(item, "text", item)
+                        if isinstance(text, str):
+                            output_bytes += len(text.encode('utf-8'))
+                        yield item
+                except Exception as e:
+                    span.record_exception(e)
+                    span.set_status(Status(StatusCode.ERROR, f"{type(e).__name__}: {e}"))
+                    raise
+                finally:
+                    iterator.close()
+                    span.set_attribute(item_name, items)
+                    span.set_attribute("bytes.output", output_bytes)
+                    _finish_span(span, start, start_peak, busy)
+                    span.end()
+            return generator_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with record_span(span_name) as span:
+                result = function(*args, **kwargs)
+                if attributes is not None and span.is_recording():
+                    _set_attributes(span, lambda: call_attributes(result, args, kwargs))
+                return result
+        return wrapper
+    return decorator
+
+class JsonLinesSpanExporter(SpanExporter):
+    """Writes finished spans to a local file, one JSON object per line, so traces can be inspected offline."""
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): The .jsonl file to append spans to.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        with self._lock, open(self.path, 'a', encoding='utf-8') as file:
+            for span in spans:
+                file.write(span.to_json(indent=None) + "\n")
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+class StageProfile(SpanProcessor):
+    """Aggregates finished spans by name into a per-stage timing and memory breakdown.
+
+    Peak RSS is the process high-water mark when a span ended, so it only grows during a run; the
+    growth column shows which stages raised it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def on_end(self, span):
+        attributes = span.attributes or {}
+        seconds = (span.end_time - span.start_time) / 1e9
+        with self._lock:
+            stage = self._stages.setdefault(span.name, {"first_start": span.start_time, "calls": 0, "seconds": 0.0,
+                                                        "max_seconds": 0.0, "peak_rss_bytes": 0, "peak_rss_growth_bytes": 0})
+            stage["first_start"] = min(stage["first_start"], span.start_time)
+            stage["calls"] += 1
+            stage["seconds"] += seconds
+            stage["max_seconds"] = max(stage["max_seconds"], seconds)
+            stage["peak_rss_bytes"] = max(stage["peak_rss_bytes"], attributes.get("memory.peak_rss_bytes", 0))
+            stage["peak_rss_growth_bytes"] = max(stage["peak_rss_growth_bytes"], attributes.get("memory.peak_rss_growth_bytes", 0))
+
+    def breakdown(self):
+        """Returns (span name, statistics) pairs in the order the stages first started."""
+        with self._lock:
+            return sorted(((name, dict(stage)) for name, stage in self._stages.items()), key=lambda item: item[1]["first_start"])
+
+    def format_report(self):
+        """Formats the breakdown as a table of calls, seconds and memory per stage."""
+        lines = [f"{'Stage':<36}{'Calls':>7}{'Total s':>10}{'Mean s':>10}{'Max s':>10}{'Peak RSS MB':>14}{'Growth MB':>12}"]
+        for name, stage in self.breakdown():
+            lines.append(f"{name:<36}{stage['calls']:>7}{stage['seconds']:>10.2f}{stage['seconds'] / stage['calls']:>10.2f}"
+                         f"{stage['max_seconds']:>10.2f}{stage['peak_rss_bytes'] / 2**20:>14.1f}"
+                         f"{stage['peak_rss_growth_bytes'] / 2**20:>12.1f}")
+        return "\n".join(lines)
+
+def default_trace_file():
+    """Returns a new .jsonl path under the trace directory, named after the current time."""
+    return os.path.join(DEFAULT_TRACE_DIRECTORY, time.strftime("trace-%Y%m%d-%H%M%S.jsonl"))
+
+def configure_tracing(exporter=None, trace_file=None, profile=False):
+    """
+    Turns tracing on for this process. Can be called again to add exporters.
+
+    Args:
+        exporter (str): 'console' to print each span as JSON, 'json' to append spans to a .jsonl file, or None.
+        trace_file (str): File for the 'json' exporter; defaults to a new file under DEFAULT_TRACE_DIRECTORY.
+        profile (bool): Whether to collect the per-stage breakdown.
+
+    Returns:
+        StageProfile: The breakdown collector if `profile` is set, otherwise None.
+
+    Raises:
+        ValueError: If the exporter is unknown.
+    """
+    global _tracer_provider
+    if exporter is not None and exporter not in TRACE_EXPORTERS:
+        raise ValueError(f"Unsupported trace exporter: {exporter}. Choose one of {TRACE_EXPORTERS}.")
+    with _tracer_provider_lock:
+        if _tracer_provider is None:
+            _tracer_provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+            trace.set_tracer_provider(_tracer_provider)
+        if exporter == "console":
+            _tracer_provider.add_span_processor(SimpleSpanProcessor(ConsoleSpanExporter()))
+        elif exporter == "json":
+            trace_file = trace_file or default_trace_file()
+            _tracer_provider.add_span_processor(BatchSpanProcessor(JsonLinesSpanExporter(trace_file)))
+            logging.info(f"Writing trace spans to {trace_file}.")
+        stage_profile = StageProfile() if profile else None
+        if stage_profile is not None:
+            _tracer_provider.add_span_processor(stage_profile)
+        return stage_profile
+
+def flush_tracing():
+    """Exports every finished span that is still buffered."""
+    if _tracer_provider is not None:
+        _tracer_provider.force_flush()
+
+def add_tracing_arguments(parser):
+    """Adds the --profile, --trace and --trace-file options to a command line parser."""
+    parser.add_argument("--profile", action="store_true", help="Print a per-stage timing and memory breakdown at the end of the run.")
+    parser.add_argument("--trace", choices=TRACE_EXPORTERS, help="Export a span per stage and model request to the console or a JSON lines file.")
+    parser.add_argument("--trace-file", help=f"JSON lines file for --trace json (default: a new file in {DEFAULT_TRACE_DIRECTORY}).")
+
+@contextmanager
+def tracing_from_arguments(args):
+    """
+    Turns tracing on as requested by the options of `add_tracing_arguments`, for the duration of a run.
+
+    The breakdown is printed and buffered spans are exported when the run ends, even if it fails.
+
+    Args:
+        args (argparse.Namespace): The parsed command line.
+
+    Yields:
+        StageProfile: The breakdown collector, or None without --profile.
+    """
+    if not args.profile and not args.trace:
+        yield None
+        return
+    stage_profile = configure_tracing(args.trace, args.trace_file, args.profile)
+    try:
+        yield stage_profile
+    finally:
+        flush_tracing()
+        if stage_profile is not None:
+            print('---------------------------------------------------------------------------------------------------')
+            print("Per-stage profile:")
+            print(stage_profile.format_report())
+
+def parse_tracing_arguments(description):
+    """Parses a command line that only has the tracing options, e.g. for the interactive main script."""
+    parser = argparse.ArgumentParser(description=description)
+    add_tracing_arguments(parser)
+    return parser.parse_args()